@@ -0,0 +1,83 @@
+"""
+Баланс и заказы пользователя для /balance и /orders.
+
+Данные читаются через LRU-кэш по telegram_id: повторные запросы обслуживаются
+из памяти. Запись сбрасывается по NOTIFY bot_user_changed (триггеры users,
+purchases и transactions) или по истечении ttl, если уведомление не дошло.
+"""
+import account_module.config as config
+from account_module.cache import LRUCache
+from functions_module import functions
+from logger_system import logger
+
+STATUS_ICONS = {'completed': '✅', 'pending': '⏳', 'failed': '❌'}
+
+
+class AccountService:
+    def __init__(self, db, maxsize=config.CACHE_SIZE, ttl=config.CACHE_TTL, orders_limit=config.ORDERS_LIMIT):
+        self.db = db
+        self.orders_limit = orders_limit
+        self.cache = LRUCache(maxsize, ttl)
+
+    def get(self, telegram_id):
+        """Возвращает данные пользователя (см. Database.get_account) или None, если база недоступна."""
+        try:
+            return self.cache.get_or_load(telegram_id, self._load)
+        except LookupError:
+            return None
+
+    def _load(self, telegram_id):
+        account = self.db.get_account(telegram_id, self.orders_limit)
+        if account is None:
+            # Ошибка базы не кэшируется
+            raise LookupError(telegram_id)
+        return account
+
+    def on_notify(self, payload):
+        """
+        Обработчик NOTIFY bot_user_changed. Весь кэш сбрасывается после переподключения (payload=None)
+        и после массового импорта пользователей (payload='*').
+        """
+        if payload is None or payload == '*':
+            self.cache.clear()
+            return
+        try:
+            self.cache.invalidate(int(payload))
+        except ValueError:
+            logger.error(f'Unexpected {config.CHANNEL} payload: {payload!r}')
+
+    def stats(self):
+        return self.cache.stats()
+
+
+WELCOME_TEXT = 'Добро пожаловать!\nВоспользуйтесь кнопкой, чтобы открыть приложение 👇'
+NOT_REGISTERED_TEXT = 'Вы еще не зарегистрированы в магазине.\nВоспользуйтесь кнопкой, чтобы открыть приложение 👇'
+UNAVAILABLE_TEXT = '❌ Не удалось получить данные. Попробуйте позже.'
+
+
+def render_balance(account):
+    """Текст ответа /balance (HTML)."""
+    lines = [
+        f'💰 <b>Баланс:</b> <code>{functions.format_money(account["balance"])}$</code>',
+        f'🛒 <b>Потрачено всего:</b> <code>{functions.format_money(account["total_spent"])}$</code>',
+    ]
+    deposit = account['last_deposit']
+    if deposit:
+        lines.append(f'💳 <b>Последнее пополнение:</b> <code>{functions.format_money(deposit["amount"])}$</code> '
+                     f'({deposit["date"].strftime("%d.%m.%Y")})')
+    return '\n'.join(lines)
+
+
+def render_orders(account):
+    """Текст ответа /orders (HTML)."""
+    if not account['orders']:
+        return '🛒 У вас пока нет заказов.'
+
+    lines = [f'🛒 <b>Последние заказы</b> ({len(account["orders"])}):\n']
+    for order in account['orders']:
+        currency = order['currency'] or 'USD'
+        amount = f'{functions.format_money(order["amount"])}$' if currency == 'USD' else f'{functions.format_money(order["amount"])} {currency}'
+        date = order['date'].strftime('%d.%m.%Y') if order['date'] else ''
+        lines.append(f'{STATUS_ICONS.get(order["status"], "•")} {date} {functions.escape_text_html(order["title"])} '
+                     f'— <code>{amount}</code>')
+    return '\n'.join(lines)
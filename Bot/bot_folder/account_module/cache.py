@@ -0,0 +1,57 @@
+"""
+Ограниченный LRU-кэш с временем жизни записей для чтения через кэш (read-through).
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    def __init__(self, maxsize, ttl):
+        """
+        :param maxsize: максимальное количество записей; при переполнении удаляется давно не читавшаяся
+        :param ttl: через сколько секунд запись перечитывается из источника
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # ключ -> (значение, истекает в)
+        self._lock = threading.Lock()
+        # Счетчик сбросов: значение, загруженное во время сброса, может быть устаревшим и не кэшируется
+        self._invalidations = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_load(self, key, loader):
+        """Возвращает значение из кэша или loader(key), сохраняя результат в кэш."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            invalidations = self._invalidations
+
+        value = loader(key)
+
+        with self._lock:
+            if invalidations == self._invalidations:
+                self._data[key] = (value, time.monotonic() + self.ttl)
+                self._data.move_to_end(key)
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._invalidations += 1
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._invalidations += 1
+            self._data.clear()
+
+    def stats(self):
+        return {'size': len(self._data), 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,10 @@
+import os
+
+# Сколько пользователей держать в кэше /balance и /orders
+CACHE_SIZE = int(os.environ.get('ACCOUNT_CACHE_SIZE', '10000'))
+# Сколько секунд запись кэша считается актуальной, даже если NOTIFY не пришел
+CACHE_TTL = float(os.environ.get('ACCOUNT_CACHE_TTL', '60'))
+# Сколько последних заказов показывать в /orders
+ORDERS_LIMIT = int(os.environ.get('ACCOUNT_ORDERS_LIMIT', '10'))
+# Канал NOTIFY с telegram_id пользователя, чьи баланс, покупки или транзакции изменились (задан в миграции)
+CHANNEL = 'bot_user_changed'
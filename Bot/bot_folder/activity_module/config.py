@@ -0,0 +1,12 @@
+import os
+
+# Учитывать активность пользователей (последнее обращение и счетчики)
+ENABLED = os.environ.get('ACTIVITY_ENABLED', '1') == '1'
+# Как часто записывать накопленную активность в PostgreSQL (в секундах): не больше одной записи на пользователя
+FLUSH_INTERVAL = float(os.environ.get('ACTIVITY_FLUSH_INTERVAL', '60'))
+# Сколько пользователей записывать одним запросом
+FLUSH_BATCH_SIZE = int(os.environ.get('ACTIVITY_FLUSH_BATCH_SIZE', '5000'))
+# Предел пользователей в памяти, пока PostgreSQL недоступен; активность новых сверх него не учитывается
+MAX_PENDING = int(os.environ.get('ACTIVITY_MAX_PENDING', '200000'))
+# Окна (в днях), по которым /activity показывает количество активных пользователей
+REPORT_WINDOWS = (1, 7, 30, 90)
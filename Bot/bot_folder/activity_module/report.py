@@ -0,0 +1,47 @@
+"""
+Отчет и выгрузка активности пользователей для /activity.
+
+Количество активных за окна считается одним проходом по индексу last_seen_at,
+неактивные зарегистрированные пользователи выбираются тем же условием,
+что и сегмент рассылки 'inactive' (проверка по первичному ключу bot_user_activity).
+"""
+import activity_module.config as config
+from mailing_module.segments import compile_segments
+
+
+def _format_number(num):
+    return '{:,}'.format(int(num)).replace(',', ' ')
+
+
+def build_report(db, tracker=None, inactive_days=None):
+    """Текст /activity (HTML) или None, если PostgreSQL недоступен."""
+    counts = db.count_active_users(config.REPORT_WINDOWS)
+    if counts is None:
+        return None
+
+    lines = ['📈 <b>Активность пользователей</b>\n']
+    for days, count in counts.items():
+        lines.append(f'• За {days} дн.: <code>{_format_number(count)}</code>')
+    if inactive_days:
+        inactive = db.count_recipients(compile_segments([('inactive', inactive_days)]))
+        lines.append(f'\n💤 Не обращались {inactive_days} дн. (из зарегистрированных): '
+                     f'<code>{_format_number(inactive)}</code>')
+    if tracker is not None:
+        lines.append(f'\n<i>Еще не записано: {tracker.stats()["pending"]} польз., '
+                     f'запись раз в {int(tracker.interval)} с</i>')
+    return '\n'.join(lines)
+
+
+def export_inactive(db, days, file):
+    """Выгружает в file CSV зарегистрированных пользователей, не обращавшихся к боту days дней."""
+    where_sql, params = compile_segments([('inactive', days)])
+    query = f"""
+        SELECT u.telegram_id, u.username, u.first_name, u.join_date, act.last_seen_at,
+               COALESCE(act.messages, 0) AS messages, COALESCE(act.commands, 0) AS commands,
+               COALESCE(act.callbacks, 0) AS callbacks, COALESCE(act.inline_queries, 0) AS inline_queries
+        FROM users u
+        LEFT JOIN bot_user_activity act ON act.telegram_id = u.telegram_id
+        WHERE {where_sql}
+        ORDER BY act.last_seen_at NULLS FIRST, u.id
+    """
+    return db.copy_to(query, file, params=params, csv_header=True)
@@ -0,0 +1,117 @@
+"""
+Учет активности пользователей бота.
+
+Каждый апдейт только обновляет запись пользователя в словаре в памяти:
+время последнего обращения и счетчики сообщений, команд, нажатий кнопок
+и inline-запросов. Раз в FLUSH_INTERVAL накопленные записи переносятся
+в bot_user_activity одним INSERT ... ON CONFLICT на пачку
+(Database.upsert_user_activity), поэтому на пользователя приходится не больше
+одной записи в PostgreSQL за интервал, сколько бы апдейтов он ни прислал.
+Если запись не удалась, пачка возвращается в словарь и сливается с новой активностью.
+"""
+import threading
+import time
+
+import activity_module.config as config
+from logger_system import logger
+
+# Индексы счетчиков в записи пользователя
+MESSAGES, COMMANDS, CALLBACKS, INLINE_QUERIES = range(4)
+
+
+def classify(update):
+    """Возвращает (telegram_id, индекс счетчика) апдейта или (None, None), если он не учитывается."""
+    message = update.message or update.edited_message
+    if message is not None:
+        if message.from_user is None:
+            return None, None
+        counter = COMMANDS if (message.text or '').startswith('/') else MESSAGES
+        return message.from_user.id, counter
+    if update.callback_query is not None:
+        return update.callback_query.from_user.id, CALLBACKS
+    if update.inline_query is not None:
+        return update.inline_query.from_user.id, INLINE_QUERIES
+    return None, None
+
+
+class ActivityTracker:
+    def __init__(self, db, interval=config.FLUSH_INTERVAL, batch_size=config.FLUSH_BATCH_SIZE,
+                 max_pending=config.MAX_PENDING):
+        self.db = db
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self._pending = {}  # telegram_id -> [последнее обращение (unix time), сообщения, команды, кнопки, inline]
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.flushed = 0
+        self.dropped = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name='ActivityTracker', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=30):
+        """Останавливает фоновую запись и записывает накопленную активность."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    def record(self, updates):
+        """Учитывает пакет апдейтов (вызывается из потока polling до обработчиков)."""
+        now = time.time()
+        with self._lock:
+            for update in updates:
+                telegram_id, counter = classify(update)
+                if telegram_id is None:
+                    continue
+                entry = self._pending.get(telegram_id)
+                if entry is None:
+                    if len(self._pending) >= self.max_pending:
+                        self.dropped += 1
+                        continue
+                    entry = self._pending[telegram_id] = [now, 0, 0, 0, 0]
+                entry[0] = now
+                entry[counter + 1] += 1
+
+    def flush(self):
+        """Записывает накопленную активность в PostgreSQL. Возвращает количество записанных пользователей."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        rows = [(telegram_id, *entry) for telegram_id, entry in pending.items()]
+        flushed = 0
+        for start in range(0, len(rows), self.batch_size):
+            batch = rows[start:start + self.batch_size]
+            if not self.db.upsert_user_activity(batch):
+                self._restore(rows[start:])
+                break
+            flushed += len(batch)
+        self.flushed += flushed
+        return flushed
+
+    def _restore(self, rows):
+        """Возвращает незаписанные строки в словарь, сливая их с активностью, накопленной за время записи."""
+        with self._lock:
+            for telegram_id, last_seen, *counters in rows:
+                entry = self._pending.get(telegram_id)
+                if entry is None:
+                    self._pending[telegram_id] = [last_seen, *counters]
+                    continue
+                entry[0] = max(entry[0], last_seen)
+                for index, count in enumerate(counters, start=1):
+                    entry[index] += count
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f'Activity flush failed: {e}')
+
+    def stats(self):
+        return {'pending': len(self._pending), 'flushed': self.flushed, 'dropped': self.dropped}
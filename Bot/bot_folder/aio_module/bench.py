@@ -0,0 +1,142 @@
+"""
+Сравнение режимов threads и asyncio на рассылке.
+
+Локальный фейковый Telegram API (aiohttp, отдельный процесс) отвечает на
+любой метод через --latency секунд. Одна и та же рассылка на --messages
+получателей отправляется:
+- threads: mailing_module.delivery.deliver через OutboundSender с --threads
+  потоками отправки и пулом Transport того же размера;
+- asyncio: aio_module.delivery.deliver через AsyncSender, до --concurrency
+  отправок одновременно.
+Лимиты Telegram в замере отключены. Для каждого режима выводятся отправки
+в секунду, наибольшее число одновременных запросов, число потоков процесса
+и процессорное время. Фейковый API - bench_module/fake_api.py.
+
+Запуск: python aio_module/bench.py --messages 2000 --latency 0.2 --threads 32 --concurrency 1000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_module.fake_api import TOKEN, start as start_fake_api
+
+UNLIMITED_RATE = 1e9
+
+
+class _Recipients:
+    """Database с одним методом iter_recipients: получатели 1..count."""
+
+    def __init__(self, count):
+        self.count = count
+
+    def iter_recipients(self, where, batch_size=1000, start_after=0, end_id=None, columns=()):
+        return ((user_id, user_id) for user_id in range(start_after + 1, self.count + 1))
+
+
+def _measure(name, run, messages):
+    cpu_started_at = time.process_time()
+    started_at = time.perf_counter()
+    result, in_flight, threads = run()
+    elapsed = time.perf_counter() - started_at
+    cpu = time.process_time() - cpu_started_at
+    print(f'{name:8} {messages / elapsed:10.0f} msg/s  elapsed={elapsed:.2f}s  cpu={cpu:.2f}s  '
+          f'max_in_flight={in_flight}  threads={threads}  sent={result["successful"]} failed={result["failed"]}')
+
+
+def bench_threads(api_url, messages, threads):
+    import sender_module.config as sender_config
+    from telebot import TeleBot
+    from mailing_module.delivery import deliver
+    from sender_module.sender import OutboundSender
+    from transport_module.transport import Transport
+
+    transport = Transport(threads, api_url=api_url, dns_cache_ttl=0)
+    transport.install()
+    sender = OutboundSender(workers=threads, global_rate=UNLIMITED_RATE, broadcast_rate=UNLIMITED_RATE,
+                            reserved_workers=0, transport=transport, token=TOKEN, name='bench')
+    sender.install()
+    sender.start()
+    # Окно рассылки не меньше числа потоков, иначе часть потоков простаивает
+    sender_config.BROADCAST_WINDOW = threads
+    bot = TeleBot(TOKEN, threaded=False)
+
+    def send(user_id):
+        bot.send_message(chat_id=user_id, text='bench')
+
+    def run():
+        result = deliver(_Recipients(messages), sender, send)
+        return result, threads, threading.active_count()
+
+    try:
+        _measure('threads', run, messages)
+    finally:
+        sender.stop()
+
+
+def bench_asyncio(api_url, messages, concurrency):
+    from telebot import asyncio_helper
+    from telebot.async_telebot import AsyncTeleBot
+    from aio_module import delivery
+    from aio_module.db import AsyncDatabase
+    from aio_module.sender import AsyncSender
+    from sender_module.sender import OutboundSender
+
+    asyncio_helper.API_URL = api_url
+    limiter = OutboundSender(global_rate=UNLIMITED_RATE, broadcast_rate=UNLIMITED_RATE, token=TOKEN, name='bench')
+    sender = AsyncSender(TOKEN, 'bench', limiter)
+    sender.install()
+    bot = AsyncTeleBot(TOKEN)
+    db = AsyncDatabase(_Recipients(messages), workers=1)
+
+    async def send(user_id):
+        await bot.send_message(chat_id=user_id, text='bench')
+
+    async def run_async():
+        try:
+            return await delivery.deliver(db, send, concurrency=concurrency)
+        finally:
+            await sender.close()
+            await asyncio_helper.session_manager.session.close()
+
+    def run():
+        result = asyncio.run(run_async())
+        return result, sender.max_in_flight, threading.active_count()
+
+    try:
+        _measure('asyncio', run, messages)
+    finally:
+        db.close()
+
+
+def main():
+    import logger_system
+
+    parser = argparse.ArgumentParser(description='Broadcast throughput: threads vs asyncio')
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--latency', type=float, default=0.2, help='API response time, seconds')
+    parser.add_argument('--threads', type=int, default=32, help='sender threads in threads mode')
+    parser.add_argument('--concurrency', type=int, default=1000, help='concurrent sends in asyncio mode')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--mode', choices=('both', 'threads', 'asyncio'), default='both')
+    args = parser.parse_args()
+
+    server, api_url = start_fake_api(args.port, args.latency)
+    try:
+        print(f'{args.messages} messages, API latency {args.latency * 1000:.0f} ms')
+        if args.mode in ('both', 'threads'):
+            bench_threads(api_url, args.messages, args.threads)
+        if args.mode in ('both', 'asyncio'):
+            bench_asyncio(api_url, args.messages, args.concurrency)
+    finally:
+        server.terminate()
+        logger_system.shutdown()
+
+
+if __name__ == '__main__':
+    main()
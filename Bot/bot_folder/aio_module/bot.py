@@ -0,0 +1,243 @@
+"""
+asyncio-режим бота (BOT_RUNTIME=asyncio).
+
+Один event loop на процесс (AsyncRuntime, отдельный поток) и AsyncBot на
+каждую витрину. AsyncBot опрашивает Telegram через AsyncTeleBot и сам
+обрабатывает массовые запросы пользователей - /start, /balance, /orders
+и inline-поиск: обработчики - корутины, запросы к API ждут лимита
+в AsyncSender, а не в потоках. Остальные апдейты (админ-панель: /mail,
+/stats, /import...) передаются обработчикам синхронного Bot и выполняются
+в его потоках как есть. Рассылки синхронного бота отправляются
+асинхронной доставкой (aio_module.delivery).
+
+AsyncBot подменяет у синхронного Bot методы run, stop, restart_polling,
+drain и _deliver, поэтому bot.main(), сторож зависаний и передача polling
+между процессами работают в обоих режимах одинаково.
+"""
+import asyncio
+import concurrent.futures
+import threading
+
+import catalog_module.config as catalog_config
+from account_module.account import NOT_REGISTERED_TEXT, UNAVAILABLE_TEXT, WELCOME_TEXT, render_balance, render_orders
+from aio_module import delivery
+from aio_module.db import AsyncDatabase
+from aio_module.sender import AsyncSender
+from mailing_module.personalize import template_for
+from catalog_module.catalog import inline_result
+from keyboard_module import keyboard
+from logger_system import logger, logged_handler
+
+# Команды, которые обрабатываются в event loop; остальные - синхронными обработчиками
+NATIVE_COMMANDS = {'start', 'balance', 'orders'}
+
+
+class AsyncRuntime:
+    """Event loop asyncio-режима в отдельном потоке, общий для ботов процесса."""
+
+    def __init__(self, db):
+        """:param db: db_module.db.Database"""
+        self.loop = asyncio.new_event_loop()
+        self.db = AsyncDatabase(db)
+        self._thread = threading.Thread(target=self._run, name='AsyncLoop', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def call(self, coro, timeout=None):
+        """Выполняет корутину в event loop и возвращает ее результат (вызывается из других потоков)."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def stop(self, timeout=5):
+        from telebot import asyncio_helper
+
+        async def close_session():
+            # Сессия aiohttp хранится в потоке event loop
+            session = asyncio_helper.session_manager.session
+            if session is not None and not session.closed:
+                await session.close()
+
+        try:
+            self.call(close_session(), timeout)
+        except Exception as e:
+            logger.error(f'Failed to close aiohttp session: {e}')
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+        self.db.close()
+
+
+class AsyncBot:
+    def __init__(self, bot, runtime):
+        """
+        :param bot: Bot (bot.py) - синхронный бот витрины
+        :param runtime: AsyncRuntime
+        """
+        from telebot.async_telebot import AsyncTeleBot
+
+        self.sync = bot
+        self.name = bot.name
+        self.runtime = runtime
+        self.db = runtime.db
+        self.accounts = bot.accounts
+        self.catalog_index = bot.catalog_index
+        self.bot = AsyncTeleBot(token=bot.storefront.token)
+        self.bot.get_updates = self._get_updates
+        self.bot.process_new_updates = self._process_new_updates
+        # Сессия aiohttp общая для ботов процесса, ее закрывает AsyncRuntime.stop
+        self.bot.close_session = self._keep_session
+        # Лимит Telegram бота общий с его OutboundSender (синхронные обработчики админ-панели)
+        self.sender = AsyncSender(bot.storefront.token, self.name, bot.sender)
+        self.sender.install()
+        self._polling_task = None
+        self._restart_polling = False
+        self._stopping = False
+        self._register_handlers()
+
+        self._sync_drain = bot.drain
+        bot.run = self.run
+        bot.stop = self.stop
+        bot.restart_polling = self.restart_polling
+        bot.drain = self.drain
+        bot._deliver = self._deliver
+
+    def _register_handlers(self):
+        @self.bot.message_handler(commands=['start'])
+        @logged_handler
+        async def start_cmd(message):
+            await self.db.add_user(
+                user_id=message.chat.id,
+                username=message.chat.username,
+                first_name=message.chat.first_name,
+                storefront=self.name
+            )
+            await self.bot.send_message(chat_id=message.chat.id, text=WELCOME_TEXT, reply_markup=keyboard.app_link())
+
+        @self.bot.message_handler(commands=['balance'])
+        @logged_handler
+        async def balance_cmd(message):
+            await self._send_account(message.chat.id, render_balance)
+
+        @self.bot.message_handler(commands=['orders'])
+        @logged_handler
+        async def orders_cmd(message):
+            await self._send_account(message.chat.id, render_orders)
+
+        @self.bot.inline_handler(func=lambda query: True)
+        @logged_handler
+        async def inline_search(query):
+            items = self.catalog_index.search(query.query, catalog_config.RESULTS_LIMIT)
+            reply_markup = keyboard.app_link()
+            await self.bot.answer_inline_query(
+                query.id,
+                [inline_result(item, reply_markup) for item in items],
+                cache_time=catalog_config.INLINE_CACHE_TIME
+            )
+
+    async def _send_account(self, chat_id, render):
+        # Кэш аккаунтов синхронный: промах читает PostgreSQL, поэтому вызов идет в потоке запросов к базе
+        account = await self.db.run(self.accounts.get, chat_id)
+        if account is None:
+            await self.bot.send_message(chat_id=chat_id, text=UNAVAILABLE_TEXT)
+        elif not account['registered']:
+            await self.bot.send_message(chat_id=chat_id, text=NOT_REGISTERED_TEXT, reply_markup=keyboard.app_link())
+        else:
+            await self.bot.send_message(chat_id=chat_id, text=render(account), parse_mode='HTML')
+
+    @staticmethod
+    def _is_native(update):
+        from telebot import util
+
+        if update.inline_query is not None:
+            return True
+        return update.message is not None and util.extract_command(update.message.text) in NATIVE_COMMANDS
+
+    async def _get_updates(self, *args, **kwargs):
+        from telebot.async_telebot import AsyncTeleBot
+
+        updates = await AsyncTeleBot.get_updates(self.bot, *args, **kwargs)
+        # AsyncTeleBot не вызывает process_new_updates для пустого ответа, heartbeat отмечается здесь
+        self.sync.health.polled()
+        return updates
+
+    async def _process_new_updates(self, updates):
+        """
+        Апдейты, прошедшие Bot._accept_updates: пользовательские команды и inline-запросы
+        обрабатываются в event loop, остальные передаются синхронным обработчикам.
+        """
+        from telebot import TeleBot
+        from telebot.async_telebot import AsyncTeleBot
+
+        native, delegated = [], []
+        for update in self.sync._accept_updates(updates):
+            (native if self._is_native(update) else delegated).append(update)
+        if delegated:
+            # Только ставит обработчики в очередь потоков telebot, event loop не блокируется
+            TeleBot.process_new_updates(self.sync.bot, delegated)
+        if native:
+            for update in native:
+                self.sync.health.dispatched(update.message or update.inline_query)
+            await AsyncTeleBot.process_new_updates(self.bot, native)
+
+    @staticmethod
+    async def _keep_session():
+        pass
+
+    def run(self, last_update_id=None):
+        """Запускает polling в event loop. Возвращает управление после stop()."""
+        if last_update_id:
+            self.sync.bot.last_update_id = last_update_id
+            self.bot.offset = last_update_id + 1
+        self.runtime.call(self._poll())
+
+    async def _poll(self):
+        while not self._stopping:
+            self.sync.health.polling_started()
+            self._polling_task = asyncio.create_task(self.bot.infinity_polling())
+            try:
+                await self._polling_task
+            except asyncio.CancelledError:
+                pass
+            if not self._restart_polling:
+                break
+            self._restart_polling = False
+            logger.warning(f'Polling restarted ({self.name})')
+        self.sync.health.polling_stopped()
+
+    def stop(self):
+        """Останавливает polling; текущие обработчики продолжают работу."""
+        self._stopping = True
+        self.runtime.loop.call_soon_threadsafe(self._cancel_polling)
+
+    def restart_polling(self):
+        """Останавливает polling, и run() запускает его заново (сторож зависаний)."""
+        if self._stopping:
+            return
+        self._restart_polling = True
+        self.runtime.loop.call_soon_threadsafe(self._cancel_polling)
+
+    def _cancel_polling(self):
+        self.bot._polling = False
+        if self._polling_task:
+            self._polling_task.cancel()
+
+    def drain(self, timeout=30):
+        """Дожидается async-обработчиков, затем выполняет drain() синхронного бота."""
+        try:
+            self.runtime.call(self._wait_pending(), timeout)
+        except concurrent.futures.TimeoutError:
+            logger.error(f'Drain timeout ({self.name}): {len(self.bot._pending_tasks)} async updates still running')
+        self._sync_drain(timeout)
+        logger.info(f'Async sender ({self.name}): {self.sender.stats()}')
+
+    async def _wait_pending(self):
+        if self.bot._pending_tasks:
+            await asyncio.wait(list(self.bot._pending_tasks))
+
+    def _deliver(self, payload, **options):
+        """Доставка рассылки в event loop (вместо Bot._deliver; вызывается из потока рассылки)."""
+        send = delivery.build_send(self.bot, payload)
+        return self.runtime.call(delivery.deliver(self.db, send, payload.get('segments'),
+                                                  template=template_for(payload),
+                                                  storefront=payload.get('storefront'), **options))
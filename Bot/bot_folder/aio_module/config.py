@@ -0,0 +1,15 @@
+import os
+
+import db_module.config as db_config
+
+# Режим выполнения бота: 'threads' - TeleBot и потоки обработчиков, 'asyncio' - AsyncTeleBot (aio_module)
+RUNTIME = os.environ.get('BOT_RUNTIME', 'threads')
+ENABLED = RUNTIME == 'asyncio'
+# Предел одновременных HTTP-соединений aiohttp к Telegram API (на процесс)
+MAX_CONNECTIONS = int(os.environ.get('AIO_MAX_CONNECTIONS', '1000'))
+# Потоки для запросов к PostgreSQL (psycopg2 блокирующий); больше размера пула соединений не нужно
+DB_WORKERS = int(os.environ.get('AIO_DB_WORKERS', str(db_config.POOL_SIZE or 10)))
+# Сколько отправок одной рассылки может выполняться одновременно
+BROADCAST_CONCURRENCY = int(os.environ.get('AIO_BROADCAST_CONCURRENCY', '500'))
+# Таймаут запроса к Telegram API (в секундах)
+REQUEST_TIMEOUT = float(os.environ.get('AIO_REQUEST_TIMEOUT', '30'))
@@ -0,0 +1,67 @@
+"""
+Асинхронный доступ к базам данных для asyncio-режима.
+
+AsyncDatabase повторяет интерфейс db_module.db.Database: те же методы
+с теми же аргументами, но их нужно await-ить. Запросы выполняет тот же
+Database (psycopg2, пул подключений, размыкатель, локальная очередь
+регистраций) в пуле из DB_WORKERS потоков: одновременных запросов
+к PostgreSQL все равно не больше размера пула подключений, а event loop
+не блокируется. Контекст вызывающей задачи (трейс апдейта) переносится
+в поток запроса.
+"""
+import asyncio
+import contextvars
+import functools
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+import aio_module.config as config
+from mailing_module.personalize import iter_rendered
+
+
+class AsyncDatabase:
+    def __init__(self, db, workers=config.DB_WORKERS):
+        """:param db: db_module.db.Database"""
+        self.db = db
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix='AsyncDB')
+
+    def __getattr__(self, name):
+        method = getattr(self.db, name)
+        if not callable(method):
+            return method
+
+        @functools.wraps(method)
+        async def call(*args, **kwargs):
+            return await self.run(method, *args, **kwargs)
+
+        # Обертка создается один раз на метод
+        setattr(self, name, call)
+        return call
+
+    async def run(self, fn, *args, **kwargs):
+        """Выполняет блокирующую fn(*args, **kwargs) в потоке запросов к базе."""
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, functools.partial(context.run, fn, *args, **kwargs)
+        )
+
+    async def iter_recipients(self, where, batch_size=1000, start_after=0, end_id=None, template=None):
+        """
+        Асинхронный генератор (row_id, user_id, args) получателей (см. Database.iter_recipients
+        и mailing_module.personalize.iter_rendered). Страница читается и рендерится в потоке целиком,
+        поэтому переключений на поток - одно на batch_size строк.
+        """
+        rows = iter_rendered(
+            self.db.iter_recipients(where, batch_size=batch_size, start_after=start_after, end_id=end_id,
+                                    columns=template.columns if template else ()),
+            template, batch_size
+        )
+        while True:
+            batch = await self.run(lambda: list(itertools.islice(rows, batch_size)))
+            for row in batch:
+                yield row
+            if len(batch) < batch_size:
+                return
+
+    def close(self):
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,211 @@
+"""
+Доставка рассылки в asyncio-режиме.
+
+То же, что mailing_module.delivery (содержимое поста, повтор получателей
+после 429, позиция возобновления, чекпоинт RecipientLog), но отправки -
+задачи event loop: одновременно выполняется до BROADCAST_CONCURRENCY
+отправок рассылки, а темп задает AsyncSender бота.
+"""
+import asyncio
+import time
+from collections import deque
+
+import aio_module.config as config
+import mailing_module.config as mailing_config
+from logger_system import logger
+from mailing_module.delivery import (PROGRESS_EVERY_SECONDS, PROGRESS_EVERY_SENDS, _build_media_list,
+                                     _status_for_error, build_reply_markup)
+from mailing_module.personalize import render_missing
+from mailing_module.recipients import RecipientLog, SENT, FAILED, BLOCKED, RETRYING
+from mailing_module.segments import compile_segments
+from sender_module.sender import BROADCAST, send_priority
+
+
+def build_send(bot, payload):
+    """
+    Корутина send(user_id), отправляющая пост payload одному получателю через AsyncTeleBot bot
+    (для персонализированного поста - send(user_id, text), см. mailing_module.delivery.build_send).
+    """
+    content_type = payload['content_type']
+    content_data = payload['content_data']
+    reply_markup = build_reply_markup(payload)
+
+    if content_data and content_data.get('template'):
+        if content_type == 'text':
+            async def send(user_id, text):
+                await bot.send_message(chat_id=user_id, text=text, parse_mode='HTML', reply_markup=reply_markup)
+        elif content_type == 'media_group':
+            async def send(user_id, text):
+                await bot.send_media_group(chat_id=user_id,
+                                           media=_build_media_list(payload['media_group'], text, 'HTML'))
+                if reply_markup:
+                    await bot.send_message(chat_id=user_id, text='👇', reply_markup=reply_markup)
+        else:
+            send_media = getattr(bot, f'send_{content_type}')
+
+            async def send(user_id, text):
+                await send_media(user_id, content_data['file_id'], caption=text, parse_mode='HTML',
+                                 reply_markup=reply_markup)
+        return send
+
+    if mailing_config.COPY_MODE and payload.get('source_message_ids'):
+        from_chat_id = payload['source_chat_id']
+        message_ids = payload['source_message_ids']
+
+        if len(message_ids) == 1:
+            async def send(user_id):
+                await bot.copy_message(chat_id=user_id, from_chat_id=from_chat_id, message_id=message_ids[0],
+                                       reply_markup=reply_markup)
+            return send
+
+        async def send(user_id):
+            await bot.copy_messages(chat_id=user_id, from_chat_id=from_chat_id, message_ids=message_ids)
+            if reply_markup:
+                await bot.send_message(chat_id=user_id, text='👇', reply_markup=reply_markup)
+        return send
+
+    if content_type == 'text':
+        async def send(user_id):
+            await bot.send_message(chat_id=user_id, text=content_data['text'], reply_markup=reply_markup)
+    elif content_type == 'photo':
+        async def send(user_id):
+            await bot.send_photo(chat_id=user_id, photo=content_data['file_id'],
+                                 caption=content_data.get('caption'), reply_markup=reply_markup)
+    elif content_type == 'video':
+        async def send(user_id):
+            await bot.send_video(chat_id=user_id, video=content_data['file_id'],
+                                 caption=content_data.get('caption'), reply_markup=reply_markup)
+    elif content_type == 'document':
+        async def send(user_id):
+            await bot.send_document(chat_id=user_id, document=content_data['file_id'],
+                                    caption=content_data.get('caption'), reply_markup=reply_markup)
+    elif content_type == 'media_group':
+        media_list = _build_media_list(payload['media_group'])
+
+        async def send(user_id):
+            await bot.send_media_group(chat_id=user_id, media=media_list)
+            if reply_markup:
+                await bot.send_message(chat_id=user_id, text='👇', reply_markup=reply_markup)
+    else:
+        raise ValueError(f'Unknown mailing content type: {content_type}')
+
+    return send
+
+
+async def sleep_until(deadline, should_stop=None):
+    """Спит до deadline (time.monotonic). Возвращает False, если should_stop() сработал раньше."""
+    while True:
+        if should_stop and should_stop():
+            return False
+        delay = deadline - time.monotonic()
+        if delay <= 0:
+            return True
+        await asyncio.sleep(min(delay, 1.0))
+
+
+async def deliver(db, send, segments=None, start_after=0, end_id=None, total=None, window_seconds=0,
+                  on_progress=None, should_stop=None, log=None, checkpoint=None,
+                  concurrency=config.BROADCAST_CONCURRENCY, template=None, storefront=None):
+    """
+    Асинхронный аналог mailing_module.delivery.deliver.
+
+    db - aio_module.db.AsyncDatabase, send - корутина из build_send.
+    Тексты персонализированного поста (template) рендерятся в потоке запросов к базе
+    пачками вместе с чтением получателей.
+    on_progress и сохранение чекпоинта выполняются в потоке запросов к базе.
+    Возвращает словарь successful/failed/blocked/finished/log.
+    """
+    log = log if log is not None else RecipientLog()
+    finished = True
+
+    interval = window_seconds / total if window_seconds and total else 0
+    started_at = time.monotonic()
+    progress_at = started_at
+    last_row_id = start_after
+    collected = len(log)
+    in_flight = deque()
+    retry_args = {}  # Номер получателя -> аргументы send для повтора после 429
+
+    async def send_one(index, args):
+        try:
+            await send(log.ids[index], *args)
+            return SENT
+        except Exception as e:
+            logger.debug(f'Mailing send to {log.ids[index]} failed: {e}')
+            return _status_for_error(e)
+
+    async def submit(row_id, index, args):
+        with send_priority(BROADCAST):
+            # Задача получает копию контекста, а с ним и приоритет рассылки
+            in_flight.append((row_id, index, args, asyncio.create_task(send_one(index, args))))
+        while len(in_flight) >= concurrency:
+            await collect()
+
+    async def collect():
+        nonlocal last_row_id, collected
+        row_id, index, args, task = in_flight.popleft()
+        status = await task
+        log.mark(index, status)
+        if status == RETRYING:
+            retry_args[index] = args
+        # Позиция сдвигается только за получателями, отправки которым уже завершены
+        if row_id is not None:
+            last_row_id = row_id
+            collected = index + 1
+
+    def save_progress(row_id, length):
+        if on_progress:
+            on_progress(row_id)
+        if checkpoint:
+            try:
+                log.save(checkpoint, length=length)
+            except OSError as e:
+                logger.error(f'Failed to save mailing checkpoint {checkpoint}: {e}')
+
+    index = 0
+    rows = db.iter_recipients(compile_segments(segments, storefront), start_after=start_after, end_id=end_id,
+                              template=template)
+    async for row_id, user_id, args in rows:
+        if interval and not await sleep_until(started_at + index * interval, should_stop):
+            finished = False
+            break
+        if should_stop and should_stop():
+            finished = False
+            break
+
+        await submit(row_id, log.add(user_id), args)
+
+        if index % PROGRESS_EVERY_SENDS == 0 or time.monotonic() - progress_at >= PROGRESS_EVERY_SECONDS:
+            await db.run(save_progress, last_row_id, collected)
+            progress_at = time.monotonic()
+        index += 1
+
+    # Получатели, которым не удалось отправить из-за лимита Telegram, повторяются один раз
+    if finished:
+        while in_flight:
+            await collect()
+        retries = log.indexes_with(RETRYING)
+        await db.run(render_missing, db.db, template, log, retries, retry_args)
+        for index in retries:
+            if should_stop and should_stop():
+                finished = False
+                break
+            await submit(None, index, retry_args[index])
+
+    while in_flight:
+        await collect()
+
+    if finished:
+        for index in log.indexes_with(RETRYING):
+            log.mark(index, FAILED)
+
+    await db.run(save_progress, last_row_id, collected)
+
+    blocked = log.count(BLOCKED)
+    return {
+        'successful': log.count(SENT),
+        'failed': log.count(FAILED) + log.count(RETRYING) + blocked,
+        'blocked': blocked,
+        'finished': finished,
+        'log': log,
+    }
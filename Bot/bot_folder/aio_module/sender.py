@@ -0,0 +1,133 @@
+"""
+Лимиты отправки для AsyncTeleBot.
+
+Аналог sender_module.sender.OutboundSender для asyncio-режима: общий лимит
+бота, доля лимита для рассылок и приоритет ответов пользователям
+(приоритет берется из того же send_priority). Токены берутся из корзин
+OutboundSender того же бота (try_take), поэтому у бота один лимит Telegram
+на оба режима отправки, а 429 приостанавливает обе очереди. Запрос не занимает поток,
+пока ждет своей очереди: ожидающие запросы - это futures в приоритетной
+очереди, токены им выдает одна задача event loop. Поэтому число
+одновременных запросов ограничено лимитом Telegram и MAX_CONNECTIONS,
+а не числом потоков.
+
+Запросы направляются в AsyncSender бота по токену: install() подменяет
+telebot.asyncio_helper._process_request, через который идут все вызовы
+API AsyncTeleBot. Обработчики, которые asyncio-режим выполняет синхронно
+(админ-панель), по-прежнему идут через OutboundSender бота.
+"""
+import asyncio
+import itertools
+import time
+
+import aio_module.config as config
+from metrics_module.metrics import registry
+from sender_module.sender import PRIORITY_NAMES, UNTHROTTLED_METHODS, current_priority
+from tracing_module import tracing
+
+_senders = {}  # токен бота -> AsyncSender
+_process_request = None  # исходный telebot.asyncio_helper._process_request
+
+
+async def _route(token, url, method='get', params=None, files=None, **kwargs):
+    sender = _senders.get(token)
+    if sender is None or url in UNTHROTTLED_METHODS:
+        return await _process_request(token, url, method, params, files, **kwargs)
+    return await sender.request(token, url, method, params, files, **kwargs)
+
+
+class AsyncSender:
+    def __init__(self, token, name, limiter):
+        """:param limiter: sender_module.sender.OutboundSender бота, чей лимит делят оба режима отправки"""
+        self.token = token
+        self.name = name
+        self.limiter = limiter
+        self._queue = None  # asyncio.PriorityQueue (priority, номер, future); создается в event loop
+        self._order = itertools.count()
+        self._task = None
+        self.in_flight = 0
+        self.max_in_flight = 0
+        # Те же гистограммы, что у OutboundSender бота
+        self.wait_time = {
+            priority: registry.histogram('sender.queue_wait', bot=name, priority=priority_name)
+            for priority, priority_name in PRIORITY_NAMES.items()
+        }
+        self.timings = {}
+
+    def install(self):
+        """Направляет запросы AsyncTeleBot с токеном self.token через этот AsyncSender."""
+        global _process_request
+        from telebot import asyncio_helper
+        if _process_request is None:
+            _process_request = asyncio_helper._process_request
+            asyncio_helper._process_request = _route
+            asyncio_helper.REQUEST_LIMIT = config.MAX_CONNECTIONS
+            asyncio_helper.REQUEST_TIMEOUT = config.REQUEST_TIMEOUT
+        _senders[self.token] = self
+
+    async def request(self, token, url, method='get', params=None, files=None, **kwargs):
+        from telebot.asyncio_helper import ApiTelegramException
+
+        priority = current_priority()
+        enqueued_at = time.monotonic()
+        await self._acquire(priority)
+        waited = time.monotonic() - enqueued_at
+        self.wait_time[priority].observe(waited)
+        now = time.time()
+        tracing.record_span('sender.queue_wait', now - waited, now, priority=PRIORITY_NAMES[priority])
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        started_at = time.perf_counter()
+        try:
+            with tracing.span(f'telegram.{url}'):
+                return await _process_request(token, url, method, params, files, **kwargs)
+        except ApiTelegramException as e:
+            if e.error_code == 429:
+                self.limiter.pause((e.result_json.get('parameters') or {}).get('retry_after', 1))
+            raise
+        finally:
+            self.in_flight -= 1
+            self._histogram(url).observe(time.perf_counter() - started_at)
+
+    def stats(self):
+        return {
+            'max_in_flight': self.max_in_flight,
+            'queue_wait': {PRIORITY_NAMES[priority]: histogram.summary()
+                           for priority, histogram in self.wait_time.items()},
+        }
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+
+    async def _acquire(self, priority):
+        if self._task is None:
+            self._queue = asyncio.PriorityQueue()
+            self._task = asyncio.create_task(self._dispatch())
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((priority, next(self._order), future))
+        await future
+
+    async def _dispatch(self):
+        """Выдает токены ожидающим запросам: сначала интерактивным, затем транзакционным, затем рассылкам."""
+        while True:
+            item = await self._queue.get()
+            priority, _, future = item
+            if future.cancelled():
+                continue
+
+            delay = self.limiter.try_take(priority)
+            if not delay:
+                future.set_result(None)
+                continue
+
+            # Запрос возвращается в очередь: пока ждем токен, первым может встать запрос с более высоким приоритетом
+            self._queue.put_nowait(item)
+            await asyncio.sleep(delay)
+
+    def _histogram(self, api_method):
+        histogram = self.timings.get(api_method)
+        if histogram is None:
+            histogram = self.timings.setdefault(api_method, registry.histogram('telegram.request', method=api_method))
+        return histogram
@@ -0,0 +1,195 @@
+"""
+Когортная аналитика для /cohorts.
+
+Нужные колонки users и purchases выгружаются одним COPY в NumPy-массивы;
+матрица удержания по неделям регистрации, перцентили трат и распределение
+балансов считаются векторными операциями без циклов по пользователям.
+Удержание недели N - доля пользователей когорты, совершивших покупку
+на N-й неделе после недели регистрации.
+
+NumPy - необязательная зависимость: без него /cohorts сообщает, что модуль недоступен.
+Замер на синтетических данных: bench_module/cohorts.py.
+"""
+import csv
+import io
+import time
+from datetime import datetime
+
+from logger_system import logger
+
+WEEK = 7 * 24 * 3600
+# 1970-01-05 - первый понедельник эпохи; недели считаются с понедельника
+MONDAY_EPOCH = 4 * 24 * 3600
+
+PERCENTILES = (50, 75, 90, 99)
+# Границы корзин распределения балансов ($)
+BALANCE_BUCKETS = (0, 1, 10, 50, 100, 500, 1000)
+
+# Одна выгрузка: kind=0 - пользователь (id, join_date, balance, total_spent),
+# kind=1 - покупка (user_id, purchase_date, amount, 0)
+DATASET_QUERY = """
+    SELECT 0, u.id, EXTRACT(EPOCH FROM u.join_date)::bigint, COALESCE(u.balance, 0), COALESCE(u.total_spent, 0)
+    FROM users u
+    WHERE u.telegram_id IS NOT NULL AND u.join_date IS NOT NULL
+    UNION ALL
+    SELECT 1, p.user_id, EXTRACT(EPOCH FROM p.purchase_date)::bigint, p.amount, 0
+    FROM purchases p
+    WHERE p.status = 'completed' AND p.user_id IS NOT NULL AND p.purchase_date IS NOT NULL
+"""
+
+
+def get_numpy():
+    """Возвращает модуль numpy или None, если он не установлен."""
+    try:
+        import numpy
+        return numpy
+    except ImportError:
+        return None
+
+
+def load_dataset(db):
+    """Выгружает данные одним COPY и разбирает их в массив (n, 5). Возвращает None при ошибке."""
+    np = get_numpy()
+    buffer = io.StringIO()
+    if not db.copy_to(DATASET_QUERY, buffer):
+        return None
+    # Текстовый формат COPY - строки чисел, разделенных табуляцией
+    buffer.seek(0)
+    data = np.loadtxt(buffer, dtype=np.float64, delimiter='\t', ndmin=2)
+    return data.reshape(-1, 5)
+
+
+def _week_index(np, timestamps):
+    return np.floor_divide(timestamps - MONDAY_EPOCH, WEEK).astype(np.int64)
+
+
+def compute(data, weeks=8, now=None):
+    """
+    Считает отчет по выгрузке load_dataset:
+    cohorts - начало недели каждой когорты, sizes - размеры когорт,
+    retention - матрица (weeks, weeks) долей (NaN для еще не наступивших недель),
+    spend_percentiles / purchase_percentiles, balance_distribution.
+    """
+    np = get_numpy()
+    now = now or time.time()
+    kind = data[:, 0]
+    users = data[kind == 0]
+    purchases = data[kind == 1]
+
+    order = np.argsort(users[:, 1], kind='stable')
+    user_ids = users[order, 1].astype(np.int64)
+    join_week = _week_index(np, users[order, 2])
+    balance = users[order, 3]
+    spent = users[order, 4]
+
+    first_week = int(_week_index(np, np.array([now]))[0]) - weeks + 1
+    cohort = join_week - first_week
+    in_cohorts = (cohort >= 0) & (cohort < weeks)
+    sizes = np.bincount(cohort[in_cohorts], minlength=weeks)
+
+    # Покупка -> индекс пользователя (user_ids отсортированы)
+    active = np.zeros(weeks * weeks, dtype=np.int64)
+    if len(user_ids) and len(purchases):
+        purchase_user = purchases[:, 1].astype(np.int64)
+        position = np.minimum(np.searchsorted(user_ids, purchase_user), len(user_ids) - 1)
+        found = user_ids[position] == purchase_user
+        position = position[found]
+        offset = _week_index(np, purchases[found, 2]) - join_week[position]
+        purchase_cohort = cohort[position]
+        valid = (offset >= 0) & (offset < weeks) & (purchase_cohort >= 0) & (purchase_cohort < weeks)
+        # Уникальные пары (пользователь, неделя): несколько покупок за неделю считаются один раз
+        keys = np.unique(position[valid] * weeks + offset[valid])
+        active = np.bincount(cohort[keys // weeks] * weeks + keys % weeks, minlength=weeks * weeks)
+
+    retention = np.full((weeks, weeks), np.nan)
+    np.divide(active.reshape(weeks, weeks), sizes[:, None], out=retention, where=sizes[:, None] > 0)
+    # Недели, которые для когорты еще не наступили
+    future = np.add.outer(np.arange(weeks), np.arange(weeks)) >= weeks
+    retention[future] = np.nan
+
+    spenders = spent[spent > 0]
+    amounts = purchases[:, 3]
+    edges = np.array(BALANCE_BUCKETS, dtype=np.float64)
+    balance_counts = np.bincount(np.searchsorted(edges, balance, side='right'), minlength=len(edges) + 1)
+
+    return {
+        'cohorts': [datetime.fromtimestamp(MONDAY_EPOCH + (first_week + index) * WEEK) for index in range(weeks)],
+        'sizes': sizes.tolist(),
+        'retention': retention,
+        'total_users': int(len(user_ids)),
+        'spenders': int(len(spenders)),
+        'spend_percentiles': np.percentile(spenders, PERCENTILES).tolist() if len(spenders) else None,
+        'purchase_percentiles': np.percentile(amounts, PERCENTILES).tolist() if len(amounts) else None,
+        'balance_distribution': balance_counts.tolist(),
+    }
+
+
+def _balance_labels():
+    labels = [f'< {BALANCE_BUCKETS[0]}$']
+    for low, high in zip(BALANCE_BUCKETS, BALANCE_BUCKETS[1:]):
+        labels.append(f'{low}–{high}$')
+    labels.append(f'≥ {BALANCE_BUCKETS[-1]}$')
+    return labels
+
+
+def _format_percentiles(values):
+    if values is None:
+        return 'нет данных'
+    return ', '.join(f'p{q}: {value:.2f}$' for q, value in zip(PERCENTILES, values))
+
+
+def render_text(report):
+    """Компактная таблица для сообщения (HTML, моноширинный блок)."""
+    weeks = len(report['sizes'])
+    header = 'Когорта  Польз. ' + ''.join(f'{"Н" + str(index):>5}' for index in range(weeks))
+    lines = [header]
+    for cohort_start, size, row in zip(report['cohorts'], report['sizes'], report['retention']):
+        cells = ''.join(f'{"—":>5}' if value != value else f'{value * 100:>4.0f}%' for value in row)
+        lines.append(f'{cohort_start.strftime("%d.%m"):<8} {size:>6} {cells}')
+
+    balance_lines = [
+        f'{label:>10}: {count}' for label, count in zip(_balance_labels(), report['balance_distribution'])
+    ]
+    return (
+        f'📊 <b>Удержание по неделям регистрации</b>\n'
+        f'<i>доля когорты с покупкой на N-й неделе</i>\n'
+        f'<pre>{chr(10).join(lines)}</pre>\n'
+        f'💰 <b>Траты на пользователя</b> ({report["spenders"]} из {report["total_users"]}):\n'
+        f'{_format_percentiles(report["spend_percentiles"])}\n'
+        f'🛒 <b>Сумма покупки:</b> {_format_percentiles(report["purchase_percentiles"])}\n\n'
+        f'💳 <b>Балансы:</b>\n<pre>{chr(10).join(balance_lines)}</pre>'
+    )
+
+
+def render_csv(report):
+    """Отчет в CSV (матрица удержания, перцентили и распределение балансов)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    weeks = len(report['sizes'])
+    writer.writerow(['cohort_week', 'users'] + [f'week_{index}' for index in range(weeks)])
+    for cohort_start, size, row in zip(report['cohorts'], report['sizes'], report['retention']):
+        writer.writerow([cohort_start.strftime('%Y-%m-%d'), size]
+                        + ['' if value != value else f'{value:.4f}' for value in row])
+    writer.writerow([])
+    writer.writerow(['metric'] + [f'p{q}' for q in PERCENTILES])
+    writer.writerow(['spend_per_user'] + [f'{value:.2f}' for value in report['spend_percentiles'] or []])
+    writer.writerow(['purchase_amount'] + [f'{value:.2f}' for value in report['purchase_percentiles'] or []])
+    writer.writerow([])
+    writer.writerow(['balance_bucket', 'users'])
+    for label, count in zip(_balance_labels(), report['balance_distribution']):
+        writer.writerow([label, count])
+    return buffer.getvalue()
+
+
+def build(db, weeks=8):
+    """Выгружает данные и считает отчет. Возвращает (report, timings) или (None, None) при ошибке выгрузки."""
+    started_at = time.perf_counter()
+    data = load_dataset(db)
+    if data is None:
+        return None, None
+    loaded_at = time.perf_counter()
+    report = compute(data, weeks)
+    timings = {'load': loaded_at - started_at, 'compute': time.perf_counter() - loaded_at, 'rows': len(data)}
+    logger.info(f'Cohort analytics: rows={timings["rows"]}, load={timings["load"]:.3f}s, '
+                f'compute={timings["compute"]:.3f}s')
+    return report, timings
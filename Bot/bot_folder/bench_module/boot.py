@@ -0,0 +1,67 @@
+"""
+Замер времени запуска бота до первого апдейта.
+
+bot.py запускается --runs раз отдельным процессом с TELEGRAM_API_URL
+локального фейкового API (bench_module/fake_api.py); первый getUpdates
+возвращает /start, замер идет от запуска процесса до ответа бота на него.
+Подробная разбивка по фазам (BootTimer) пишется в лог запущенного бота.
+
+Запуск: python bench_module/boot.py --runs 5 --latency 0
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_module import fake_api
+
+
+def bench_boot(api_url, answered, runs):
+    bot_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bot.py')
+    env = dict(os.environ, ACCESS_TOKEN=fake_api.TOKEN, TELEGRAM_API_URL=api_url, STOREFRONTS_FILE='')
+    timings = []
+    for _ in range(runs):
+        answered.clear()
+        started_at = time.perf_counter()
+        process = subprocess.Popen([sys.executable, bot_path], env=env, cwd=os.path.dirname(bot_path))
+        try:
+            deadline = time.monotonic() + 60
+            while not answered.wait(0.05):
+                if process.poll() is not None or time.monotonic() > deadline:
+                    sys.exit('Bot did not answer the first update')
+            timings.append(time.perf_counter() - started_at)
+        finally:
+            process.send_signal(signal.SIGTERM)
+            try:
+                process.wait(30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+    print(f'{"boot":8} first update in {statistics.median(timings) * 1000:.0f} ms (median of {runs}, '
+          f'min={min(timings) * 1000:.0f} ms, max={max(timings) * 1000:.0f} ms)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bot boot time to the first answered update')
+    parser.add_argument('--runs', type=int, default=5, help='bot starts')
+    parser.add_argument('--latency', type=float, default=0, help='API response time, seconds')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    answered = multiprocessing.Event()
+    server, api_url = fake_api.start(args.port, args.latency, answered)
+    try:
+        print(f'Time to first update, API latency {args.latency * 1000:.0f} ms')
+        bench_boot(api_url, answered, args.runs)
+    finally:
+        server.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Замер когортной аналитики (/cohorts) на синтетических данных.
+
+Генерирует --users пользователей с регистрацией за последние --days дней
+и --purchases покупок, записывает их в текстовом формате COPY и считает
+отчет analytics_module.cohorts: разбор выгрузки (load_dataset) и расчет (compute)
+замеряются отдельно, как в логе бота.
+
+Запуск: python bench_module/cohorts.py --users 1000000 --purchases 2000000
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics_module import cohorts
+
+
+class _Dump:
+    """Database с одним методом copy_to: отдает заранее сформированную выгрузку."""
+
+    def __init__(self, text):
+        self.text = text
+
+    def copy_to(self, query, file, params=None, csv_header=False):
+        file.write(self.text)
+        return True
+
+
+def generate(np, users, purchases, days, seed=1):
+    """Выгрузка DATASET_QUERY в текстовом формате COPY: пользователи, затем покупки."""
+    rng = np.random.default_rng(seed)
+    now = time.time()
+    join_date = now - rng.uniform(0, days * 24 * 3600, users)
+    user_rows = np.column_stack([
+        np.zeros(users), np.arange(1, users + 1), join_date.astype(np.int64),
+        np.round(rng.exponential(20, users), 2), np.round(rng.exponential(50, users), 2),
+    ])
+    buyers = rng.integers(1, users + 1, purchases)
+    purchase_date = join_date[buyers - 1] + rng.uniform(0, 1, purchases) * (now - join_date[buyers - 1])
+    purchase_rows = np.column_stack([
+        np.ones(purchases), buyers, purchase_date.astype(np.int64),
+        np.round(rng.exponential(15, purchases), 2), np.zeros(purchases),
+    ])
+    buffer = io.StringIO()
+    np.savetxt(buffer, np.vstack([user_rows, purchase_rows]), fmt=['%d', '%d', '%d', '%.2f', '%.2f'],
+               delimiter='\t')
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cohort analytics load and compute time')
+    parser.add_argument('--users', type=int, default=1_000_000)
+    parser.add_argument('--purchases', type=int, default=2_000_000)
+    parser.add_argument('--days', type=int, default=90, help='registration period, days')
+    parser.add_argument('--weeks', type=int, default=8)
+    args = parser.parse_args()
+
+    np = cohorts.get_numpy()
+    if np is None:
+        sys.exit('NumPy is not installed')
+
+    dump = _Dump(generate(np, args.users, args.purchases, args.days))
+    print(f'{args.users} users, {args.purchases} purchases, {len(dump.text) / 2 ** 20:.0f} MiB COPY dump')
+
+    started_at = time.perf_counter()
+    data = cohorts.load_dataset(dump)
+    loaded_at = time.perf_counter()
+    report = cohorts.compute(data, args.weeks)
+    computed_at = time.perf_counter()
+    print(f'load={loaded_at - started_at:.2f}s  compute={computed_at - loaded_at:.2f}s  '
+          f'rows={len(data)}  users={report["total_users"]}  spenders={report["spenders"]}')
+
+
+if __name__ == '__main__':
+    main()
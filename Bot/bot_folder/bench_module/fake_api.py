@@ -0,0 +1,75 @@
+"""
+Локальный фейковый Telegram Bot API для замеров (bench_module, aio_module/bench.py).
+
+Сервер на aiohttp запускается отдельным процессом (start) и отвечает на любой
+метод через latency секунд. getUpdates отдает /start процессу, еще не
+подтвердившему апдейт 1, и затем пустые ответы; answered выставляется,
+когда бот отвечает в BOOT_CHAT_ID.
+"""
+import asyncio
+import multiprocessing
+import time
+
+TOKEN = '123456:bench'
+# Чат, от которого приходит /start в замере запуска
+BOOT_CHAT_ID = 42
+
+
+def _start_update():
+    chat = {'id': BOOT_CHAT_ID, 'type': 'private', 'first_name': 'bench'}
+    return {'update_id': 1, 'message': {
+        'message_id': 1, 'date': int(time.time()), 'chat': chat,
+        'from': {'id': BOOT_CHAT_ID, 'is_bot': False, 'first_name': 'bench'},
+        'text': '/start', 'entities': [{'type': 'bot_command', 'offset': 0, 'length': 6}],
+    }}
+
+
+def serve(port, latency, ready, answered=None):
+    """Запускает фейковый API на 127.0.0.1:port (блокирует поток); ready выставляется после старта."""
+    from aiohttp import web
+
+    async def handle(request):
+        method = request.match_info['tail'].rsplit('/', 1)[-1]
+        # telebot передает параметры в строке запроса, AsyncTeleBot - в теле
+        data = {**request.query, **(await request.post())}
+        if method == 'getMe':
+            return web.json_response({'ok': True, 'result': {
+                'id': 1, 'is_bot': True, 'first_name': 'bench', 'username': 'bench_bot',
+            }})
+        if method == 'getUpdates':
+            if int(data.get('offset') or 0) <= 1:
+                return web.json_response({'ok': True, 'result': [_start_update()]})
+            await asyncio.sleep(1)
+            return web.json_response({'ok': True, 'result': []})
+        await asyncio.sleep(latency)
+        chat_id = int(data.get('chat_id', 0))
+        if answered is not None and chat_id == BOOT_CHAT_ID:
+            answered.set()
+        return web.json_response({'ok': True, 'result': {
+            'message_id': 1, 'date': int(time.time()), 'chat': {'id': chat_id, 'type': 'private'},
+        }})
+
+    async def run():
+        app = web.Application()
+        app.router.add_route('*', '/{tail:.*}', handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, '127.0.0.1', port, backlog=4096).start()
+        ready.set()
+        await asyncio.Event().wait()
+
+    asyncio.run(run())
+
+
+def start(port, latency, answered=None):
+    """
+    Запускает фейковый API в отдельном процессе и ждет его готовности.
+    Возвращает (процесс, API_URL для telebot).
+    """
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(target=serve, args=(port, latency, ready, answered), daemon=True)
+    server.start()
+    if not ready.wait(10):
+        server.terminate()
+        raise RuntimeError('Fake API server did not start')
+    return server, f'http://127.0.0.1:{port}/bot{{0}}/{{1}}'
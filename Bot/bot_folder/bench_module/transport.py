@@ -0,0 +1,95 @@
+"""
+Сравнение HTTP-транспорта запросов к Telegram API.
+
+Одни и те же --requests вызовов sendMessage выполняются --threads потоками
+через TeleBot против локального фейкового API (bench_module/fake_api.py):
+- default: сессии telebot по умолчанию (requests.Session на поток, пул urllib3
+  по умолчанию);
+- pooled: transport_module.transport.Transport (одна сессия с пулом keep-alive
+  соединений размером --threads) как CUSTOM_REQUEST_SENDER.
+Для каждого режима выводятся запросы в секунду, медиана и 95-й перцентиль
+времени запроса и процессорное время.
+
+Запуск: python bench_module/transport.py --requests 5000 --threads 32 --latency 0.05
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_module import fake_api
+
+
+def _measure(name, requests_count, threads):
+    from telebot import TeleBot
+
+    bot = TeleBot(fake_api.TOKEN, threaded=False)
+
+    def send(user_id):
+        started_at = time.perf_counter()
+        bot.send_message(chat_id=user_id, text='bench')
+        return time.perf_counter() - started_at
+
+    cpu_started_at = time.process_time()
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        timings = sorted(executor.map(send, range(1, requests_count + 1)))
+    elapsed = time.perf_counter() - started_at
+    cpu = time.process_time() - cpu_started_at
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f'{name:8} {requests_count / elapsed:10.0f} req/s  elapsed={elapsed:.2f}s  cpu={cpu:.2f}s  '
+          f'p50={statistics.median(timings) * 1000:.1f} ms  p95={p95 * 1000:.1f} ms')
+
+
+def bench_default(api_url, requests_count, threads):
+    from telebot import apihelper
+
+    apihelper.API_URL = api_url
+    apihelper.CUSTOM_REQUEST_SENDER = None
+    _measure('default', requests_count, threads)
+
+
+def bench_pooled(api_url, requests_count, threads):
+    from telebot import apihelper
+    from transport_module.transport import Transport
+
+    transport = Transport(threads, api_url=api_url, dns_cache_ttl=0)
+    transport.install()
+    apihelper.CUSTOM_REQUEST_SENDER = transport.request
+    try:
+        _measure('pooled', requests_count, threads)
+    finally:
+        apihelper.CUSTOM_REQUEST_SENDER = None
+        transport.session.close()
+
+
+def main():
+    import logger_system
+
+    parser = argparse.ArgumentParser(description='Telegram API transport: telebot default session vs pooled')
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--threads', type=int, default=32, help='concurrent requests (and pool size)')
+    parser.add_argument('--latency', type=float, default=0.05, help='API response time, seconds')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--mode', choices=('both', 'default', 'pooled'), default='both')
+    args = parser.parse_args()
+
+    server, api_url = fake_api.start(args.port, args.latency)
+    try:
+        print(f'{args.requests} requests, {args.threads} threads, API latency {args.latency * 1000:.0f} ms')
+        if args.mode in ('both', 'default'):
+            bench_default(api_url, args.requests, args.threads)
+        if args.mode in ('both', 'pooled'):
+            bench_pooled(api_url, args.requests, args.threads)
+    finally:
+        server.terminate()
+        logger_system.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,46 +1,237 @@
-import config_module.config as config
+import time
+BOOT_STARTED_AT = time.perf_counter()
+
 from keyboard_module import keyboard
 from telebot import TeleBot
-from telebot.types import BotCommand, InputMediaPhoto, InputMediaVideo, InputMediaDocument
-from db_module.db import Database
-import time
+from telebot.types import BotCommand
+from mailing_module.segments import SEGMENTS, compile_segments, describe_segments
+from mailing_module.delivery import _build_media_list, build_send, deliver, mailing_title, statistics_text
+from mailing_module.personalize import FIELDS as PERSONAL_FIELDS, has_placeholders, template_for
+from mailing_module.recipients import RecipientLog
+from mailing_module.sessions import SessionStore, SessionSweeper
+from stats_module.rollups import build_report, parse_period
+from ratelimit_module.limiter import ChatRateLimiter
+import catalog_module.config as catalog_config
+from catalog_module.catalog import inline_result
+from account_module.account import render_balance, render_orders, NOT_REGISTERED_TEXT, UNAVAILABLE_TEXT, WELCOME_TEXT
+import mailing_module.config as mailing_config
+from sender_module.sender import OutboundSender
+import logger_system
+from logger_system import logger, logged_handler
+from metrics_module.metrics import BootTimer
+import io
+import os
+import signal
+import sys
+import threading
 from datetime import datetime
 
+boot = BootTimer(BOOT_STARTED_AT)
+boot.mark('imports')
+
 
 class Bot:
-    def __init__(self):
-        self.bot = TeleBot(token=config.ACCESS_TOKEN)
-        self.db = Database()
-        self.mailing_states = {}  # Хранит состояние рассылки для каждого админа
+    def __init__(self, storefront, shared):
+        """
+        :param storefront: hosting_module.hosting.Storefront - токен, админы и лимиты отправки бота
+        :param shared: hosting_module.hosting.SharedResources - общие для всех ботов процесса ресурсы
+        """
+        self.storefront = storefront
+        self.name = storefront.name
+        self.admin_ids = set(storefront.admin_ids)
+        self.shared = shared
+        # Аудитория рассылок витрины: ее пользователи (основной - и не привязанные ни к одной витрине)
+        self.audience = [self.name, self.name == shared.storefronts[0].name]
+        self.bot = TeleBot(token=storefront.token)
+        self.db = shared.db
+        self.scheduler = shared.scheduler
+        self.transport = shared.transport
+        self.catalog_index = shared.catalog_index
+        self.accounts = shared.accounts
+        self.mailing_states = SessionStore()  # Хранит состояние рассылки для каждого админа
         self.media_group_timers = {}  # Хранит таймеры для медиа-групп
+        self.import_waiting = set()  # Админы, от которых ждем файл /import
+        # Удаляет брошенные сессии /mail вместе с их таймерами и медиа-группами
+        self.session_sweeper = SessionSweeper(
+            self.mailing_states,
+            self.media_group_timers,
+            ttl=mailing_config.SESSION_TTL_MINUTES * 60,
+            interval=mailing_config.SESSION_SWEEP_INTERVAL,
+            on_expire=self._notify_session_expired,
+            name=self.name
+        )
+        # Запросы бота к Telegram API идут через его планировщик с приоритетами (свой лимит Telegram)
+        # и общий для всех ботов пул keep-alive соединений
+        self.sender = OutboundSender(
+            workers=storefront.workers,
+            global_rate=storefront.global_rate,
+            broadcast_rate=storefront.broadcast_rate,
+            transport=self.transport,
+            token=storefront.token,
+            name=self.name
+        )
+        self.sender.install()
+        self.sender.start()
+        # Лимиты апдейтов на чат: флуд отбрасывается до обработчиков и базы данных
+        self.rate_limiter = ChatRateLimiter(exempt_chat_ids=self.admin_ids)
+        shared.add(self)
+        self.bot.process_new_updates = self._process_new_updates
+        self.bot._exec_task = self._exec_task
+        self._inflight = 0  # Количество выполняющихся сейчас обработчиков
+        self._inflight_cond = threading.Condition()
+        # Ответы getUpdates и задержка апдейтов (для сторожа зависаний и /health)
+        from health_module.watchdog import UpdateLag
+        self.health = UpdateLag(self.name)
+        self._restart_polling = threading.Event()
+        self._stopping = False
+
+    # Поля апдейта, которым проставляется update_id для логов
+    UPDATE_FIELDS = ('message', 'edited_message', 'callback_query', 'inline_query', 'channel_post')
+
+    def _process_new_updates(self, updates):
+        """Передает в telebot апдейты, прошедшие _accept_updates."""
+        self.health.polled()
+        if self._stopping:
+            # stop() мог прийти, пока _poll() запускал polling заново и тот сбрасывал флаг остановки
+            self.bot.stop_polling()
+        TeleBot.process_new_updates(self.bot, self._accept_updates(updates))
+
+    def _accept_updates(self, updates):
+        """
+        Подтверждает апдейты и учитывает активность, отбрасывает апдейты сверх лимитов чата,
+        проставляет update_id и время получения вложенным объектам апдейта.
+        Возвращает апдейты для обработчиков.
+        """
+        received_at = time.time()
+        if updates:
+            # Отброшенные апдейты тоже подтверждаются, иначе Telegram пришлет их снова
+            last_update_id = max(update.update_id for update in updates)
+            if last_update_id > self.bot.last_update_id:
+                self.bot.last_update_id = last_update_id
+            if self.shared.activity:
+                self.shared.activity.record(updates)
+            updates = self.rate_limiter.filter(updates)
+        for update in updates:
+            for field in self.UPDATE_FIELDS:
+                obj = getattr(update, field, None)
+                if obj is not None:
+                    obj.update_id = update.update_id
+                    obj.received_at = received_at
+        return updates
+
+    def _exec_task(self, task, *args, **kwargs):
+        """
+        Считает выполняющиеся обработчики, чтобы при остановке дождаться их завершения,
+        и замеряет задержку апдейта к запуску обработчика.
+        """
+        def tracked_task(*task_args, **task_kwargs):
+            if task_args:
+                self.health.dispatched(task_args[0])
+            try:
+                return task(*task_args, **task_kwargs)
+            finally:
+                boot.first_update_handled()
+                with self._inflight_cond:
+                    self._inflight -= 1
+                    self._inflight_cond.notify_all()
+
+        with self._inflight_cond:
+            self._inflight += 1
+        TeleBot._exec_task(self.bot, tracked_task, *args, **kwargs)
+
+    def _spawn_tracked(self, name, target, *args):
+        """Запускает target в отдельном потоке; drain() дождется его завершения, как и обработчиков."""
+        def run():
+            try:
+                target(*args)
+            except Exception:
+                logger.exception(f'{name} failed')
+            finally:
+                with self._inflight_cond:
+                    self._inflight -= 1
+                    self._inflight_cond.notify_all()
+
+        with self._inflight_cond:
+            self._inflight += 1
+        threading.Thread(target=run, name=name, daemon=True).start()
     
     def is_admin(self, user_id):
-        """Проверяет, является ли пользователь админом."""
-        return user_id in config.ADMIN_IDS
+        """Проверяет, является ли пользователь админом этой витрины."""
+        return user_id in self.admin_ids
     
-    def run(self):
-
-        self.bot.set_my_commands(
-            commands=[
-                BotCommand('start', 'Запустить бота'),
-                # BotCommand('mail', 'Рассылка (только для админов)'),
-                # BotCommand('stats', 'Статистика пользователей (только для админов)')
-            ]
-        )
+    def setup(self):
+        """
+        Регистрирует обработчики и запускает в фоне разовую настройку
+        (set_my_commands, первое подключение к БД), не задерживая polling.
+        """
+        with boot.phase('handlers'):
+            self._register_handlers()
+
+        self._setup_thread = threading.Thread(target=self._background_setup, name='BootSetup', daemon=True)
+        self._setup_thread.start()
 
+    def wait_for_setup(self, timeout=None):
+        """Дожидается завершения фоновой настройки (нужно для прогрева перед передачей polling)."""
+        self._setup_thread.join(timeout)
+
+    def _background_setup(self):
+        try:
+            with boot.phase('set_my_commands'):
+                self.bot.set_my_commands(
+                    commands=[
+                        BotCommand('start', 'Запустить бота'),
+                        BotCommand('balance', 'Баланс'),
+                        BotCommand('orders', 'Последние заказы'),
+                        # BotCommand('mail', 'Рассылка (только для админов)'),
+                        # BotCommand('stats', 'Статистика пользователей (только для админов)')
+                    ]
+                )
+        except Exception as e:
+            logger.error(f'set_my_commands failed for {self.name}: {e}')
+
+        self.session_sweeper.start()
+        # Общие фоновые задачи запускает первый из ботов, завершивший настройку
+        self.shared.start(boot)
+
+    def _register_handlers(self):
         @self.bot.message_handler(commands=['start'])
+        @logged_handler
         def start_cmd(message):
             # Сохраняем пользователя в базу данных
             self.db.add_user(
                 user_id=message.chat.id,
                 username=message.chat.username,
-                first_name=message.chat.first_name
+                first_name=message.chat.first_name,
+                storefront=self.name
+            )
+            self.bot.send_message(chat_id=message.chat.id, text=WELCOME_TEXT, reply_markup=keyboard.app_link())
+
+        @self.bot.message_handler(commands=['balance'])
+        @logged_handler
+        def balance_cmd(message):
+            """Баланс пользователя (из кэша, если он актуален)."""
+            self._send_account(message.chat.id, render_balance)
+
+        @self.bot.message_handler(commands=['orders'])
+        @logged_handler
+        def orders_cmd(message):
+            """Последние заказы пользователя (из кэша, если он актуален)."""
+            self._send_account(message.chat.id, render_orders)
+
+        @self.bot.inline_handler(func=lambda query: True)
+        @logged_handler
+        def inline_search(query):
+            """Поиск по каталогу (@bot steam 50): только индекс в памяти, без запросов к сети и базе."""
+            items = self.catalog_index.search(query.query, catalog_config.RESULTS_LIMIT)
+            reply_markup = keyboard.app_link()
+            self.bot.answer_inline_query(
+                query.id,
+                [inline_result(item, reply_markup) for item in items],
+                cache_time=catalog_config.INLINE_CACHE_TIME
             )
-            self.bot.send_message(chat_id=message.chat.id,
-                                  text='Добро пожаловать!\nВоспользуйтесь кнопкой, чтобы открыть приложение 👇',
-                                  reply_markup=keyboard.app_link())
 
         @self.bot.message_handler(commands=['mail'])
+        @logged_handler
         def mail_cmd(message):
             """Команда для начала рассылки."""
             if not self.is_admin(message.chat.id):
@@ -59,10 +250,17 @@ class Bot:
                 'button_url': None,
                 'content_type': None,
                 'content_data': None,
+                'source_chat_id': None,  # Исходное сообщение админа для режима копирования
+                'source_message_ids': [],
                 'waiting_for_button_choice': False,
                 'waiting_for_button_type': False,
                 'waiting_for_button_text': False,
-                'waiting_for_button_url': False
+                'waiting_for_button_url': False,
+                'segments': [],  # Сегменты аудитории [(key, value), ...]
+                'waiting_for_segment': None,  # Ключ сегмента, для которого ждем значение
+                'run_at': None,  # Время отложенной рассылки (unix time)
+                'waiting_for_schedule_time': False,
+                'waiting_for_window': False
             }
             self.bot.send_message(
                 chat_id=message.chat.id,
@@ -73,21 +271,26 @@ class Bot:
                      '• Видео (video)\n'
                      '• Документы (document)\n'
                      '• Медиа-группы (несколько файлов)\n\n'
+                     'В тексте и подписи можно подставить данные получателя: '
+                     + ', '.join(f'{{{name}}}' for name in PERSONAL_FIELDS) +
+                     ', со значением по умолчанию - {first_name|друг}.\n\n'
                      'Для отмены отправьте /cancel'
             )
 
         @self.bot.callback_query_handler(func=lambda call: call.data.startswith('mail_'))
+        @logged_handler
         def handle_mailing_callbacks(call):
             """Обработка callback-запросов для рассылки."""
             admin_id = call.message.chat.id
             
-            if admin_id not in self.mailing_states:
+            state = self.mailing_states.get(admin_id)
+            if state is None:
                 self.bot.answer_callback_query(call.id, "Сессия рассылки истекла")
                 return
             
             if call.data == 'mail_add_button_yes':
-                self.mailing_states[admin_id]['waiting_for_button_choice'] = False
-                self.mailing_states[admin_id]['waiting_for_button_type'] = True
+                state['waiting_for_button_choice'] = False
+                state['waiting_for_button_type'] = True
                 from telebot import types
                 keyboard = types.InlineKeyboardMarkup()
                 keyboard.add(
@@ -103,9 +306,9 @@ class Bot:
                 self.bot.answer_callback_query(call.id)
                 
             elif call.data == 'mail_button_type_url':
-                self.mailing_states[admin_id]['button_type'] = 'url'
-                self.mailing_states[admin_id]['waiting_for_button_type'] = False
-                self.mailing_states[admin_id]['waiting_for_button_text'] = True
+                state['button_type'] = 'url'
+                state['waiting_for_button_type'] = False
+                state['waiting_for_button_text'] = True
                 self.bot.edit_message_text(
                     chat_id=admin_id,
                     message_id=call.message.message_id,
@@ -114,10 +317,10 @@ class Bot:
                 self.bot.answer_callback_query(call.id)
                 
             elif call.data == 'mail_button_type_webapp':
-                self.mailing_states[admin_id]['button_type'] = 'web_app'
-                self.mailing_states[admin_id]['button_url'] = 'https://os-gift.store/'  # Фиксированный URL
-                self.mailing_states[admin_id]['waiting_for_button_type'] = False
-                self.mailing_states[admin_id]['waiting_for_button_text'] = True
+                state['button_type'] = 'web_app'
+                state['button_url'] = 'https://os-gift.store/'  # Фиксированный URL
+                state['waiting_for_button_type'] = False
+                state['waiting_for_button_text'] = True
                 self.bot.edit_message_text(
                     chat_id=admin_id,
                     message_id=call.message.message_id,
@@ -126,11 +329,52 @@ class Bot:
                 self.bot.answer_callback_query(call.id)
                 
             elif call.data == 'mail_add_button_no':
-                self.mailing_states[admin_id]['waiting_for_button_choice'] = False
+                state['waiting_for_button_choice'] = False
+                self.bot.delete_message(chat_id=admin_id, message_id=call.message.message_id)
+                self._show_audience(admin_id)
+                self.bot.answer_callback_query(call.id)
+
+            elif call.data == 'mail_seg_done':
                 self.bot.delete_message(chat_id=admin_id, message_id=call.message.message_id)
                 self._show_preview(admin_id)
                 self.bot.answer_callback_query(call.id)
+
+            elif call.data == 'mail_seg_reset':
+                state['segments'] = []
+                self._show_audience(admin_id, message_id=call.message.message_id)
+                self.bot.answer_callback_query(call.id)
+
+            elif call.data.startswith('mail_seg_'):
+                key = call.data[len('mail_seg_'):]
+                segment = SEGMENTS.get(key)
+                if segment is None:
+                    self.bot.answer_callback_query(call.id)
+                    return
+                if segment.has_value:
+                    # Значение параметра админ вводит следующим сообщением
+                    state['waiting_for_segment'] = key
+                    self.bot.edit_message_text(
+                        chat_id=admin_id,
+                        message_id=call.message.message_id,
+                        text=segment.prompt
+                    )
+                else:
+                    self._add_segment(admin_id, key, None)
+                    self._show_audience(admin_id, message_id=call.message.message_id)
+                self.bot.answer_callback_query(call.id)
                 
+            elif call.data in ('mail_schedule', 'mail_spread'):
+                self.bot.delete_message(chat_id=admin_id, message_id=call.message.message_id)
+                if call.data == 'mail_schedule':
+                    state['waiting_for_schedule_time'] = True
+                    text = '🕒 Укажите дату и время отправки в формате ДД.ММ.ГГГГ ЧЧ:ММ:'
+                else:
+                    state['run_at'] = time.time()
+                    state['waiting_for_window'] = True
+                    text = '⏳ На сколько минут растянуть отправку?'
+                self.bot.send_message(chat_id=admin_id, text=text)
+                self.bot.answer_callback_query(call.id)
+
             elif call.data == 'mail_confirm':
                 self.bot.delete_message(chat_id=admin_id, message_id=call.message.message_id)
                 self._start_mailing(admin_id)
@@ -142,7 +386,7 @@ class Bot:
                 if admin_id in self.media_group_timers:
                     self.media_group_timers[admin_id].cancel()
                     del self.media_group_timers[admin_id]
-                del self.mailing_states[admin_id]
+                self.mailing_states.pop(admin_id, None)
                 self.bot.send_message(
                     chat_id=admin_id,
                     text='❌ Рассылка отменена.'
@@ -150,21 +394,135 @@ class Bot:
                 self.bot.answer_callback_query(call.id)
 
         @self.bot.message_handler(commands=['cancel'])
+        @logged_handler
         def cancel_cmd(message):
-            """Отмена рассылки."""
+            """Отмена рассылки или ожидания файла /import."""
             admin_id = message.chat.id
-            if admin_id in self.mailing_states:
+            if admin_id in self.import_waiting:
+                self.import_waiting.discard(admin_id)
+                self.bot.send_message(chat_id=admin_id, text='❌ Импорт отменен.')
+            if self.mailing_states.pop(admin_id, None) is not None:
                 # Отменяем таймер, если есть
                 if admin_id in self.media_group_timers:
                     self.media_group_timers[admin_id].cancel()
                     del self.media_group_timers[admin_id]
-                del self.mailing_states[admin_id]
                 self.bot.send_message(
                     chat_id=admin_id,
                     text='❌ Рассылка отменена.'
                 )
 
+        @self.bot.message_handler(commands=['cohorts'])
+        @logged_handler
+        def cohorts_cmd(message):
+            """Когорты, удержание и распределения (/cohorts [csv] [недель])."""
+            if not self.is_admin(message.chat.id):
+                self.bot.send_message(
+                    chat_id=message.chat.id,
+                    text='❌ У вас нет прав для использования этой команды.'
+                )
+                return
+
+            from analytics_module import cohorts
+            if cohorts.get_numpy() is None:
+                self.bot.send_message(chat_id=message.chat.id, text='❌ Для /cohorts нужен пакет numpy.')
+                return
+
+            args = (message.text or '').split()[1:]
+            as_csv = 'csv' in args
+            weeks = next((int(arg) for arg in args if arg.isdigit()), 8)
+            weeks = min(max(weeks, 2), 26)
+
+            self.bot.send_message(chat_id=message.chat.id, text='⏳ Считаю когорты...')
+            # Выгрузка и расчет идут вне потоков обработчиков telebot
+            self._spawn_tracked(f'Cohorts-{message.chat.id}', self._send_cohorts, message.chat.id, weeks, as_csv)
+
+        @self.bot.message_handler(commands=['activity'])
+        @logged_handler
+        def activity_cmd(message):
+            """Активность пользователей (/activity [дней неактивности] [csv])."""
+            if not self.is_admin(message.chat.id):
+                self.bot.send_message(
+                    chat_id=message.chat.id,
+                    text='❌ У вас нет прав для использования этой команды.'
+                )
+                return
+
+            args = (message.text or '').split()[1:]
+            days = next((int(arg) for arg in args if arg.isdigit() and int(arg) > 0), None)
+            if 'csv' in args:
+                if days is None:
+                    self.bot.send_message(chat_id=message.chat.id, text='❌ Укажите число дней: /activity 30 csv')
+                    return
+                self.bot.send_message(chat_id=message.chat.id, text='⏳ Выгружаю неактивных пользователей...')
+                self._spawn_tracked(f'ActivityExport-{message.chat.id}', self._send_inactive_users,
+                                    message.chat.id, days)
+                return
+
+            from activity_module import report as activity_report
+            text = activity_report.build_report(self.db, self.shared.activity, days)
+            if text is None:
+                self.bot.send_message(chat_id=message.chat.id, text='❌ Не удалось получить данные из базы.')
+                return
+            self.bot.send_message(
+                chat_id=message.chat.id,
+                text=text + '\n\n<i>/activity N - неактивные N дней, /activity N csv - выгрузка</i>',
+                parse_mode='HTML'
+            )
+
+        @self.bot.message_handler(commands=['schedules'])
+        @logged_handler
+        def schedules_cmd(message):
+            """Список запланированных рассылок с возможностью отмены."""
+            if not self.is_admin(message.chat.id):
+                self.bot.send_message(
+                    chat_id=message.chat.id,
+                    text='❌ У вас нет прав для использования этой команды.'
+                )
+                return
+
+            schedules = self._own_schedules()
+            if not schedules:
+                self.bot.send_message(chat_id=message.chat.id, text='🕒 Запланированных рассылок нет.')
+                return
+
+            from telebot import types
+            keyboard_to_use = types.InlineKeyboardMarkup(row_width=1)
+            lines = ['🕒 <b>Запланированные рассылки:</b>\n']
+            for schedule in schedules:
+                run_at = datetime.fromtimestamp(schedule['run_at']).strftime('%d.%m.%Y %H:%M')
+                status = '▶️ идет' if schedule['status'] == 'running' else '⏳ ожидает'
+                line = f'#{schedule["id"]} - {run_at}, {status}'
+                if schedule['window_seconds']:
+                    line += f', растянута на {int(schedule["window_seconds"] // 60)} мин'
+                lines.append(line)
+                keyboard_to_use.add(types.InlineKeyboardButton(
+                    text=f'❌ Отменить #{schedule["id"]}', callback_data=f'sched_cancel_{schedule["id"]}'
+                ))
+            self.bot.send_message(
+                chat_id=message.chat.id,
+                text='\n'.join(lines),
+                parse_mode='HTML',
+                reply_markup=keyboard_to_use
+            )
+
+        @self.bot.callback_query_handler(func=lambda call: call.data.startswith('sched_cancel_'))
+        @logged_handler
+        def handle_schedule_cancel(call):
+            """Отмена запланированной рассылки."""
+            if not self.is_admin(call.message.chat.id):
+                self.bot.answer_callback_query(call.id)
+                return
+            schedule_id = int(call.data[len('sched_cancel_'):])
+            if not any(schedule['id'] == schedule_id for schedule in self._own_schedules()):
+                self.bot.answer_callback_query(call.id, f'Рассылка #{schedule_id} не найдена')
+                return
+            if self.scheduler.cancel(schedule_id):
+                self.bot.answer_callback_query(call.id, f'Рассылка #{schedule_id} отменена')
+            else:
+                self.bot.answer_callback_query(call.id, f'Рассылка #{schedule_id} уже завершена')
+
         @self.bot.message_handler(commands=['stats'])
+        @logged_handler
         def stats_cmd(message):
             """Команда для просмотра статистики пользователей."""
             if not self.is_admin(message.chat.id):
@@ -173,6 +531,25 @@ class Bot:
                     text='❌ У вас нет прав для использования этой команды.'
                 )
                 return
+
+            # /stats <период> - тренды по ежедневным агрегатам
+            parts = (message.text or '').split(maxsplit=1)
+            if len(parts) > 1:
+                try:
+                    days = parse_period(parts[1])
+                except ValueError:
+                    self.bot.send_message(
+                        chat_id=message.chat.id,
+                        text='❌ Неизвестный период.\n\n'
+                             'Примеры: /stats week, /stats month, /stats quarter, /stats year, /stats 14d, /stats 4w'
+                    )
+                    return
+                self.bot.send_message(
+                    chat_id=message.chat.id,
+                    text=build_report(self.db, days),
+                    parse_mode='HTML'
+                )
+                return
             
             # Получаем статистику
             stats = self.db.get_users_statistics()
@@ -212,23 +589,66 @@ class Bot:
                 parse_mode='HTML'
             )
 
+        @self.bot.message_handler(commands=['import'])
+        @logged_handler
+        def import_cmd(message):
+            """Массовый импорт пользователей из CSV или JSON файла."""
+            if not self.is_admin(message.chat.id):
+                self.bot.send_message(
+                    chat_id=message.chat.id,
+                    text='❌ У вас нет прав для использования этой команды.'
+                )
+                return
+
+            self.import_waiting.add(message.chat.id)
+            self.bot.send_message(
+                chat_id=message.chat.id,
+                text='📥 Отправьте файл с chat id пользователей.\n\n'
+                     'Поддерживаются:\n'
+                     '• CSV: telegram_id,username,first_name (username и first_name необязательны)\n'
+                     '• JSON: [123, {"telegram_id": 456, "username": "name"}]\n'
+                     '• JSON Lines (.jsonl)\n\n'
+                     'Для отмены отправьте /cancel'
+            )
+
+        @self.bot.message_handler(content_types=['document'], func=lambda m: m.chat.id in self.import_waiting)
+        @logged_handler
+        def handle_import_file(message):
+            """Файл для /import."""
+            import importer_module.config as importer_config
+            admin_id = message.chat.id
+            document = message.document
+            if document.file_size and document.file_size > importer_config.MAX_FILE_SIZE:
+                self.bot.send_message(
+                    chat_id=admin_id,
+                    text=f'❌ Файл больше {importer_config.MAX_FILE_SIZE // (1024 * 1024)} МБ. '
+                         f'Разделите его или используйте python importer_module/importer.py на сервере.'
+                )
+                return
+
+            self.import_waiting.discard(admin_id)
+            status_msg = self.bot.send_message(chat_id=admin_id, text='⏳ Импорт: скачивание файла...')
+            # Импорт идет вне потоков обработчиков telebot
+            self._spawn_tracked(f'Import-{admin_id}', self._run_import, admin_id, status_msg.message_id,
+                                document.file_id, document.file_name or '')
+
         # Обработчик для медиа-групп (должен быть первым, чтобы перехватывать media_group_id)
         @self.bot.message_handler(content_types=['photo', 'video', 'document'], func=lambda m: m.media_group_id is not None)
+        @logged_handler
         def handle_media_group(message):
             """Обработка медиа-групп для рассылки."""
-            if message.chat.id not in self.mailing_states:
-                return
-            
-            if not self.mailing_states[message.chat.id]['waiting_for_content']:
+            admin_id = message.chat.id
+            state = self.mailing_states.get(admin_id)
+            if state is None or not state['waiting_for_content']:
                 return
             
             media_group_id = message.media_group_id
-            admin_id = message.chat.id
             
             # Если это новая медиа-группа, инициализируем
-            if self.mailing_states[admin_id]['media_group_id'] != media_group_id:
-                self.mailing_states[admin_id]['media_group'] = []
-                self.mailing_states[admin_id]['media_group_id'] = media_group_id
+            if state['media_group_id'] != media_group_id:
+                state['media_group'] = []
+                state['source_message_ids'] = []
+                state['media_group_id'] = media_group_id
                 # Отменяем предыдущий таймер, если есть
                 if admin_id in self.media_group_timers:
                     self.media_group_timers[admin_id].cancel()
@@ -239,6 +659,9 @@ class Bot:
                 'file_id': None,
                 'caption': message.caption
             }
+            # Подпись с полями получателя сохраняется в HTML, как и у одиночного поста
+            if has_placeholders(message.caption):
+                media_item['template'] = message.html_caption
             
             if message.photo:
                 media_item['file_id'] = message.photo[-1].file_id
@@ -247,42 +670,93 @@ class Bot:
             elif message.document:
                 media_item['file_id'] = message.document.file_id
             
-            self.mailing_states[admin_id]['media_group'].append(media_item)
+            state['media_group'].append(media_item)
+            state['source_chat_id'] = admin_id
+            state['source_message_ids'].append(message.message_id)
             
             # Перезапускаем таймер для обработки группы через 1.5 секунды после последнего сообщения
-            import threading
             timer = threading.Timer(1.5, self._process_media_group, args=[admin_id, media_group_id])
             timer.start()
             self.media_group_timers[admin_id] = timer
 
         @self.bot.message_handler(content_types=['photo', 'video', 'document', 'text'])
+        @logged_handler
         def handle_mailing_content(message):
             """Обработка контента для рассылки."""
             admin_id = message.chat.id
             
-            if admin_id not in self.mailing_states:
+            state = self.mailing_states.get(admin_id)
+            if state is None:
+                return
+
+            # Обработка ввода времени отложенной рассылки
+            if state.get('waiting_for_schedule_time'):
+                try:
+                    run_at = datetime.strptime((message.text or '').strip(), '%d.%m.%Y %H:%M').timestamp()
+                except ValueError:
+                    self.bot.send_message(
+                        chat_id=admin_id,
+                        text='❌ Неверный формат. Укажите дату и время в формате ДД.ММ.ГГГГ ЧЧ:ММ:'
+                    )
+                    return
+                if run_at <= time.time():
+                    self.bot.send_message(chat_id=admin_id, text='❌ Это время уже прошло. Укажите время в будущем:')
+                    return
+                state['run_at'] = run_at
+                state['waiting_for_schedule_time'] = False
+                state['waiting_for_window'] = True
+                self.bot.send_message(
+                    chat_id=admin_id,
+                    text='⏳ На сколько минут растянуть отправку? (0 - отправить сразу)'
+                )
+                return
+
+            # Обработка ввода окна отправки
+            if state.get('waiting_for_window'):
+                text = (message.text or '').strip()
+                if not text.isdigit():
+                    self.bot.send_message(chat_id=admin_id, text='❌ Укажите целое число минут:')
+                    return
+                state['waiting_for_window'] = False
+                self._schedule_mailing(admin_id, state['run_at'], int(text) * 60)
+                return
+
+            # Обработка ввода значения сегмента аудитории
+            segment_key = state.get('waiting_for_segment')
+            if segment_key:
+                try:
+                    value = SEGMENTS[segment_key].parse(message.text or '')
+                except ValueError:
+                    self.bot.send_message(
+                        chat_id=admin_id,
+                        text=f'❌ Некорректное значение.\n{SEGMENTS[segment_key].prompt}'
+                    )
+                    return
+                state['waiting_for_segment'] = None
+                self._add_segment(admin_id, segment_key, value)
+                self._show_audience(admin_id)
                 return
             
             # Обработка ввода текста кнопки
-            if self.mailing_states[admin_id].get('waiting_for_button_text'):
+            if state.get('waiting_for_button_text'):
                 if message.text:
-                    self.mailing_states[admin_id]['button_text'] = message.text
-                    self.mailing_states[admin_id]['waiting_for_button_text'] = False
+                    state['button_text'] = message.text
+                    state['waiting_for_button_text'] = False
                     
                     # Если тип кнопки - URL, запрашиваем URL
-                    if self.mailing_states[admin_id].get('button_type') == 'url':
-                        self.mailing_states[admin_id]['waiting_for_button_url'] = True
+                    if state.get('button_type') == 'url':
+                        state['waiting_for_button_url'] = True
                         self.bot.send_message(
                             chat_id=admin_id,
                             text='🔗 Укажите URL-ссылку для кнопки:'
                         )
                     else:
-                        # Для Web App URL уже установлен, сразу показываем превью
-                        self._show_preview(admin_id)
+                        # Для Web App URL уже установлен, сразу переходим к выбору аудитории
+                        self._show_audience(admin_id)
                 return
             
             # Обработка ввода URL кнопки
-            if self.mailing_states[admin_id].get('waiting_for_button_url'):
+            if state.get('waiting_for_button_url'):
                 if message.text:
                     url = message.text.strip()
                     # Простая проверка URL
@@ -292,12 +766,12 @@ class Bot:
                             text='❌ URL должен начинаться с http:// или https://\nПопробуйте еще раз:'
                         )
                         return
-                    self.mailing_states[admin_id]['button_url'] = url
-                    self.mailing_states[admin_id]['waiting_for_button_url'] = False
-                    self._show_preview(admin_id)
+                    state['button_url'] = url
+                    state['waiting_for_button_url'] = False
+                    self._show_audience(admin_id)
                 return
             
-            if not self.mailing_states[admin_id]['waiting_for_content']:
+            if not state['waiting_for_content']:
                 return
             
             # Пропускаем медиа-группы (они обрабатываются отдельным обработчиком)
@@ -306,32 +780,39 @@ class Bot:
             
             # Сохраняем контент для рассылки
             if message.text:
-                self.mailing_states[admin_id]['content_type'] = 'text'
-                self.mailing_states[admin_id]['content_data'] = {
+                state['content_type'] = 'text'
+                state['content_data'] = {
                     'text': message.text
                 }
             elif message.photo:
-                self.mailing_states[admin_id]['content_type'] = 'photo'
-                self.mailing_states[admin_id]['content_data'] = {
+                state['content_type'] = 'photo'
+                state['content_data'] = {
                     'file_id': message.photo[-1].file_id,
                     'caption': message.caption
                 }
             elif message.video:
-                self.mailing_states[admin_id]['content_type'] = 'video'
-                self.mailing_states[admin_id]['content_data'] = {
+                state['content_type'] = 'video'
+                state['content_data'] = {
                     'file_id': message.video.file_id,
                     'caption': message.caption
                 }
             elif message.document:
-                self.mailing_states[admin_id]['content_type'] = 'document'
-                self.mailing_states[admin_id]['content_data'] = {
+                state['content_type'] = 'document'
+                state['content_data'] = {
                     'file_id': message.document.file_id,
                     'caption': message.caption
                 }
+            state['source_chat_id'] = admin_id
+            state['source_message_ids'] = [message.message_id]
+            # Текст с полями получателя сохраняется в HTML, чтобы при подстановке не потерять форматирование
+            if has_placeholders(message.text or message.caption):
+                state['content_data']['template'] = (
+                    message.html_text if message.text else message.html_caption
+                )
             
             # Перестаем ждать контент и спрашиваем про кнопку
-            self.mailing_states[admin_id]['waiting_for_content'] = False
-            self.mailing_states[admin_id]['waiting_for_button_choice'] = True
+            state['waiting_for_content'] = False
+            state['waiting_for_button_choice'] = True
             
             # Спрашиваем, хочет ли админ добавить кнопку
             from telebot import types
@@ -346,20 +827,190 @@ class Bot:
                 reply_markup=keyboard
             )
 
-        self.bot.infinity_polling()
+    def run(self, last_update_id=None):
+        """Запускает polling. Возвращает управление после stop()."""
+        if last_update_id:
+            # Продолжаем с того места, где остановился предыдущий процесс
+            self.bot.last_update_id = last_update_id
+        boot.mark('polling')
+        while True:
+            self.health.polling_started()
+            self._poll()
+            if self._stopping or not self._restart_polling.is_set():
+                break
+            self._restart_polling.clear()
+            logger.warning(f'Polling restarted ({self.name})')
+        self.health.polling_stopped()
+
+    def _poll(self):
+        """
+        Аналог infinity_polling, который можно запустить снова после stop_polling():
+        флаг остановки telebot сбрасывает только polling(), а infinity_polling
+        с уже выставленным флагом сразу возвращает управление.
+        Возвращает управление после stop() или restart_polling().
+        """
+        while not self._stopping:
+            try:
+                self.bot.polling(non_stop=True)
+                return
+            except Exception as e:
+                logger.error(f'Polling exception ({self.name}): {e}')
+                if self._restart_polling.is_set():
+                    return
+                time.sleep(3)
+
+    def stop(self):
+        """Останавливает polling; текущие обработчики продолжают работу."""
+        self._stopping = True
+        self.bot.stop_polling()
+
+    def restart_polling(self):
+        """Останавливает polling, и run() запускает его заново (сторож зависаний)."""
+        if self._stopping:
+            return
+        self._restart_polling.set()
+        self.bot.stop_polling()
+
+    def drain(self, timeout=30):
+        """
+        Дожидается завершения текущих обработчиков (в т.ч. рассылок) и останавливает отправку.
+        Общие фоновые задачи (SharedResources.stop) останавливаются до drain() ботов.
+        """
+        self.session_sweeper.stop()
+        with self._inflight_cond:
+            if not self._inflight_cond.wait_for(lambda: self._inflight == 0, timeout=timeout):
+                logger.error(f'Drain timeout ({self.name}): {self._inflight} handlers still running')
+        if self.bot.threaded:
+            self.bot.worker_pool.close()
+        self.sender.stop(timeout)
+        logger.info(f'Rate limiter ({self.name}): {self.rate_limiter.stats()}')
+        logger.info(f'Update lag ({self.name}): {self.health.stats()}')
+        logger.info(f'Bot {self.name} drained')
     
+    def _send_cohorts(self, admin_id, weeks, as_csv):
+        from analytics_module import cohorts
+        report, timings = cohorts.build(self.db, weeks)
+        if report is None:
+            self.bot.send_message(chat_id=admin_id, text='❌ Не удалось выгрузить данные из базы.')
+            return
+
+        footer = f'\n\n<i>{timings["rows"]} строк: выгрузка {timings["load"]:.2f} с, расчет {timings["compute"]:.2f} с</i>'
+        if as_csv:
+            document = io.BytesIO(cohorts.render_csv(report).encode('utf-8'))
+            document.name = f'cohorts_{datetime.now().strftime("%Y%m%d")}.csv'
+            self.bot.send_document(chat_id=admin_id, document=document, caption=footer.strip(), parse_mode='HTML')
+        else:
+            self.bot.send_message(chat_id=admin_id, text=cohorts.render_text(report) + footer, parse_mode='HTML')
+
+    def _run_import(self, admin_id, status_msg_id, file_id, file_name):
+        from importer_module import importer
+
+        def on_progress(stage, parsed):
+            try:
+                self.bot.edit_message_text(chat_id=admin_id, message_id=status_msg_id,
+                                           text=importer.progress_text(stage, parsed))
+            except Exception as e:
+                logger.debug(f'Import progress update failed: {e}')
+
+        try:
+            data = self.bot.download_file(self.bot.get_file(file_id).file_path)
+        except Exception as e:
+            logger.error(f'Failed to download import file {file_name!r}: {e}')
+            self.bot.send_message(chat_id=admin_id, text='❌ Не удалось скачать файл.')
+            return
+        result = importer.run_import(self.db, io.BytesIO(data), file_name, on_progress=on_progress)
+        if result is None:
+            self.bot.send_message(chat_id=admin_id, text='❌ Импорт не выполнен: ошибка базы данных.')
+            return
+        logger.info(f'Users imported from {file_name!r}: {result}')
+        self.bot.send_message(chat_id=admin_id, text=importer.result_text(result))
+
+    def _send_inactive_users(self, admin_id, days):
+        from activity_module import report as activity_report
+
+        # Не текстовый файл: psycopg2 пишет в него байты COPY без перекодирования
+        document = io.BytesIO()
+        if not activity_report.export_inactive(self.db, days, document):
+            self.bot.send_message(chat_id=admin_id, text='❌ Не удалось выгрузить данные из базы.')
+            return
+        document.seek(0)
+        document.name = f'inactive_{days}d_{datetime.now().strftime("%Y%m%d")}.csv'
+        self.bot.send_document(chat_id=admin_id, document=document,
+                               caption=f'💤 Не обращались к боту {days} дн.')
+
+    def _send_account(self, chat_id, render):
+        account = self.accounts.get(chat_id)
+        if account is None:
+            self.bot.send_message(chat_id=chat_id, text=UNAVAILABLE_TEXT)
+        elif not account['registered']:
+            self.bot.send_message(chat_id=chat_id, text=NOT_REGISTERED_TEXT, reply_markup=keyboard.app_link())
+        else:
+            self.bot.send_message(chat_id=chat_id, text=render(account), parse_mode='HTML')
+
+    def _own_schedules(self):
+        """Запланированные рассылки этой витрины (расписание общее для всех ботов процесса)."""
+        return [
+            schedule for schedule in self.scheduler.pending()
+            if self.shared.resolve_name(schedule['payload']) == self.name
+        ]
+
+    def _notify_session_expired(self, admin_id):
+        """Сообщает админу, что незавершенная рассылка удалена из-за неактивности."""
+        self.bot.send_message(
+            chat_id=admin_id,
+            text=f'⌛ Подготовка рассылки отменена: нет действий больше '
+                 f'{int(mailing_config.SESSION_TTL_MINUTES)} мин.\n\nЧтобы начать заново, отправьте /mail'
+        )
+
+    def _add_segment(self, admin_id, key, value):
+        """Добавляет сегмент к аудитории рассылки (сегмент с тем же ключом заменяется)."""
+        state = self.mailing_states.get(admin_id)
+        if state is None:
+            return
+        segments = [segment for segment in state['segments'] if segment[0] != key]
+        segments.append((key, value))
+        state['segments'] = segments
+
+    def _show_audience(self, admin_id, message_id=None):
+        """Показывает выбор аудитории рассылки с количеством получателей."""
+        state = self.mailing_states.get(admin_id)
+        if state is None:
+            return
+
+        segments = state['segments']
+        count = self.db.count_recipients(compile_segments(segments, self.audience))
+        state['recipients_count'] = count
+
+        from telebot import types
+        keyboard_to_use = types.InlineKeyboardMarkup(row_width=1)
+        keyboard_to_use.add(*[
+            types.InlineKeyboardButton(text=segment.title, callback_data=f'mail_seg_{key}')
+            for key, segment in SEGMENTS.items()
+        ])
+        keyboard_to_use.add(
+            types.InlineKeyboardButton(text='♻️ Сбросить фильтры', callback_data='mail_seg_reset'),
+            types.InlineKeyboardButton(text='➡️ Далее', callback_data='mail_seg_done')
+        )
+
+        text = (
+            f'👥 <b>Аудитория рассылки:</b> {describe_segments(segments)}\n'
+            f'📬 Получателей: <code>{count}</code>\n\n'
+            f'Добавьте фильтры (объединяются через «И») или нажмите «Далее».'
+        )
+        if message_id:
+            self.bot.edit_message_text(chat_id=admin_id, message_id=message_id, text=text,
+                                       parse_mode='HTML', reply_markup=keyboard_to_use)
+        else:
+            self.bot.send_message(chat_id=admin_id, text=text, parse_mode='HTML', reply_markup=keyboard_to_use)
+
     def _show_preview(self, admin_id):
         """Показывает превью сообщения перед рассылкой."""
-        if admin_id not in self.mailing_states:
+        state = self.mailing_states.get(admin_id)
+        if state is None:
             return
-        
-        state = self.mailing_states[admin_id]
         content_type = state.get('content_type')
         content_data = state.get('content_data')
         
-        if not content_type or not content_data:
-            return
-        
         if not content_type:
             return
         
@@ -387,14 +1038,49 @@ class Bot:
                 )
         
         # Всегда добавляем кнопки подтверждения/отмены
+        recipients_count = state.get('recipients_count')
+        confirm_text = f'✅ Отправить ({recipients_count})' if recipients_count is not None else '✅ Подтвердить'
         keyboard_to_use.add(
-            types.InlineKeyboardButton(text='✅ Подтвердить', callback_data='mail_confirm'),
+            types.InlineKeyboardButton(text=confirm_text, callback_data='mail_confirm'),
             types.InlineKeyboardButton(text='❌ Отменить', callback_data='mail_cancel')
         )
+        keyboard_to_use.add(
+            types.InlineKeyboardButton(text='🕒 Запланировать', callback_data='mail_schedule'),
+            types.InlineKeyboardButton(text='⏳ Растянуть по времени', callback_data='mail_spread')
+        )
         
         # Отправляем превью в зависимости от типа контента
         try:
-            if content_type == 'text':
+            template = template_for(state)
+            if template is not None:
+                # Персонализированный пост показывается с данными самого админа
+                values = self.db.get_recipient_fields([admin_id], template.columns).get(admin_id)
+                text = f'📋 <b>Превью сообщения</b> (с вашими данными):\n\n{template.render(values)}'
+                if content_type == 'text':
+                    self.bot.send_message(chat_id=admin_id, text=text, parse_mode='HTML',
+                                          reply_markup=keyboard_to_use)
+                elif content_type == 'media_group':
+                    media_group = state['media_group']
+                    self.bot.send_media_group(chat_id=admin_id,
+                                              media=_build_media_list(media_group, text, 'HTML'))
+                    self.bot.send_message(chat_id=admin_id, text=f'Всего файлов: {len(media_group)}',
+                                          reply_markup=keyboard_to_use)
+                else:
+                    getattr(self.bot, f'send_{content_type}')(admin_id, content_data['file_id'], caption=text,
+                                                               parse_mode='HTML', reply_markup=keyboard_to_use)
+            elif mailing_config.COPY_MODE and state.get('source_message_ids'):
+                # Превью - копия исходного сообщения, в точности как его получат пользователи
+                message_ids = state['source_message_ids']
+                self.bot.send_message(chat_id=admin_id, text='📋 <b>Превью сообщения:</b>', parse_mode='HTML')
+                if len(message_ids) == 1:
+                    self.bot.copy_message(chat_id=admin_id, from_chat_id=state['source_chat_id'],
+                                          message_id=message_ids[0], reply_markup=keyboard_to_use)
+                else:
+                    self.bot.copy_messages(chat_id=admin_id, from_chat_id=state['source_chat_id'],
+                                           message_ids=message_ids)
+                    self.bot.send_message(chat_id=admin_id, text=f'Всего файлов: {len(message_ids)}',
+                                          reply_markup=keyboard_to_use)
+            elif content_type == 'text':
                 self.bot.send_message(
                     chat_id=admin_id,
                     text=f'📋 <b>Превью сообщения:</b>\n\n{content_data["text"]}',
@@ -469,178 +1155,189 @@ class Bot:
                 reply_markup=error_keyboard
             )
     
-    def _start_mailing(self, admin_id):
-        """Запускает рассылку на основе сохраненного состояния."""
-        if admin_id not in self.mailing_states:
-            return
-        
-        state = self.mailing_states[admin_id]
+    # Поля состояния рассылки, которых достаточно для ее выполнения (сохраняются в расписание)
+    MAILING_PAYLOAD_FIELDS = ('content_type', 'content_data', 'media_group', 'source_chat_id', 'source_message_ids',
+                              'button_type', 'button_text', 'button_url', 'segments')
+
+    def _mailing_payload(self, admin_id):
+        """Возвращает данные рассылки из состояния админа или None, если контент не задан."""
+        state = self.mailing_states.get(admin_id)
+        if state is None:
+            return None
         content_type = state.get('content_type')
         content_data = state.get('content_data')
         
-        if not content_type or not content_data:
-            return
-        
-        # Создаем клавиатуру, если есть кнопка
-        from telebot import types
-        reply_markup = None
-        if state.get('button_text'):
-            reply_markup = types.InlineKeyboardMarkup()
-            button_type = state.get('button_type', 'url')
-            if button_type == 'web_app':
-                reply_markup.add(
-                    types.InlineKeyboardButton(
-                        text=state['button_text'],
-                        web_app=types.WebAppInfo(url=state.get('button_url', 'https://os-gift.store/'))
-                    )
-                )
-            else:
-                reply_markup.add(
-                    types.InlineKeyboardButton(text=state['button_text'], url=state['button_url'])
-                )
-        
-        # Запускаем рассылку в зависимости от типа контента
-        if content_type == 'text':
-            self._send_mailing_text(admin_id, content_data['text'], reply_markup)
-        elif content_type == 'photo':
-            self._send_mailing_photo(admin_id, content_data['file_id'], content_data.get('caption'), reply_markup)
-        elif content_type == 'video':
-            self._send_mailing_video(admin_id, content_data['file_id'], content_data.get('caption'), reply_markup)
-        elif content_type == 'document':
-            self._send_mailing_document(admin_id, content_data['file_id'], content_data.get('caption'), reply_markup)
-        elif content_type == 'media_group':
-            self._send_mailing_media_group(admin_id, state['media_group'], reply_markup)
-        
-        # Очищаем состояние
+        if not content_type:
+            return None
+        # Для медиа-группы content_data равен None, контент хранится в media_group
+        if content_type == 'media_group' and not state.get('media_group'):
+            return None
+        if content_type != 'media_group' and not content_data:
+            return None
+
+        payload = {field: state.get(field) for field in self.MAILING_PAYLOAD_FIELDS}
+        # Рассылку из расписания или очереди выполнит бот той же витрины для ее пользователей
+        payload['bot'] = self.name
+        payload['storefront'] = self.audience
+        return payload
+
+    def _clear_mailing_state(self, admin_id):
         if admin_id in self.media_group_timers:
             del self.media_group_timers[admin_id]
-        del self.mailing_states[admin_id]
-    
-    def _send_mailing_text(self, admin_id, text, reply_markup=None):
-        """Рассылка текстового сообщения."""
-        users = self.db.get_all_users()
-        total_users = len(users)
-        successful = 0
-        failed = 0
-        blocked = 0
-        
-        start_time = time.time()
+        self.mailing_states.pop(admin_id, None)
+
+    def _start_mailing(self, admin_id):
+        """Запускает рассылку на основе сохраненного состояния."""
+        payload = self._mailing_payload(admin_id)
+        if payload is None:
+            return
         
-        status_msg = self.bot.send_message(
+        # Очищаем состояние
+        self._clear_mailing_state(admin_id)
+
+        if mailing_config.QUEUE_ENABLED and self._enqueue_mailing(admin_id, payload):
+            return
+
+        # Рассылка выполняется планировщиком сразу же: позиция и состояние доставки сохраняются,
+        # и при перезапуске процесса рассылка продолжится в новом, а не оборвется
+        self.scheduler.add(admin_id, time.time(), 0, payload)
+
+    def _enqueue_mailing(self, admin_id, payload):
+        """
+        Ставит рассылку в очередь PostgreSQL; ее части параллельно выполняют воркеры рассылки.
+        Возвращает False, если поставить в очередь не удалось.
+        """
+        job = self.db.create_mailing_job(admin_id, payload, mailing_config.CHUNK_SIZE,
+                                         compile_segments(payload.get('segments'), payload.get('storefront')))
+        if job is None:
+            return False
+
+        job_id, total_chunks = job
+        self.bot.send_message(
             chat_id=admin_id,
-            text=f'📤 Начало рассылки...\nВсего пользователей: {total_users}'
+            text=f'📤 Рассылка #{job_id} поставлена в очередь\n'
+                 f'Частей: {total_chunks}\n\n'
+                 f'Статистика придет после отправки всех частей.'
         )
-        
-        for user_id in users:
-            try:
-                self.bot.send_message(chat_id=user_id, text=text, reply_markup=reply_markup)
-                successful += 1
-            except Exception as e:
-                failed += 1
-                error_str = str(e).lower()
-                if 'blocked' in error_str or 'chat not found' in error_str:
-                    blocked += 1
-        
-        elapsed_time = time.time() - start_time
-        
-        self._send_statistics(admin_id, status_msg.message_id, total_users, successful, failed, blocked, elapsed_time)
-
-    def _send_mailing_photo(self, admin_id, file_id, caption=None, reply_markup=None):
-        """Рассылка фото."""
-        users = self.db.get_all_users()
-        total_users = len(users)
-        successful = 0
-        failed = 0
-        blocked = 0
-        
-        start_time = time.time()
-        
-        status_msg = self.bot.send_message(
-            chat_id=admin_id,
-            text=f'📤 Начало рассылки...\nВсего пользователей: {total_users}'
+        return True
+
+    def _schedule_mailing(self, admin_id, run_at, window_seconds):
+        """Сохраняет рассылку в расписание (отложенная и/или растянутая по времени)."""
+        payload = self._mailing_payload(admin_id)
+        if payload is None:
+            return
+
+        recipients_count = self.mailing_states.get(admin_id, {}).get('recipients_count')
+        schedule_id = self.scheduler.add(admin_id, run_at, window_seconds, payload)
+        self._clear_mailing_state(admin_id)
+
+        text = f'🕒 Рассылка #{schedule_id} запланирована на {datetime.fromtimestamp(run_at).strftime("%d.%m.%Y %H:%M")}'
+        if window_seconds:
+            text += f'\n⏳ Отправка растянута на {int(window_seconds // 60)} мин'
+        if recipients_count is not None:
+            text += f'\n📬 Получателей: {recipients_count}'
+        text += '\n\nСписок запланированных рассылок: /schedules'
+        self.bot.send_message(chat_id=admin_id, text=text)
+
+    def _execute_scheduled_mailing(self, schedule, on_progress, should_stop):
+        """
+        Выполняет рассылку из расписания (вызывается планировщиком).
+        Состояние доставки сохраняется в чекпоинт, чтобы статистика
+        возобновленной рассылки учитывала отправки предыдущего процесса.
+        """
+        os.makedirs(mailing_config.STATE_DIR, exist_ok=True)
+        checkpoint = os.path.join(mailing_config.STATE_DIR, f'schedule-{schedule["id"]}.bin')
+        finished = self._execute_mailing(
+            schedule['admin_id'],
+            schedule['payload'],
+            window_seconds=schedule['window_seconds'],
+            start_after=schedule['last_user_id'],
+            on_progress=on_progress,
+            should_stop=should_stop,
+            checkpoint=checkpoint
         )
-        
-        for user_id in users:
+        if finished or self.db.get_mailing_schedule_status(schedule['id']) == 'cancelled':
             try:
-                self.bot.send_photo(chat_id=user_id, photo=file_id, caption=caption, reply_markup=reply_markup)
-                successful += 1
-            except Exception as e:
-                failed += 1
-                error_str = str(e).lower()
-                if 'blocked' in error_str or 'chat not found' in error_str:
-                    blocked += 1
-        
-        elapsed_time = time.time() - start_time
-        
-        self._send_statistics(admin_id, status_msg.message_id, total_users, successful, failed, blocked, elapsed_time)
-
-    def _send_mailing_video(self, admin_id, file_id, caption=None, reply_markup=None):
-        """Рассылка видео."""
-        users = self.db.get_all_users()
-        total_users = len(users)
-        successful = 0
-        failed = 0
-        blocked = 0
-        
-        start_time = time.time()
-        
-        status_msg = self.bot.send_message(
-            chat_id=admin_id,
-            text=f'📤 Начало рассылки...\nВсего пользователей: {total_users}'
-        )
-        
-        for user_id in users:
+                os.remove(checkpoint)
+            except FileNotFoundError:
+                pass
+        return finished
+
+    def _execute_mailing(self, admin_id, payload, **options):
+        """
+        Отправляет рассылку по данным payload.
+        options передаются в _run_mailing (window_seconds, start_after, on_progress, should_stop, checkpoint).
+        Возвращает True, если рассылка дошла до конца.
+        """
+        return self._run_mailing(admin_id, payload, **options)
+
+    def _deliver(self, payload, **options):
+        """
+        Доставляет пост payload получателям его сегментов (mailing_module.delivery.deliver).
+        В asyncio-режиме заменяется доставкой aio_module.
+        """
+        send, _ = build_send(self.bot, payload)
+        return deliver(self.db, self.sender, send, payload.get('segments'), template=template_for(payload),
+                       storefront=payload.get('storefront'), **options)
+
+    def _run_mailing(self, admin_id, payload, window_seconds=0, start_after=0, on_progress=None, should_stop=None,
+                     checkpoint=None):
+        """
+        Отправляет пост payload каждому получателю из его сегментов (см. _deliver).
+
+        window_seconds - растянуть отправку равномерно на это время (0 - с максимальной скоростью).
+        start_after - users.id, после которого продолжить прерванную рассылку.
+        on_progress(last_user_id) - вызывается периодически для сохранения позиции.
+        should_stop() - если возвращает True, рассылка прерывается.
+        checkpoint - файл состояния доставки (RecipientLog); если он есть, рассылка продолжает его.
+        Возвращает True, если рассылка дошла до конца.
+        """
+        log = None
+        if checkpoint and os.path.exists(checkpoint):
             try:
-                self.bot.send_video(chat_id=user_id, video=file_id, caption=caption, reply_markup=reply_markup)
-                successful += 1
-            except Exception as e:
-                failed += 1
-                error_str = str(e).lower()
-                if 'blocked' in error_str or 'chat not found' in error_str:
-                    blocked += 1
-        
-        elapsed_time = time.time() - start_time
-        
-        self._send_statistics(admin_id, status_msg.message_id, total_users, successful, failed, blocked, elapsed_time)
-
-    def _send_mailing_document(self, admin_id, file_id, caption=None, reply_markup=None):
-        """Рассылка документа."""
-        users = self.db.get_all_users()
-        total_users = len(users)
-        successful = 0
-        failed = 0
-        blocked = 0
-        
+                log = RecipientLog.load(checkpoint)
+            except (OSError, ValueError) as e:
+                logger.error(f'Failed to load mailing checkpoint {checkpoint}: {e}')
+        total_users = self.db.count_recipients(compile_segments(payload.get('segments'), payload.get('storefront')),
+                                               start_after)
         start_time = time.time()
         
         status_msg = self.bot.send_message(
             chat_id=admin_id,
-            text=f'📤 Начало рассылки...\nВсего пользователей: {total_users}'
+            text=f'{mailing_title(payload)}\nВсего пользователей: {total_users}'
+        )
+
+        result = self._deliver(
+            payload,
+            start_after=start_after,
+            total=total_users,
+            window_seconds=window_seconds,
+            on_progress=on_progress,
+            should_stop=should_stop,
+            log=log,
+            checkpoint=checkpoint
         )
-        
-        for user_id in users:
-            try:
-                self.bot.send_document(chat_id=user_id, document=file_id, caption=caption, reply_markup=reply_markup)
-                successful += 1
-            except Exception as e:
-                failed += 1
-                error_str = str(e).lower()
-                if 'blocked' in error_str or 'chat not found' in error_str:
-                    blocked += 1
         
         elapsed_time = time.time() - start_time
         
-        self._send_statistics(admin_id, status_msg.message_id, total_users, successful, failed, blocked, elapsed_time)
+        self._send_statistics(admin_id, status_msg.message_id, result['successful'] + result['failed'],
+                              result['successful'], result['failed'], result['blocked'],
+                              elapsed_time, result['finished'])
+        logger.info(f'Sender queue wait during mailing: {self.sender.stats()}; '
+                    f'delivery state: {result["log"].counts()}, {result["log"].nbytes} bytes')
+        logger.info(f'Telegram API call timings: {self.transport.stats()}')
+        return result['finished']
 
     def _process_media_group(self, admin_id, media_group_id):
         """Обрабатывает медиа-группу после сбора всех элементов."""
-        if admin_id not in self.mailing_states:
+        state = self.mailing_states.get(admin_id)
+        if state is None:
             return
         
-        if self.mailing_states[admin_id]['media_group_id'] != media_group_id:
+        if state['media_group_id'] != media_group_id:
             return  # Это была другая группа
         
-        media_group = self.mailing_states[admin_id]['media_group']
+        media_group = state['media_group']
         if not media_group:
             return
         
@@ -649,10 +1346,16 @@ class Bot:
             del self.media_group_timers[admin_id]
         
         # Сохраняем медиа-группу в состояние
-        self.mailing_states[admin_id]['content_type'] = 'media_group'
-        self.mailing_states[admin_id]['content_data'] = None  # Медиа-группа хранится отдельно
-        self.mailing_states[admin_id]['waiting_for_content'] = False
-        self.mailing_states[admin_id]['waiting_for_button_choice'] = True
+        state['content_type'] = 'media_group'
+        state['content_data'] = None  # Медиа-группа хранится отдельно
+        # Персонализированная подпись альбома (как и подпись, берется у последнего элемента с ней)
+        templates = [media_item['template'] for media_item in media_group if media_item.get('template')]
+        if templates:
+            state['content_data'] = {'template': templates[-1]}
+        # copyMessages требует id сообщений по возрастанию, а апдейты альбома могут прийти не по порядку
+        state['source_message_ids'].sort()
+        state['waiting_for_content'] = False
+        state['waiting_for_button_choice'] = True
         
         # Спрашиваем, хочет ли админ добавить кнопку
         from telebot import types
@@ -667,69 +1370,8 @@ class Bot:
             reply_markup=keyboard
         )
 
-    def _send_mailing_media_group(self, admin_id, media_group, reply_markup=None):
-        """Рассылка медиа-группы."""
-        users = self.db.get_all_users()
-        total_users = len(users)
-        successful = 0
-        failed = 0
-        blocked = 0
-        
-        start_time = time.time()
-        
-        status_msg = self.bot.send_message(
-            chat_id=admin_id,
-            text=f'📤 Начало рассылки медиа-группы...\nВсего пользователей: {total_users}'
-        )
-        
-        # Подготавливаем медиа для отправки
-        media_list = []
-        
-        # Находим caption (обычно он только у последнего элемента)
-        caption = None
-        for media_item in media_group:
-            if media_item['caption']:
-                caption = media_item['caption']
-        
-        for i, media_item in enumerate(media_group):
-            is_last = (i == len(media_group) - 1)
-            media_caption = caption if is_last else None
-            
-            if media_item['type'] == 'photo':
-                media_list.append(InputMediaPhoto(
-                    media=media_item['file_id'],
-                    caption=media_caption
-                ))
-            elif media_item['type'] == 'video':
-                media_list.append(InputMediaVideo(
-                    media=media_item['file_id'],
-                    caption=media_caption
-                ))
-            elif media_item['type'] == 'document':
-                media_list.append(InputMediaDocument(
-                    media=media_item['file_id'],
-                    caption=media_caption
-                ))
-        
-        for user_id in users:
-            try:
-                # Отправляем медиа-группу
-                sent_messages = self.bot.send_media_group(chat_id=user_id, media=media_list)
-                # Если есть кнопка, отправляем её отдельным сообщением после медиа-группы
-                if reply_markup:
-                    self.bot.send_message(chat_id=user_id, text='👇', reply_markup=reply_markup)
-                successful += 1
-            except Exception as e:
-                failed += 1
-                error_str = str(e).lower()
-                if 'blocked' in error_str or 'chat not found' in error_str:
-                    blocked += 1
-        
-        elapsed_time = time.time() - start_time
-        
-        self._send_statistics(admin_id, status_msg.message_id, total_users, successful, failed, blocked, elapsed_time)
-
-    def _send_statistics(self, admin_id, status_msg_id, total_users, successful, failed, blocked, elapsed_time):
+    def _send_statistics(self, admin_id, status_msg_id, total_users, successful, failed, blocked, elapsed_time,
+                         finished=True):
         """Отправка статистики рассылки админу."""
         # Удаляем сообщение о начале рассылки
         try:
@@ -737,31 +1379,85 @@ class Bot:
         except:
             pass
         
-        # Форматируем время
-        if elapsed_time < 60:
-            time_str = f'{elapsed_time:.2f} сек'
-        else:
-            minutes = int(elapsed_time // 60)
-            seconds = elapsed_time % 60
-            time_str = f'{minutes} мин {seconds:.1f} сек'
-        
-        stats_text = (
-            f'✅ Рассылка завершена!\n\n'
-            f'📊 Статистика:\n'
-            f'• Всего пользователей: {total_users}\n'
-            f'• Успешно отправлено: {successful}\n'
-            f'• Ошибок: {failed}\n'
-            f'• Заблокировали бота: {blocked}\n'
-            f'• Время выполнения: {time_str}\n'
-            f'• Процент успеха: {(successful/total_users*100) if total_users > 0 else 0:.1f}%'
+        logger.info(f'Mailing finished: total={total_users}, successful={successful}, '
+                    f'failed={failed}, blocked={blocked}, elapsed={elapsed_time:.2f}s')
+        self.bot.send_message(
+            chat_id=admin_id,
+            text=statistics_text(total_users, successful, failed, blocked, elapsed_time, finished)
         )
-        
-        self.bot.send_message(chat_id=admin_id, text=stats_text)
     
 
 def main():
-    bot = Bot()
-    bot.run()
+    import aio_module.config as aio_config
+    from hosting_module.hosting import SharedResources, load_storefronts
+    from restart_module import handoff
+
+    supervisor = handoff.connect()
+    with boot.phase('init'):
+        storefronts = load_storefronts()
+        shared = SharedResources(storefronts)
+        shared.supervisor = supervisor
+        bots = [Bot(storefront, shared) for storefront in storefronts]
+        runtime = None
+        if aio_config.ENABLED:
+            # Polling, пользовательские команды и рассылки - в event loop (aio_module)
+            from aio_module.bot import AsyncBot, AsyncRuntime
+            runtime = AsyncRuntime(shared.db)
+            for bot in bots:
+                AsyncBot(bot, runtime)
+    for bot in bots:
+        bot.setup()
+
+    def stop_all():
+        for bot in bots:
+            bot.stop()
+
+    signal.signal(signal.SIGTERM, lambda *_: stop_all())
+
+    last_update_ids = {}
+    drain_requested = threading.Event()
+    if supervisor:
+        # Процесс прогрет; ждем, пока предыдущий процесс отдаст polling
+        for bot in bots:
+            bot.wait_for_setup()
+        supervisor.ready()
+        last_update_ids = supervisor.wait_for_poll() or {}
+        if not isinstance(last_update_ids, dict):
+            # Процесс с одним ботом передает update_id основной витрины
+            last_update_ids = {storefronts[0].name: last_update_ids}
+
+        def wait_for_drain():
+            if supervisor.wait_for_drain():
+                drain_requested.set()
+                stop_all()
+
+        threading.Thread(target=wait_for_drain, name='SupervisorHandoff', daemon=True).start()
+        supervisor.polling()
+
+    # Основной бот опрашивается в главном потоке, остальные - каждый в своем
+    pollers = [
+        threading.Thread(target=bot.run, args=(last_update_ids.get(bot.name),), name=f'Polling-{bot.name}',
+                         daemon=True)
+        for bot in bots[1:]
+    ]
+    for poller in pollers:
+        poller.start()
+    bots[0].run(last_update_ids.get(bots[0].name))
+    for poller in pollers:
+        poller.join()
+    if drain_requested.is_set():
+        # Только теперь: stop_polling() лишь выставляет флаг, а апдейты из уже отправленного
+        # getUpdates обрабатывает этот процесс - новый продолжит после них
+        supervisor.stopped({bot.name: bot.bot.last_update_id for bot in bots})
+
+    shared.stop()
+    for bot in bots:
+        bot.drain()
+    shared.report()
+    if runtime:
+        runtime.stop()
+    logger_system.shutdown()
+    sys.exit(shared.exit_code)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,132 @@
+"""
+Снимок каталога для inline-поиска.
+
+CatalogRefresher при запуске загружает последний снимок из SQLite (Database)
+в CatalogIndex, затем периодически запрашивает список товаров у backend
+и сравнивает его со снимком по хэшам товаров: в SQLite и индекс попадают
+только добавленные, измененные и удаленные товары. Inline-запросы
+обслуживаются только индексом в памяти, без обращений к сети и базе.
+"""
+import hashlib
+import json
+import threading
+import time
+
+import catalog_module.config as config
+from functions_module import functions
+from logger_system import logger
+
+
+def digest(item):
+    return hashlib.sha1(json.dumps(item, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def is_available(item):
+    return item.get('in_stock') != 0 and item.get('available') is not False
+
+
+class CatalogRefresher:
+    def __init__(self, db, index, url=config.SERVICES_URL, interval=config.REFRESH_INTERVAL_MINUTES * 60):
+        self.db = db
+        self.index = index
+        self.url = url
+        self.interval = interval
+        self._digests = {}  # service_id -> хэш товара в снимке
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name='CatalogRefresher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def load_snapshot(self):
+        """Загружает сохраненный снимок в индекс. Возвращает количество товаров."""
+        self.db.create_catalog_table()
+        rows = self.db.get_catalog()
+        self._digests = {service_id: item_digest for service_id, _, item_digest in rows}
+        self.index.update(items=[item for _, item, _ in rows if is_available(item)])
+        return len(rows)
+
+    def refresh(self):
+        """Запрашивает каталог и применяет изменения. Возвращает (изменено, удалено)."""
+        items = {item['service_id']: item for item in self._fetch() if 'service_id' in item}
+        digests = {service_id: digest(item) for service_id, item in items.items()}
+
+        changed = [
+            (service_id, items[service_id], item_digest)
+            for service_id, item_digest in digests.items()
+            if self._digests.get(service_id) != item_digest
+        ]
+        removed_ids = [service_id for service_id in self._digests if service_id not in items]
+        if not changed and not removed_ids:
+            return 0, 0
+
+        self.db.update_catalog(changed, removed_ids, time.time())
+        self.index.update(
+            items=[item for _, item, _ in changed if is_available(item)],
+            removed_ids=removed_ids + [service_id for service_id, item, _ in changed if not is_available(item)]
+        )
+        self._digests = digests
+        return len(changed), len(removed_ids)
+
+    def _fetch(self):
+        import requests
+        response = requests.get(self.url, timeout=config.REQUEST_TIMEOUT)
+        response.raise_for_status()
+        body = response.json()
+        services = body.get('data') if isinstance(body, dict) else body
+        if not isinstance(services, list):
+            raise ValueError(f'Unexpected catalog response format: {type(services).__name__}')
+        return services
+
+    def _loop(self):
+        try:
+            logger.info(f'Catalog snapshot loaded: {self.load_snapshot()} services, {len(self.index)} indexed')
+        except Exception as e:
+            logger.error(f'Failed to load catalog snapshot: {e}')
+
+        while True:
+            try:
+                changed, removed = self.refresh()
+                if changed or removed:
+                    logger.info(f'Catalog refreshed: changed={changed}, removed={removed}, indexed={len(self.index)}')
+            except Exception as e:
+                logger.error(f'Catalog refresh failed: {e}')
+            if self._stop.wait(self.interval):
+                return
+
+
+def _format_price(item):
+    currency = item.get('currency') or 'USD'
+    suffix = '$' if currency == 'USD' else f' {currency}'
+    if item.get('price') is not None:
+        return f'{float(item["price"]):.2f}{suffix}'
+    if item.get('min_price') is not None:
+        return f'от {float(item["min_price"]):.2f}{suffix}'
+    return ''
+
+
+def inline_result(item, reply_markup=None):
+    """InlineQueryResultArticle товара."""
+    from telebot import types
+
+    name = item.get('service_name') or f'#{item["service_id"]}'
+    price = _format_price(item)
+    description = item.get('service_description') or ''
+    text = f'🎁 <b>{functions.escape_text_html(name)}</b>'
+    if price:
+        text += f'\nЦена: <code>{price}</code>'
+    if description:
+        text += f'\n\n{functions.escape_text_html(description[:500])}'
+
+    return types.InlineQueryResultArticle(
+        id=str(item['service_id']),
+        title=name,
+        description=' · '.join(part for part in (price, description[:100]) if part) or None,
+        input_message_content=types.InputTextMessageContent(text, parse_mode='HTML'),
+        reply_markup=reply_markup,
+        thumbnail_url=item.get('service_image') or None
+    )
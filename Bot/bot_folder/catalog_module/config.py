@@ -0,0 +1,14 @@
+import os
+
+# Поиск по каталогу в inline-режиме (@bot steam 50)
+ENABLED = os.environ.get('CATALOG_ENABLED', '1') == '1'
+# Список товаров backend (GET /api/gifts/services - ответ поставщика подарков)
+SERVICES_URL = os.environ.get('CATALOG_SERVICES_URL', 'http://localhost:5000/api/gifts/services')
+# Как часто обновлять снимок каталога (в минутах)
+REFRESH_INTERVAL_MINUTES = float(os.environ.get('CATALOG_REFRESH_INTERVAL_MINUTES', '15'))
+# Таймаут запроса каталога (в секундах)
+REQUEST_TIMEOUT = float(os.environ.get('CATALOG_REQUEST_TIMEOUT', '30'))
+# Сколько товаров возвращать на inline-запрос (Telegram допускает до 50)
+RESULTS_LIMIT = min(int(os.environ.get('CATALOG_RESULTS_LIMIT', '20')), 50)
+# Сколько секунд Telegram может кэшировать ответ на одинаковый inline-запрос
+INLINE_CACHE_TIME = int(os.environ.get('CATALOG_INLINE_CACHE_TIME', '60'))
@@ -0,0 +1,114 @@
+"""
+Индекс каталога в памяти для inline-поиска.
+
+Слова названия и описания товара раскладываются на триграммы и префиксы
+из 1-2 символов; для каждого ключа хранится множество service_id.
+Слово запроса длиной от 3 символов ищется пересечением множеств его триграмм
+(подстрока слова), короче - по префиксу слова. Товары добавляются и удаляются
+по одному, поэтому обновление снимка не перестраивает индекс целиком.
+"""
+import heapq
+import re
+import threading
+
+_NON_WORD = re.compile(r'[^\w]+')
+_EMPTY = frozenset()
+
+
+def tokenize(text):
+    """Слова текста в нижнем регистре (ё заменяется на е)."""
+    if not text:
+        return []
+    return _NON_WORD.sub(' ', str(text).lower().replace('ё', 'е')).split()
+
+
+def _trigrams(word):
+    return {word[index:index + 3] for index in range(len(word) - 2)}
+
+
+def _keys(word):
+    # Префиксы помечены '^', чтобы не совпадать с триграммами
+    keys = {'^' + word[:1], '^' + word[:2]}
+    keys.update(_trigrams(word))
+    return keys
+
+
+def _query_keys(token):
+    return {'^' + token} if len(token) < 3 else _trigrams(token)
+
+
+class CatalogIndex:
+    def __init__(self):
+        self._docs = {}  # service_id -> (товар, слова названия, все слова, ключи индекса)
+        self._postings = {}  # ключ -> set(service_id)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._docs)
+
+    def update(self, items=(), removed_ids=()):
+        """Удаляет товары removed_ids и добавляет (заменяет) товары items."""
+        with self._lock:
+            for service_id in removed_ids:
+                self._remove(service_id)
+            for item in items:
+                self._remove(item['service_id'])
+                self._add(item)
+
+    def _add(self, item):
+        service_id = item['service_id']
+        name_words = tokenize(item.get('service_name'))
+        words = name_words + tokenize(item.get('service_description'))
+        keys = set()
+        for word in set(words):
+            keys.update(_keys(word))
+        for key in keys:
+            self._postings.setdefault(key, set()).add(service_id)
+        self._docs[service_id] = (item, name_words, words, keys)
+
+    def _remove(self, service_id):
+        doc = self._docs.pop(service_id, None)
+        if doc is None:
+            return
+        for key in doc[3]:
+            postings = self._postings.get(key)
+            if postings is not None:
+                postings.discard(service_id)
+                if not postings:
+                    del self._postings[key]
+
+    def search(self, query, limit):
+        """
+        Товары, в которых каждое слово запроса - подстрока (от 3 символов) или префикс слова.
+        Выше те, где слова запроса - начала слов названия; затем более короткие названия.
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        with self._lock:
+            candidates = None
+            # Длинные слова запроса дают меньшие множества - начинаем с них
+            for token in sorted(set(tokens), key=len, reverse=True):
+                postings = sorted((self._postings.get(key, _EMPTY) for key in _query_keys(token)), key=len)
+                matched = set(postings[0]).intersection(*postings[1:])
+                candidates = matched if candidates is None else candidates & matched
+                if not candidates:
+                    return []
+
+            # Слово длиннее триграммы может совпасть по триграммам в разных местах - проверяем подстроку
+            long_tokens = [token for token in tokens if len(token) > 3]
+            ranked = []
+            for service_id in candidates:
+                item, name_words, words, _ = self._docs[service_id]
+                if long_tokens and not all(any(token in word for word in words) for token in long_tokens):
+                    continue
+                score = 0
+                for token in tokens:
+                    if any(word.startswith(token) for word in name_words):
+                        score += 2
+                    elif any(token in word for word in name_words):
+                        score += 1
+                ranked.append((-score, len(name_words), service_id, item))
+
+        return [entry[3] for entry in heapq.nsmallest(limit, ranked)]
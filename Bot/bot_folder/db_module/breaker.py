@@ -0,0 +1,79 @@
+"""
+Размыкатель (circuit breaker) подключений к PostgreSQL.
+
+Неудача - ошибка подключения, ошибка запроса OperationalError (разрыв
+подключения, прерывание по statement_timeout) или ожидание свободного
+подключения пула дольше POOL_TIMEOUT; успешный запрос сбрасывает счетчик.
+После BREAKER_FAILURES неудач подряд размыкатель открывается:
+_get_postgres_connection сразу бросает CircuitOpenError, не дожидаясь
+connect_timeout, и обработчики не блокируются на время инцидента.
+Через reset_timeout пропускается одна пробная попытка (half-open): успех
+замыкает размыкатель, неудача снова открывает его.
+"""
+import threading
+import time
+
+import db_module.config as config
+from logger_system import logger
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """PostgreSQL считается недоступным, запрос не выполнялся."""
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold, reset_timeout):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.rejected = 0  # Сколько запросов отклонено без попытки подключения
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Бросает CircuitOpenError, если попытка сейчас не разрешена."""
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                # Пробная попытка достается одному вызывающему, остальные отклоняются до ее результата
+                self.state = HALF_OPEN
+                return
+            self.rejected += 1
+        raise CircuitOpenError(f'{self.name} circuit is open')
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info(f'{self.name} circuit closed after {time.monotonic() - self.opened_at:.1f}s, '
+                            f'rejected={self.rejected}')
+            self.state = CLOSED
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                if self.state == CLOSED:
+                    logger.error(f'{self.name} circuit opened after {self.failures} failures')
+                    self.rejected = 0
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    @property
+    def is_closed(self):
+        return self.state == CLOSED
+
+    def stats(self):
+        return {'state': self.state, 'failures': self.failures, 'rejected': self.rejected}
+
+
+# Общий для процесса: все экземпляры Database подключаются к одному PostgreSQL
+postgres_breaker = CircuitBreaker('PostgreSQL', config.BREAKER_FAILURES, config.BREAKER_RESET_SECONDS)
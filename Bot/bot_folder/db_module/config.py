@@ -1,2 +1,30 @@
+import os
+
 DB_NAME = 'sql_db'
 DB_TABLE_NAME = 'main_table'
+
+# Таймаут подключения к PostgreSQL (в секундах)
+CONNECT_TIMEOUT = int(os.environ.get('DB_CONNECT_TIMEOUT', '10'))
+# После скольких неудачных подключений подряд запросы к PostgreSQL перестают выполняться (размыкатель)
+BREAKER_FAILURES = int(os.environ.get('DB_BREAKER_FAILURES', '3'))
+# Через сколько секунд после размыкания пробовать подключиться снова
+BREAKER_RESET_SECONDS = float(os.environ.get('DB_BREAKER_RESET_SECONDS', '30'))
+# Как часто проверять локальную очередь регистраций, сохраненных во время недоступности PostgreSQL (в секундах)
+SPOOL_REPLAY_INTERVAL = float(os.environ.get('DB_SPOOL_REPLAY_INTERVAL', '15'))
+# Сколько регистраций переносить в PostgreSQL одним запросом
+SPOOL_REPLAY_BATCH_SIZE = int(os.environ.get('DB_SPOOL_REPLAY_BATCH_SIZE', '500'))
+# Размер общего для процесса пула подключений к PostgreSQL (0 - новое подключение на каждый запрос)
+POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '10'))
+# Сколько секунд ждать свободное подключение пула
+POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '10'))
+# Подключение, простоявшее в пуле дольше этого (в секундах), проверяется SELECT 1 перед выдачей
+POOL_CHECK_AFTER = float(os.environ.get('DB_POOL_CHECK_AFTER', '30'))
+# Предельное время одного запроса к PostgreSQL (в секундах, 0 - без ограничения); прерванный запрос
+# считается неудачей размыкателя, поэтому медленный PostgreSQL не держит потоки обработчиков
+STATEMENT_TIMEOUT = float(os.environ.get('DB_STATEMENT_TIMEOUT', '30'))
+# Предельное время запроса для массовых операций (импорт, выгрузки COPY, пересчет статистики)
+BULK_STATEMENT_TIMEOUT = float(os.environ.get('DB_BULK_STATEMENT_TIMEOUT', '600'))
+# TCP keepalive подключений: разорванное соединение обнаруживается через IDLE + INTERVAL * COUNT секунд
+KEEPALIVES_IDLE = int(os.environ.get('DB_KEEPALIVES_IDLE', '30'))
+KEEPALIVES_INTERVAL = int(os.environ.get('DB_KEEPALIVES_INTERVAL', '10'))
+KEEPALIVES_COUNT = int(os.environ.get('DB_KEEPALIVES_COUNT', '3'))
@@ -1,11 +1,70 @@
-import sqlite3
 import json
 from contextlib import closing
-from db_module.config import DB_NAME, DB_TABLE_NAME
+from db_module.config import DB_NAME, DB_TABLE_NAME, CONNECT_TIMEOUT
+import db_module.config as db_config
+from db_module.breaker import postgres_breaker
+from db_module.pool import PoolTimeout, postgres_pool
 import os
-import psycopg2
-from psycopg2 import OperationalError
+import time
 import config_module.config as config
+from logger_system import logger
+from tracing_module import tracing
+
+# sqlite3 и psycopg2 импортируются при первом обращении к базе,
+# чтобы не замедлять запуск бота.
+
+_cursor_class = None
+
+
+def _cursor_factory():
+    """
+    Курсор psycopg2, сообщающий размыкателю результат каждого запроса: разрыв
+    подключения и прерывание по statement_timeout (OperationalError) - неудача.
+    При включенной трассировке запрос еще и пишется спаном трейса.
+    """
+    global _cursor_class
+    if _cursor_class is None:
+        from psycopg2 import OperationalError
+        from psycopg2.extensions import cursor
+
+        def call(method, *args):
+            try:
+                result = method(*args)
+            except OperationalError:
+                postgres_breaker.record_failure()
+                raise
+            postgres_breaker.record_success()
+            return result
+
+        class BreakerCursor(cursor):
+            def execute(self, query, vars=None):
+                return call(super().execute, query, vars)
+
+            def executemany(self, query, vars_list):
+                return call(super().executemany, query, vars_list)
+
+            def copy_expert(self, sql, file, size=8192):
+                return call(super().copy_expert, sql, file, size)
+
+        class TracingCursor(BreakerCursor):
+            def execute(self, query, vars=None):
+                with tracing.span('db.query', statement=' '.join(str(query).split())[:120]):
+                    return super().execute(query, vars)
+
+        _cursor_class = TracingCursor if tracing.ENABLED else BreakerCursor
+    return _cursor_class
+
+
+def _set_bulk_timeout(cursor):
+    """Поднимает statement_timeout до BULK_STATEMENT_TIMEOUT до конца текущей транзакции."""
+    cursor.execute("SELECT set_config('statement_timeout', %s, true);",
+                   (str(int(db_config.BULK_STATEMENT_TIMEOUT * 1000)),))
+
+
+def _extra_columns(columns):
+    """Дополнительные колонки SELECT (в том же порядке)."""
+    return ''.join(f', {column}' for column in columns)
+
 
 class Database:
     def __init__(self, db_name=DB_NAME):
@@ -16,12 +75,14 @@ class Database:
 
     def _execute(self, query, params=None):
         """Helper method for executing SQL queries."""
+        import sqlite3
         with closing(sqlite3.connect(self.db_name)) as conn:
             cursor = conn.cursor()
-            if params:
-                cursor.execute(query, params)
-            else:
-                cursor.execute(query)
+            with tracing.span('sqlite.query', statement=' '.join(query.split())[:120]):
+                if params:
+                    cursor.execute(query, params)
+                else:
+                    cursor.execute(query)
             conn.commit()
             return cursor
 
@@ -39,6 +100,7 @@ class Database:
 
     def is_exists(self, table_name=DB_TABLE_NAME):
         """Checks if a table with the specified name exists."""
+        import sqlite3
         query = f"SELECT name FROM sqlite_master WHERE type='table' AND name='{table_name}';"
         with closing(sqlite3.connect(self.db_name)) as conn:
             cursor = conn.cursor()
@@ -56,6 +118,7 @@ class Database:
 
     def get_from_base(self, table_name=DB_TABLE_NAME):
         """Retrieves data from the table. If the table is empty or does not exist, returns None."""
+        import sqlite3
         try:
             query = f"SELECT * FROM {table_name};"
             with closing(sqlite3.connect(self.db_name)) as conn:
@@ -79,32 +142,276 @@ class Database:
                 );"""
         self._execute(query)
 
-    def _get_postgres_connection(self):
-        """Создает подключение к PostgreSQL."""
+    def create_mailing_schedules_table(self, table_name='mailing_schedules'):
+        """Creates a table for scheduled mailings (survives bot restarts)."""
+        query = f"""CREATE TABLE IF NOT EXISTS {table_name} (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    admin_id INTEGER NOT NULL,
+                    run_at REAL NOT NULL,
+                    window_seconds REAL NOT NULL DEFAULT 0,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    last_user_id INTEGER NOT NULL DEFAULT 0,
+                    owner_pid INTEGER,
+                    heartbeat REAL
+                );"""
+        self._execute(query)
+
+    def add_mailing_schedule(self, admin_id, run_at, window_seconds, payload, table_name='mailing_schedules'):
+        """Saves a scheduled mailing. Returns its id."""
+        query = f"INSERT INTO {table_name} (admin_id, run_at, window_seconds, payload) VALUES (?, ?, ?, ?);"
+        cursor = self._execute(query, (admin_id, run_at, window_seconds, json.dumps(payload, ensure_ascii=False, default=str)))
+        return cursor.lastrowid
+
+    def get_mailing_schedules(self, statuses=('pending', 'running'), table_name='mailing_schedules'):
+        """Returns scheduled mailings with the given statuses ordered by run_at."""
+        import sqlite3
+        placeholders = ', '.join('?' for _ in statuses)
+        query = f"""SELECT id, admin_id, run_at, window_seconds, payload, status, last_user_id, owner_pid, heartbeat
+                    FROM {table_name} WHERE status IN ({placeholders}) ORDER BY run_at;"""
+        with closing(sqlite3.connect(self.db_name)) as conn:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute(query, tuple(statuses)).fetchall()
+        schedules = [dict(row) for row in rows]
+        for schedule in schedules:
+            schedule['payload'] = json.loads(schedule['payload'])
+        return schedules
+
+    def get_mailing_schedule_status(self, schedule_id, table_name='mailing_schedules'):
+        """Returns the status of a scheduled mailing or None if it does not exist."""
+        import sqlite3
+        with closing(sqlite3.connect(self.db_name)) as conn:
+            row = conn.execute(f"SELECT status FROM {table_name} WHERE id = ?;", (schedule_id,)).fetchone()
+        return row[0] if row else None
+
+    def claim_mailing_schedule(self, schedule_id, owner_pid, now, stale_before, table_name='mailing_schedules'):
+        """
+        Atomically marks a mailing as running by owner_pid. A running mailing
+        can be taken over only if its heartbeat is older than stale_before.
+        Returns True if the mailing was claimed.
+        """
+        query = f"""UPDATE {table_name} SET status = 'running', owner_pid = ?, heartbeat = ?
+                    WHERE id = ? AND (status = 'pending' OR (status = 'running' AND heartbeat < ?));"""
+        cursor = self._execute(query, (owner_pid, now, schedule_id, stale_before))
+        return cursor.rowcount == 1
+
+    def cancel_mailing_schedule(self, schedule_id, table_name='mailing_schedules'):
+        """
+        Cancels a mailing that is still pending or running (finished ones keep their status).
+        Returns True if the mailing was cancelled.
+        """
+        query = f"UPDATE {table_name} SET status = 'cancelled' WHERE id = ? AND status IN ('pending', 'running');"
+        return self._execute(query, (schedule_id,)).rowcount == 1
+
+    def release_mailing_schedule(self, schedule_id, owner_pid, status, table_name='mailing_schedules'):
+        """
+        Sets the final status (done, failed) of a mailing run by owner_pid, or returns it to 'pending'
+        without an owner. Does nothing if the mailing was cancelled or taken over meanwhile.
+        Returns True if the status was changed.
+        """
+        query = f"""UPDATE {table_name} SET status = ?, owner_pid = CASE WHEN ? = 'pending' THEN NULL ELSE owner_pid END
+                    WHERE id = ? AND status = 'running' AND owner_pid = ?;"""
+        return self._execute(query, (status, status, schedule_id, owner_pid)).rowcount == 1
+
+    def update_mailing_schedule(self, schedule_id, owner_pid, table_name='mailing_schedules', **fields):
+        """
+        Updates fields (last_user_id, heartbeat) of a mailing run by owner_pid.
+        Returns False if the mailing is no longer running by owner_pid (cancelled or taken over).
+        """
+        assignments = ', '.join(f'{field} = ?' for field in fields)
+        query = f"""UPDATE {table_name} SET {assignments}
+                    WHERE id = ? AND status = 'running' AND owner_pid = ?;"""
+        return self._execute(query, (*fields.values(), schedule_id, owner_pid)).rowcount == 1
+
+    def create_registrations_spool_table(self, table_name='registrations_spool'):
+        """Creates a local queue for registrations made while PostgreSQL was unavailable."""
+        query = f"""CREATE TABLE IF NOT EXISTS {table_name} (
+                    telegram_id INTEGER PRIMARY KEY,
+                    username TEXT,
+                    first_name TEXT,
+                    queued_at REAL NOT NULL,
+                    storefront TEXT
+                );"""
+        self._execute(query)
+        # Queues created before storefronts were tracked lack the storefront column
+        import sqlite3
+        with closing(sqlite3.connect(self.db_name)) as conn:
+            columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table_name});")]
+            if 'storefront' not in columns:
+                conn.execute(f"ALTER TABLE {table_name} ADD COLUMN storefront TEXT;")
+                conn.commit()
+
+    def spool_registration(self, telegram_id, username=None, first_name=None, storefront=None,
+                           table_name='registrations_spool'):
+        """Saves a registration to the local queue (the first queued_at of a user is kept)."""
+        import sqlite3
         try:
-            conn = psycopg2.connect(
-                host=config.DB_HOST,
-                database=config.DB_NAME,
-                user=config.DB_USER,
-                password=config.DB_PASSWORD,
-                port=config.DB_PORT,
-                connect_timeout=10
+            self.create_registrations_spool_table(table_name)
+            self._execute(
+                f"""INSERT INTO {table_name} (telegram_id, username, first_name, queued_at, storefront)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (telegram_id) DO UPDATE
+                    SET username = excluded.username, first_name = excluded.first_name,
+                        storefront = COALESCE(excluded.storefront, storefront);""",
+                (telegram_id, username, first_name, time.time(), storefront)
             )
+        except sqlite3.Error as e:
+            logger.error(f'Failed to spool registration of {telegram_id}: {e}')
+
+    def get_spooled_registrations(self, limit, table_name='registrations_spool'):
+        """
+        Returns up to limit queued registrations as (telegram_id, username, first_name, queued_at, storefront).
+        """
+        import sqlite3
+        try:
+            with closing(sqlite3.connect(self.db_name)) as conn:
+                return conn.execute(
+                    f"""SELECT telegram_id, username, first_name, queued_at, storefront FROM {table_name}
+                        ORDER BY queued_at LIMIT ?;""",
+                    (limit,)
+                ).fetchall()
+        except sqlite3.OperationalError:
+            # Очередь еще не создавалась
+            return []
+
+    def delete_spooled_registrations(self, telegram_ids, table_name='registrations_spool'):
+        """Removes replayed registrations from the local queue."""
+        import sqlite3
+        with closing(sqlite3.connect(self.db_name)) as conn:
+            conn.executemany(f"DELETE FROM {table_name} WHERE telegram_id = ?;",
+                             [(telegram_id,) for telegram_id in telegram_ids])
+            conn.commit()
+
+    def create_catalog_table(self, table_name='catalog_services'):
+        """Creates a table for the catalog snapshot used by inline search."""
+        query = f"""CREATE TABLE IF NOT EXISTS {table_name} (
+                    service_id INTEGER PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    digest TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                );"""
+        self._execute(query)
+
+    def get_catalog(self, table_name='catalog_services'):
+        """Returns the catalog snapshot as a list of (service_id, data, digest)."""
+        import sqlite3
+        with closing(sqlite3.connect(self.db_name)) as conn:
+            rows = conn.execute(f"SELECT service_id, data, digest FROM {table_name};").fetchall()
+        return [(service_id, json.loads(data), digest) for service_id, data, digest in rows]
+
+    def update_catalog(self, changed, removed_ids, now, table_name='catalog_services'):
+        """
+        Applies a snapshot diff in one transaction: changed is a list of
+        (service_id, data, digest) to upsert, removed_ids are deleted.
+        """
+        import sqlite3
+        with closing(sqlite3.connect(self.db_name)) as conn:
+            with tracing.span('sqlite.query', statement=f'update_catalog {table_name}'):
+                conn.executemany(
+                    f"""INSERT INTO {table_name} (service_id, data, digest, updated_at) VALUES (?, ?, ?, ?)
+                        ON CONFLICT (service_id) DO UPDATE
+                        SET data = excluded.data, digest = excluded.digest, updated_at = excluded.updated_at;""",
+                    [(service_id, json.dumps(data, ensure_ascii=False), digest, now)
+                     for service_id, data, digest in changed]
+                )
+                conn.executemany(f"DELETE FROM {table_name} WHERE service_id = ?;",
+                                 [(service_id,) for service_id in removed_ids])
+            conn.commit()
+
+    def _get_postgres_connection(self, dedicated=False, **options):
+        """
+        Выдает подключение к PostgreSQL из общего пула (db_module.pool); с dedicated или options -
+        отдельное подключение (options - дополнительные параметры psycopg2.connect).
+        Пока размыкатель открыт (PostgreSQL недоступен), сразу бросает CircuitOpenError.
+        Ожидание свободного подключения дольше POOL_TIMEOUT (PoolTimeout) - неудача размыкателя:
+        подключения пула заняты зависшими запросами.
+        """
+        postgres_breaker.before_call()
+        if postgres_pool is None or dedicated or options:
+            return self._connect(**options)
+        if not postgres_breaker.is_closed:
+            # Пробная попытка после инцидента - новое подключение: свободные подключения пула, скорее всего, разорваны
+            postgres_pool.clear()
+        try:
+            return postgres_pool.acquire(self._connect)
+        except PoolTimeout:
+            # В том числе пробная попытка не состоялась - размыкатель снова открывается до следующей
+            postgres_breaker.record_failure()
+            raise
+
+    def _connect(self, **options):
+        """
+        Создает подключение к PostgreSQL, сообщая результат размыкателю.
+        Подключение создается с statement_timeout и TCP keepalive, поэтому медленный
+        или пропавший из сети PostgreSQL не блокирует запрос дольше STATEMENT_TIMEOUT.
+        """
+        import psycopg2
+        params = {
+            'keepalives': 1,
+            'keepalives_idle': db_config.KEEPALIVES_IDLE,
+            'keepalives_interval': db_config.KEEPALIVES_INTERVAL,
+            'keepalives_count': db_config.KEEPALIVES_COUNT,
+        }
+        if db_config.STATEMENT_TIMEOUT > 0:
+            params['options'] = f'-c statement_timeout={int(db_config.STATEMENT_TIMEOUT * 1000)}'
+        params.update(options)
+        try:
+            with tracing.span('db.connect'):
+                conn = psycopg2.connect(
+                    host=config.DB_HOST,
+                    database=config.DB_NAME,
+                    user=config.DB_USER,
+                    password=config.DB_PASSWORD,
+                    port=config.DB_PORT,
+                    connect_timeout=CONNECT_TIMEOUT,
+                    cursor_factory=_cursor_factory(),
+                    **params
+                )
+            postgres_breaker.record_success()
             return conn
-        except OperationalError as e:
-            print(f'[ERROR] PostgreSQL connection failed: {e}')
-            print(f'[INFO] Connection params: host={config.DB_HOST}, port={config.DB_PORT}, db={config.DB_NAME}, user={config.DB_USER}')
-            print(f'[INFO] Если бот запускается на хосте, используйте DB_HOST=localhost')
-            print(f'[INFO] Если бот запускается в Docker, используйте DB_HOST=postgres (имя сервиса из docker-compose.yml)')
+        except psycopg2.OperationalError as e:
+            postgres_breaker.record_failure()
+            logger.error(f'PostgreSQL connection failed: {e}')
+            logger.info(f'Connection params: host={config.DB_HOST}, port={config.DB_PORT}, db={config.DB_NAME}, user={config.DB_USER}')
+            logger.info('Если бот запускается на хосте, используйте DB_HOST=localhost')
+            logger.info('Если бот запускается в Docker, используйте DB_HOST=postgres (имя сервиса из docker-compose.yml)')
             raise
         except Exception as e:
-            print(f'[ERROR] PostgreSQL connection failed: {e}')
+            postgres_breaker.record_failure()
+            logger.error(f'PostgreSQL connection failed: {e}')
             raise
 
-    def add_user(self, user_id, username=None, first_name=None, table_name='users'):
-        """Добавляет пользователя в PostgreSQL базу данных, если его там нет."""
+    def ping(self):
+        """Проверяет доступность PostgreSQL. Возвращает True, если запрос выполнен."""
+        try:
+            conn = self._get_postgres_connection()
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1;")
+            cursor.close()
+            conn.close()
+            return True
+        except Exception as e:
+            logger.error(f'PostgreSQL ping failed: {e}')
+            return False
+
+    def add_user(self, user_id, username=None, first_name=None, storefront=None, table_name='users'):
+        """
+        Добавляет пользователя в PostgreSQL базу данных, если его там нет.
+        storefront - витрина (hosting_module), бота которой запустил пользователь: сохраняется
+        в bot_user_storefronts для рассылок и уведомлений витрины.
+        Если PostgreSQL недоступен, регистрация сохраняется в локальную очередь (SQLite)
+        и позже переносится в PostgreSQL пачкой (db_module/spool.py).
+        Возвращает True, если пользователь записан в PostgreSQL.
+        """
+        import psycopg2
         try:
             conn = self._get_postgres_connection()
+        except Exception as e:
+            self.spool_registration(user_id, username, first_name, storefront)
+            logger.error(f'PostgreSQL unavailable, registration of {user_id} spooled: {e}')
+            return False
+
+        try:
             cursor = conn.cursor()
             
             # Проверяем, существует ли пользователь с таким telegram_id
@@ -171,30 +478,799 @@ class Database:
                     query = f"UPDATE users SET {', '.join(update_fields)} WHERE telegram_id = %s;"
                     cursor.execute(query, tuple(update_values))
                     conn.commit()
+
+            if storefront:
+                cursor.execute(
+                    """INSERT INTO bot_user_storefronts (telegram_id, storefront) VALUES (%s, %s)
+                       ON CONFLICT (telegram_id, storefront) DO UPDATE SET started_at = CURRENT_TIMESTAMP;""",
+                    (user_id, storefront)
+                )
+                conn.commit()
             
             cursor.close()
             conn.close()
+            return True
+        except psycopg2.OperationalError as e:
+            # Соединение разорвано во время запроса - повторим из очереди
+            self.spool_registration(user_id, username, first_name, storefront)
+            logger.error(f'Failed to add user to PostgreSQL, registration spooled: {e}')
         except Exception as e:
-            print(f'[ERROR] Failed to add user to PostgreSQL: {e}')
+            logger.error(f'Failed to add user to PostgreSQL: {e}')
             # Не прерываем выполнение, просто логируем ошибку
+        return False
 
-    def get_all_users(self, table_name='users'):
-        """Возвращает список всех telegram_id из PostgreSQL таблицы users."""
+    def add_users_bulk(self, registrations):
+        """
+        Добавляет пачку регистраций [(telegram_id, username, first_name, queued_at, storefront)] одним запросом.
+        Существующим пользователям обновляется first_name. Занятый другим пользователем username
+        заменяется на user_<telegram_id>. Витрины регистраций записываются в bot_user_storefronts.
+        Возвращает True при успехе.
+        """
+        if not registrations:
+            return True
+        telegram_ids, usernames, first_names, queued_at, storefronts = (
+            list(column) for column in zip(*registrations)
+        )
         try:
             conn = self._get_postgres_connection()
             cursor = conn.cursor()
-            
-            cursor.execute("SELECT telegram_id FROM users WHERE telegram_id IS NOT NULL;")
-            user_ids = [row[0] for row in cursor.fetchall()]
-            
+            cursor.execute("""
+                INSERT INTO users (telegram_id, username, email, first_name, join_date)
+                SELECT s.telegram_id,
+                       CASE WHEN s.username IS NULL OR EXISTS (SELECT 1 FROM users u WHERE u.username = s.username)
+                            THEN 'user_' || s.telegram_id ELSE s.username END,
+                       'telegram_' || s.telegram_id || '@local',
+                       s.first_name,
+                       to_timestamp(s.queued_at)::timestamp
+                FROM unnest(%s::bigint[], %s::text[], %s::text[], %s::float8[])
+                     AS s(telegram_id, username, first_name, queued_at)
+                ON CONFLICT (telegram_id) DO UPDATE
+                SET first_name = COALESCE(EXCLUDED.first_name, users.first_name), updated_at = CURRENT_TIMESTAMP;
+            """, (telegram_ids, usernames, first_names, queued_at))
+            cursor.execute("""
+                INSERT INTO bot_user_storefronts (telegram_id, storefront, started_at)
+                SELECT s.telegram_id, s.storefront, to_timestamp(s.queued_at)::timestamp
+                FROM unnest(%s::bigint[], %s::text[], %s::float8[]) AS s(telegram_id, storefront, queued_at)
+                WHERE s.storefront IS NOT NULL
+                ON CONFLICT (telegram_id, storefront) DO NOTHING;
+            """, (telegram_ids, storefronts, queued_at))
+            conn.commit()
             cursor.close()
             conn.close()
-            
-            return user_ids
+            return True
+        except Exception as e:
+            logger.error(f'Failed to add {len(registrations)} users to PostgreSQL: {e}')
+            return False
+
+    def import_users(self, source, on_stage=None):
+        """
+        Импортирует пользователей одной транзакцией: source (файловый объект, CSV
+        telegram_id,username,first_name) потоком загружается COPY во временную таблицу,
+        затем сливается с users запросами над всем набором:
+        - существующим пользователям заполняются first_name и свободный username;
+        - новым - username из файла, если он свободен и не повторяется в файле, иначе user_<telegram_id>;
+        - строки, которым все же достался занятый username или email, вставляются еще раз со случайным суффиксом.
+        on_stage(название этапа) вызывается перед каждым этапом слияния.
+        Возвращает {'rows', 'unique', 'inserted', 'updated', 'skipped'} или None при ошибке.
+        """
+        def stage(name):
+            if on_stage:
+                on_stage(name)
+
+        try:
+            conn = self._get_postgres_connection()
+            cursor = conn.cursor()
+            _set_bulk_timeout(cursor)
+            # Триггер bot_user_changed не шлет NOTIFY на каждую строку (migration_add_bot_user_import.sql)
+            cursor.execute("SET LOCAL bot.bulk_import = 'on';")
+            cursor.execute("""
+                CREATE TEMP TABLE bot_import_staging (telegram_id BIGINT, username TEXT, first_name TEXT)
+                ON COMMIT DROP;
+            """)
+            with tracing.span('db.copy', statement='COPY bot_import_staging FROM STDIN'):
+                cursor.copy_expert("COPY bot_import_staging FROM STDIN WITH (FORMAT csv);", source)
+
+            stage('dedupe')
+            # Из повторов telegram_id остается строка с наибольшим количеством данных
+            cursor.execute("""
+                CREATE TEMP TABLE bot_import_rows ON COMMIT DROP AS
+                SELECT DISTINCT ON (telegram_id)
+                       telegram_id,
+                       NULLIF(left(ltrim(btrim(username), '@'), 50), '') AS username,
+                       NULLIF(left(btrim(first_name), 100), '') AS first_name
+                FROM bot_import_staging
+                ORDER BY telegram_id, (NULLIF(btrim(username), '') IS NULL), (NULLIF(btrim(first_name), '') IS NULL);
+            """)
+            cursor.execute("CREATE INDEX ON bot_import_rows (telegram_id);")
+            cursor.execute("CREATE INDEX ON bot_import_rows (username);")
+            cursor.execute("ANALYZE bot_import_rows;")
+            cursor.execute("SELECT (SELECT COUNT(*) FROM bot_import_staging), (SELECT COUNT(*) FROM bot_import_rows);")
+            rows, unique = cursor.fetchone()
+
+            stage('update')
+            # username меняется, только если он не занят и не нужен другой строке импорта
+            cursor.execute("""
+                UPDATE users u
+                SET first_name = COALESCE(r.first_name, u.first_name),
+                    username = CASE
+                        WHEN r.username IS NOT NULL
+                             AND NOT EXISTS (SELECT 1 FROM users o WHERE o.username = r.username AND o.id <> u.id)
+                             AND NOT EXISTS (SELECT 1 FROM bot_import_rows d
+                                             WHERE d.username = r.username AND d.telegram_id <> r.telegram_id)
+                        THEN r.username ELSE u.username END,
+                    updated_at = CURRENT_TIMESTAMP
+                FROM bot_import_rows r
+                WHERE u.telegram_id = r.telegram_id
+                  AND ((r.first_name IS NOT NULL AND r.first_name IS DISTINCT FROM u.first_name)
+                       OR (r.username IS NOT NULL AND r.username IS DISTINCT FROM u.username));
+            """)
+            updated = cursor.rowcount
+
+            stage('insert')
+            cursor.execute("""
+                INSERT INTO users (telegram_id, username, email, first_name, join_date)
+                SELECT r.telegram_id,
+                       CASE WHEN r.username IS NOT NULL
+                                 AND NOT EXISTS (SELECT 1 FROM users o WHERE o.username = r.username)
+                                 AND NOT EXISTS (SELECT 1 FROM bot_import_rows d
+                                                 WHERE d.username = r.username AND d.telegram_id < r.telegram_id)
+                            THEN r.username ELSE 'user_' || r.telegram_id END,
+                       'telegram_' || r.telegram_id || '@local',
+                       r.first_name,
+                       CURRENT_TIMESTAMP
+                FROM bot_import_rows r
+                WHERE NOT EXISTS (SELECT 1 FROM users u WHERE u.telegram_id = r.telegram_id)
+                ON CONFLICT DO NOTHING;
+            """)
+            inserted = cursor.rowcount
+            # Строкам, которые пропустил ON CONFLICT (занятый username или email), - уникальный суффикс
+            cursor.execute("""
+                INSERT INTO users (telegram_id, username, email, first_name, join_date)
+                SELECT r.telegram_id,
+                       'user_' || r.telegram_id || '_' || s.suffix,
+                       'telegram_' || r.telegram_id || '_' || s.suffix || '@local',
+                       r.first_name,
+                       CURRENT_TIMESTAMP
+                FROM bot_import_rows r
+                CROSS JOIN LATERAL (SELECT substr(md5(random()::text || r.telegram_id), 1, 8) AS suffix) s
+                WHERE NOT EXISTS (SELECT 1 FROM users u WHERE u.telegram_id = r.telegram_id)
+                ON CONFLICT DO NOTHING;
+            """)
+            inserted += cursor.rowcount
+            cursor.execute("""
+                SELECT COUNT(*) FROM bot_import_rows r
+                WHERE NOT EXISTS (SELECT 1 FROM users u WHERE u.telegram_id = r.telegram_id);
+            """)
+            skipped = cursor.fetchone()[0]
+            cursor.execute("SELECT pg_notify('bot_user_changed', '*');")
+
+            stage('commit')
+            conn.commit()
+            cursor.close()
+            conn.close()
+        except Exception as e:
+            logger.error(f'Failed to import users to PostgreSQL: {e}')
+            return None
+
+        return {'rows': rows, 'unique': unique, 'inserted': inserted, 'updated': updated, 'skipped': skipped}
+
+    def count_recipients(self, where, start_after=0, end_id=None):
+        """
+        Возвращает количество получателей рассылки (подсчет выполняется в PostgreSQL).
+        where - условие выборки (where_sql, params) над users u, см. mailing_module.segments.compile_segments.
+        start_after - users.id, после которого считать (для возобновленной рассылки).
+        end_id - последний users.id диапазона (для части рассылки из очереди).
+        """
+        where_sql, params = where
+        if end_id is not None:
+            where_sql += ' AND u.id <= %s'
+            params = (*params, end_id)
+        try:
+            conn = self._get_postgres_connection()
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT COUNT(*) FROM users u WHERE {where_sql} AND u.id > %s;", (*params, start_after))
+            count = cursor.fetchone()[0]
+            cursor.close()
+            conn.close()
+            return count
+        except Exception as e:
+            logger.error(f'Failed to count recipients in PostgreSQL: {e}')
+            return 0
+
+    def iter_recipients(self, where, batch_size=1000, start_after=0, end_id=None, columns=()):
+        """
+        Генератор (users.id, telegram_id, *columns) получателей рассылки.
+        where - условие выборки (where_sql, params) над users u, см. mailing_module.segments.compile_segments.
+        columns - выражения SQL полей персонализации (mailing_module.personalize.Template.columns),
+        читаются той же выборкой.
+        Выборка идет страницами по первичному ключу (keyset), поэтому длинная
+        рассылка не держит открытую транзакцию и не грузит всех пользователей в память.
+        users.id служит точкой возобновления (start_after) прерванной рассылки,
+        end_id ограничивает диапазон части рассылки из очереди.
+        """
+        where_sql, params = where
+        if end_id is not None:
+            where_sql += ' AND u.id <= %s'
+            params = (*params, end_id)
+        query = f"""SELECT u.id, u.telegram_id{_extra_columns(columns)} FROM users u
+                    WHERE {where_sql} AND u.id > %s
+                    ORDER BY u.id
+                    LIMIT %s;"""
+        last_id = start_after
+        while True:
+            try:
+                conn = self._get_postgres_connection()
+                cursor = conn.cursor()
+                cursor.execute(query, (*params, last_id, batch_size))
+                rows = cursor.fetchall()
+                cursor.close()
+                conn.close()
+            except Exception as e:
+                logger.error(f'Failed to get recipients from PostgreSQL: {e}')
+                return
+
+            yield from rows
+            if len(rows) < batch_size:
+                return
+            last_id = rows[-1][0]
+
+    def get_recipient_fields(self, telegram_ids, columns):
+        """
+        Поля персонализации для нескольких получателей одним запросом.
+        columns - выражения SQL полей (см. iter_recipients).
+        Возвращает словарь telegram_id -> кортеж значений columns (пустой при ошибке).
+        """
+        try:
+            conn = self._get_postgres_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT u.telegram_id{_extra_columns(columns)} FROM users u WHERE u.telegram_id = ANY(%s);",
+                (list(telegram_ids),)
+            )
+            rows = cursor.fetchall()
+            cursor.close()
+            conn.close()
+        except Exception as e:
+            logger.error(f'Failed to get recipient fields from PostgreSQL: {e}')
+            return {}
+        return {row[0]: row[1:] for row in rows}
+
+    def create_mailing_job(self, admin_id, payload, chunk_size, where):
+        """
+        Ставит рассылку в очередь: получатели (условие where, см. count_recipients) делятся на части по chunk_size
+        (диапазоны users.id), которые затем забирают воркеры рассылки.
+        Разбиение выполняется одним запросом в PostgreSQL.
+        Возвращает (id рассылки, количество частей) или None при ошибке.
+        """
+        where_sql, params = where
+        try:
+            conn = self._get_postgres_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT INTO bot_mailing_jobs (admin_id, payload) VALUES (%s, %s) RETURNING id;",
+                (admin_id, json.dumps(payload, default=str))
+            )
+            job_id = cursor.fetchone()[0]
+            cursor.execute(f"""
+                INSERT INTO bot_mailing_chunks (job_id, start_user_id, end_user_id, last_user_id)
+                SELECT %s, MIN(id) - 1, MAX(id), MIN(id) - 1
+                FROM (
+                    SELECT u.id, (ROW_NUMBER() OVER (ORDER BY u.id) - 1) / %s AS chunk
+                    FROM users u
+                    WHERE {where_sql}
+                ) numbered
+                GROUP BY chunk;
+            """, (job_id, chunk_size, *params))
+            total_chunks = cursor.rowcount
+            cursor.execute(
+                """UPDATE bot_mailing_jobs
+                   SET total_chunks = %s,
+                       status = CASE WHEN %s = 0 THEN 'done' ELSE status END
+                   WHERE id = %s;""",
+                (total_chunks, total_chunks, job_id)
+            )
+            conn.commit()
+            cursor.close()
+            conn.close()
+            return job_id, total_chunks
+        except Exception as e:
+            logger.error(f'Failed to create mailing job in PostgreSQL: {e}')
+            return None
+
+    def claim_mailing_chunk(self, worker_id, claim_timeout_minutes):
+        """
+        Забирает следующую часть рассылки из очереди. Части, занятые другими
+        воркерами, пропускаются (SKIP LOCKED), поэтому воркеры не ждут друг друга.
+        Часть, которую воркер не обновлял claim_timeout_minutes, считается брошенной и забирается заново.
+        Возвращает словарь с полями части и рассылки или None, если очередь пуста.
+        """
+        try:
+            conn = self._get_postgres_connection()
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE bot_mailing_chunks c
+                SET status = 'claimed', claimed_by = %s, claimed_at = NOW()
+                FROM bot_mailing_jobs j
+                WHERE j.id = c.job_id
+                AND c.id = (
+                    SELECT c2.id FROM bot_mailing_chunks c2
+                    JOIN bot_mailing_jobs j2 ON j2.id = c2.job_id
+                    WHERE j2.status = 'running'
+                    AND (c2.status = 'pending'
+                         OR (c2.status = 'claimed' AND c2.claimed_at < NOW() - %s * INTERVAL '1 minute'))
+                    ORDER BY c2.id
+                    LIMIT 1
+                    FOR UPDATE OF c2 SKIP LOCKED
+                )
+                RETURNING c.id, c.job_id, c.last_user_id, c.end_user_id, j.admin_id, j.payload;
+            """, (worker_id, claim_timeout_minutes))
+            row = cursor.fetchone()
+            conn.commit()
+            cursor.close()
+            conn.close()
+        except Exception as e:
+            logger.error(f'Failed to claim mailing chunk in PostgreSQL: {e}')
+            return None
+
+        if row is None:
+            return None
+        chunk_id, job_id, last_user_id, end_user_id, admin_id, payload = row
+        return {
+            'id': chunk_id,
+            'job_id': job_id,
+            'last_user_id': last_user_id,
+            'end_user_id': end_user_id,
+            'admin_id': admin_id,
+            'payload': payload if isinstance(payload, dict) else json.loads(payload),
+        }
+
+    def update_mailing_chunk(self, chunk_id, worker_id, last_user_id):
+        """
+        Сохраняет позицию части рассылки и продлевает ее захват воркером.
+        Возвращает False, если часть больше не захвачена worker_id (забрана другим воркером
+        после таймаута захвата), None - при ошибке.
+        """
+        try:
+            conn = self._get_postgres_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                """UPDATE bot_mailing_chunks SET last_user_id = %s, claimed_at = NOW()
+                   WHERE id = %s AND status = 'claimed' AND claimed_by = %s;""",
+                (last_user_id, chunk_id, worker_id)
+            )
+            updated = cursor.rowcount == 1
+            conn.commit()
+            cursor.close()
+            conn.close()
+            return updated
+        except Exception as e:
+            logger.error(f'Failed to update mailing chunk in PostgreSQL: {e}')
+            return None
+
+    def release_mailing_chunk(self, chunk_id, worker_id, last_user_id, successful, failed, blocked):
+        """Возвращает недоотправленную часть рассылки в очередь (воркер останавливается)."""
+        try:
+            conn = self._get_postgres_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                """UPDATE bot_mailing_chunks
+                   SET status = 'pending', claimed_by = NULL, claimed_at = NULL, last_user_id = %s,
+                       successful = successful + %s, failed = failed + %s, blocked = blocked + %s
+                   WHERE id = %s AND status = 'claimed' AND claimed_by = %s;""",
+                (last_user_id, successful, failed, blocked, chunk_id, worker_id)
+            )
+            conn.commit()
+            cursor.close()
+            conn.close()
+        except Exception as e:
+            logger.error(f'Failed to release mailing chunk in PostgreSQL: {e}')
+
+    def complete_mailing_chunk(self, chunk_id, worker_id, successful, failed, blocked):
+        """
+        Отмечает часть рассылки выполненной. Если это была последняя часть,
+        рассылка завершается и возвращается ее итоговая статистика
+        (admin_id, total_users, successful, failed, blocked, elapsed_time), иначе None.
+        """
+        try:
+            conn = self._get_postgres_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                """UPDATE bot_mailing_chunks
+                   SET status = 'done', finished_at = NOW(),
+                       successful = successful + %s, failed = failed + %s, blocked = blocked + %s
+                   WHERE id = %s AND status = 'claimed' AND claimed_by = %s
+                   RETURNING job_id;""",
+                (successful, failed, blocked, chunk_id, worker_id)
+            )
+            row = cursor.fetchone()
+            summary = None
+            if row is not None:
+                job_id = row[0]
+                # Блокируем рассылку, чтобы одновременно завершившие последние части
+                # воркеры не разминулись и ровно один из них закрыл рассылку
+                cursor.execute("SELECT id FROM bot_mailing_jobs WHERE id = %s FOR UPDATE;", (job_id,))
+                cursor.execute("""
+                    UPDATE bot_mailing_jobs j SET status = 'done', finished_at = NOW()
+                    WHERE j.id = %s AND j.status = 'running'
+                    AND NOT EXISTS (
+                        SELECT 1 FROM bot_mailing_chunks c WHERE c.job_id = j.id AND c.status <> 'done'
+                    )
+                    RETURNING j.admin_id, EXTRACT(EPOCH FROM NOW() - j.created_at);
+                """, (job_id,))
+                job = cursor.fetchone()
+                if job is not None:
+                    cursor.execute(
+                        """SELECT COALESCE(SUM(successful), 0), COALESCE(SUM(failed), 0), COALESCE(SUM(blocked), 0)
+                           FROM bot_mailing_chunks WHERE job_id = %s;""",
+                        (job_id,)
+                    )
+                    total_successful, total_failed, total_blocked = cursor.fetchone()
+                    summary = {
+                        'job_id': job_id,
+                        'admin_id': job[0],
+                        'total_users': total_successful + total_failed,
+                        'successful': total_successful,
+                        'failed': total_failed,
+                        'blocked': total_blocked,
+                        'elapsed_time': float(job[1]),
+                    }
+            conn.commit()
+            cursor.close()
+            conn.close()
+            return summary
+        except Exception as e:
+            logger.error(f'Failed to complete mailing chunk in PostgreSQL: {e}')
+            return None
+
+    # Источники ежедневных агрегатов: (таблица, колонка даты, условие, {колонка bot_daily_stats: агрегат})
+    ROLLUP_SOURCES = (
+        ('users', 'join_date', 'telegram_id IS NOT NULL', {'registrations': 'COUNT(*)'}),
+        ('purchases', 'purchase_date', "status = 'completed'",
+         {'purchases': 'COUNT(*)', 'purchases_amount': 'SUM(amount)'}),
+        ('transactions', 'created_at', "type = 'deposit' AND status = 'completed'",
+         {'deposits': 'COUNT(*)', 'deposits_amount': 'SUM(amount)'}),
+    )
+
+    def update_daily_rollups(self):
+        """
+        Инкрементально пополняет bot_daily_stats: обрабатываются только строки
+        с id больше водяного знака источника, после чего знак сдвигается.
+        Бэкенд вставляет строки в долгих транзакциях, и меньший id может стать видимым
+        позже большего. Поэтому знак сдвигается в два шага: MAX(id) запоминается
+        кандидатом вместе с xmax снимка, а учитывается, когда pg_snapshot_xmin перешел
+        этот xmax, то есть все транзакции, которые могли держать id не больше кандидата,
+        завершены.
+        Покупки и пополнения учитываются в текущем статусе; смену статуса уже учтенной
+        строки (pending -> completed, completed -> failed) исправляют триггеры
+        bot_rollup_*_status (migration_add_bot_daily_stats.sql).
+        Возвращает {источник: количество обработанных id} или None при ошибке.
+        """
+        try:
+            conn = self._get_postgres_connection()
+            cursor = conn.cursor()
+            _set_bulk_timeout(cursor)
+            # Блокировка водяных знаков не дает двум процессам учесть одни строки дважды,
+            # а триггерам смены статуса - разминуться с пересчетом (они берут FOR SHARE)
+            cursor.execute("SELECT source, last_id, pending_id, pending_xmax FROM bot_rollup_watermarks FOR UPDATE;")
+            watermarks = {source: (last_id, pending_id, pending_xmax)
+                          for source, last_id, pending_id, pending_xmax in cursor.fetchall()}
+            # Транзакции с номером меньше xmin завершены
+            cursor.execute("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint;")
+            xmin = cursor.fetchone()[0]
+
+            processed = {}
+            for table, date_column, condition, aggregates in self.ROLLUP_SOURCES:
+                last_id, pending_id, pending_xmax = watermarks.get(table, (0, None, None))
+                upto_id = last_id
+                if pending_id is not None and pending_xmax <= xmin:
+                    upto_id = pending_id
+                    pending_id = None
+
+                if upto_id > last_id:
+                    columns = ', '.join(aggregates)
+                    expressions = ', '.join(f'COALESCE({expression}, 0)' for expression in aggregates.values())
+                    updates = ', '.join(f'{column} = bot_daily_stats.{column} + EXCLUDED.{column}'
+                                        for column in aggregates)
+                    cursor.execute(f"""
+                        INSERT INTO bot_daily_stats (day, {columns}, updated_at)
+                        SELECT {date_column}::date, {expressions}, NOW()
+                        FROM {table}
+                        WHERE id > %s AND id <= %s AND {date_column} IS NOT NULL AND {condition}
+                        GROUP BY {date_column}::date
+                        ON CONFLICT (day) DO UPDATE SET {updates}, updated_at = NOW();
+                    """, (last_id, upto_id))
+                    processed[table] = upto_id - last_id
+
+                if pending_id is None:
+                    # Кандидат и xmax берутся одним запросом: транзакции, идущие в момент чтения MAX(id),
+                    # имеют номер меньше xmax этого снимка
+                    cursor.execute(
+                        f"SELECT MAX(id), pg_snapshot_xmax(pg_current_snapshot())::text::bigint "
+                        f"FROM {table} WHERE id > %s;",
+                        (upto_id,)
+                    )
+                    pending_id, pending_xmax = cursor.fetchone()
+                    if pending_id is None:
+                        pending_xmax = None
+                cursor.execute(
+                    """UPDATE bot_rollup_watermarks
+                       SET last_id = %s, pending_id = %s, pending_xmax = %s, updated_at = NOW()
+                       WHERE source = %s;""",
+                    (upto_id, pending_id, pending_xmax, table)
+                )
+
+            conn.commit()
+            cursor.close()
+            conn.close()
+            return processed
         except Exception as e:
-            print(f'[ERROR] Failed to get users from PostgreSQL: {e}')
+            logger.error(f'Failed to update daily rollups in PostgreSQL: {e}')
+            return None
+
+    def get_daily_rollups(self, start_day, end_day):
+        """Возвращает ежедневные агрегаты за дни с start_day по end_day включительно (только bot_daily_stats)."""
+        try:
+            conn = self._get_postgres_connection()
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT day, registrations, purchases, purchases_amount, deposits, deposits_amount
+                FROM bot_daily_stats
+                WHERE day BETWEEN %s AND %s
+                ORDER BY day;
+            """, (start_day, end_day))
+            rows = cursor.fetchall()
+            cursor.close()
+            conn.close()
+        except Exception as e:
+            logger.error(f'Failed to get daily rollups from PostgreSQL: {e}')
             return []
 
+        return [
+            {
+                'day': day,
+                'registrations': registrations,
+                'purchases': purchases,
+                'purchases_amount': float(purchases_amount),
+                'deposits': deposits,
+                'deposits_amount': float(deposits_amount),
+            }
+            for day, registrations, purchases, purchases_amount, deposits, deposits_amount in rows
+        ]
+
+    def copy_to(self, query, file, params=None, csv_header=False):
+        """
+        Выгружает результат запроса в file (COPY ... TO STDOUT, текстовый формат
+        или CSV с заголовком при csv_header=True): один проход без построчной обработки в Python.
+        params подставляются в query на стороне клиента (COPY не поддерживает параметры).
+        Возвращает True при успехе.
+        """
+        try:
+            conn = self._get_postgres_connection()
+            cursor = conn.cursor()
+            _set_bulk_timeout(cursor)
+            statement = cursor.mogrify(query, params).decode('utf-8') if params else query
+            options = ' WITH (FORMAT csv, HEADER)' if csv_header else ''
+            with tracing.span('db.copy', statement=' '.join(query.split())[:120]):
+                cursor.copy_expert(f"COPY ({statement}) TO STDOUT{options};", file)
+            cursor.close()
+            conn.close()
+            return True
+        except Exception as e:
+            logger.error(f'Failed to COPY from PostgreSQL: {e}')
+            return False
+
+    def get_account(self, telegram_id, orders_limit):
+        """
+        Баланс и последние заказы пользователя для /balance и /orders.
+        Запросы обслуживаются покрывающими индексами (migration_add_bot_account_cache.sql).
+        Возвращает словарь (registered=False, если пользователя нет) или None при ошибке.
+        """
+        try:
+            conn = self._get_postgres_connection()
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, balance, total_spent FROM users WHERE telegram_id = %s;", (telegram_id,))
+            user = cursor.fetchone()
+            if user is None:
+                cursor.close()
+                conn.close()
+                return {'registered': False}
+
+            user_id, balance, total_spent = user
+            cursor.execute("""
+                SELECT purchase_date, service_name, amount, currency, status
+                FROM purchases
+                WHERE user_id = %s
+                ORDER BY purchase_date DESC
+                LIMIT %s;
+            """, (user_id, orders_limit))
+            orders = cursor.fetchall()
+            cursor.execute("""
+                SELECT amount, created_at
+                FROM transactions
+                WHERE user_id = %s AND type = 'deposit' AND status = 'completed'
+                ORDER BY created_at DESC
+                LIMIT 1;
+            """, (user_id,))
+            last_deposit = cursor.fetchone()
+            cursor.close()
+            conn.close()
+        except Exception as e:
+            logger.error(f'Failed to get account from PostgreSQL: {e}')
+            return None
+
+        return {
+            'registered': True,
+            'balance': float(balance or 0),
+            'total_spent': float(total_spent or 0),
+            'last_deposit': {'amount': float(last_deposit[0]), 'date': last_deposit[1]} if last_deposit else None,
+            'orders': [
+                {
+                    'date': purchase_date,
+                    'title': service_name,
+                    'amount': float(amount),
+                    'currency': currency,
+                    'status': status,
+                }
+                for purchase_date, service_name, amount, currency, status in orders
+            ],
+        }
+
+    def upsert_user_activity(self, rows):
+        """
+        Записывает активность пачки пользователей
+        [(telegram_id, последнее обращение (unix time), сообщения, команды, кнопки, inline-запросы)]
+        одним запросом: время последнего обращения только сдвигается вперед, счетчики прибавляются.
+        Возвращает True при успехе.
+        """
+        if not rows:
+            return True
+        # Один порядок блокировки строк у всех процессов бота (во время передачи polling их два)
+        columns = [list(column) for column in zip(*sorted(rows))]
+        try:
+            conn = self._get_postgres_connection()
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO bot_user_activity AS a
+                    (telegram_id, first_seen_at, last_seen_at, messages, commands, callbacks, inline_queries)
+                SELECT s.telegram_id, to_timestamp(s.last_seen)::timestamp, to_timestamp(s.last_seen)::timestamp,
+                       s.messages, s.commands, s.callbacks, s.inline_queries
+                FROM unnest(%s::bigint[], %s::float8[], %s::bigint[], %s::bigint[], %s::bigint[], %s::bigint[])
+                     AS s(telegram_id, last_seen, messages, commands, callbacks, inline_queries)
+                ON CONFLICT (telegram_id) DO UPDATE
+                SET last_seen_at = GREATEST(a.last_seen_at, EXCLUDED.last_seen_at),
+                    messages = a.messages + EXCLUDED.messages,
+                    commands = a.commands + EXCLUDED.commands,
+                    callbacks = a.callbacks + EXCLUDED.callbacks,
+                    inline_queries = a.inline_queries + EXCLUDED.inline_queries;
+            """, columns)
+            conn.commit()
+            cursor.close()
+            conn.close()
+            return True
+        except Exception as e:
+            logger.error(f'Failed to upsert user activity to PostgreSQL: {e}')
+            return False
+
+    def count_active_users(self, windows):
+        """
+        Количество пользователей, обращавшихся к боту за каждое из окон windows (в днях).
+        Один проход по индексу last_seen_at в пределах самого длинного окна.
+        Возвращает {дней: количество} или None при ошибке.
+        """
+        windows = sorted(windows)
+        filters = ', '.join(
+            "COUNT(*) FILTER (WHERE last_seen_at >= CURRENT_TIMESTAMP - %s * INTERVAL '1 day')" for _ in windows
+        )
+        try:
+            conn = self._get_postgres_connection()
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT {filters}
+                FROM bot_user_activity
+                WHERE last_seen_at >= CURRENT_TIMESTAMP - %s * INTERVAL '1 day';
+            """, (*windows, windows[-1]))
+            counts = cursor.fetchone()
+            cursor.close()
+            conn.close()
+        except Exception as e:
+            logger.error(f'Failed to count active users in PostgreSQL: {e}')
+            return None
+        return dict(zip(windows, counts))
+
+    def listen(self, *channels):
+        """
+        Открывает отдельное подключение (autocommit, TCP keepalive) и подписывает его
+        на LISTEN каждого из channels. Подключение закрывает вызывающий. Бросает исключение при ошибке.
+        """
+        conn = self._get_postgres_connection(dedicated=True)
+        try:
+            conn.autocommit = True
+            cursor = conn.cursor()
+            for channel in channels:
+                cursor.execute(f"LISTEN {channel};")
+            cursor.close()
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    def claim_notifications(self, worker_id, limit, claim_timeout_minutes):
+        """
+        Забирает до limit готовых к отправке уведомлений из bot_notification_outbox (SKIP LOCKED).
+        Уведомления, захваченные дольше claim_timeout_minutes назад, забираются заново.
+        storefront уведомления - витрина, бота которой пользователь запускал последним (None, если не запускал).
+        Возвращает список словарей (пустой при ошибке).
+        """
+        try:
+            conn = self._get_postgres_connection()
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE bot_notification_outbox o
+                SET claimed_by = %s, claimed_at = NOW()
+                WHERE o.id IN (
+                    SELECT id FROM bot_notification_outbox
+                    WHERE (claimed_at IS NULL AND available_at <= NOW())
+                    OR claimed_at < NOW() - %s * INTERVAL '1 minute'
+                    ORDER BY id
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING o.id, o.telegram_id, o.kind, o.status, o.amount, o.currency, o.title, (
+                    SELECT s.storefront FROM bot_user_storefronts s
+                    WHERE s.telegram_id = o.telegram_id
+                    ORDER BY s.started_at DESC
+                    LIMIT 1
+                );
+            """, (worker_id, claim_timeout_minutes, limit))
+            rows = cursor.fetchall()
+            conn.commit()
+            cursor.close()
+            conn.close()
+        except Exception as e:
+            logger.error(f'Failed to claim notifications in PostgreSQL: {e}')
+            return []
+
+        return [
+            {
+                'id': notification_id,
+                'telegram_id': telegram_id,
+                'kind': kind,
+                'status': status,
+                'amount': float(amount) if amount is not None else None,
+                'currency': currency,
+                'title': title,
+                'storefront': storefront,
+            }
+            for notification_id, telegram_id, kind, status, amount, currency, title, storefront in sorted(rows)
+        ]
+
+    def finish_notifications(self, done_ids, retry_ids, max_attempts, retry_delay):
+        """
+        Удаляет отправленные уведомления (done_ids) и возвращает в outbox неотправленные (retry_ids):
+        они снова будут выданы через retry_delay секунд. Уведомления, не отправленные max_attempts раз, удаляются.
+        """
+        try:
+            conn = self._get_postgres_connection()
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM bot_notification_outbox WHERE id = ANY(%s);", (list(done_ids),))
+            if retry_ids:
+                cursor.execute(
+                    """UPDATE bot_notification_outbox
+                       SET claimed_by = NULL, claimed_at = NULL, attempts = attempts + 1,
+                           available_at = NOW() + %s * INTERVAL '1 second'
+                       WHERE id = ANY(%s);""",
+                    (retry_delay, list(retry_ids))
+                )
+                cursor.execute(
+                    "DELETE FROM bot_notification_outbox WHERE id = ANY(%s) AND attempts >= %s;",
+                    (list(retry_ids), max_attempts)
+                )
+            conn.commit()
+            cursor.close()
+            conn.close()
+        except Exception as e:
+            logger.error(f'Failed to finish notifications in PostgreSQL: {e}')
+
     def get_users_statistics(self):
         """Возвращает статистику по пользователям из PostgreSQL."""
         try:
@@ -265,7 +1341,7 @@ class Database:
                 'last_user_date': last_user_date
             }
         except Exception as e:
-            print(f'[ERROR] Failed to get users statistics from PostgreSQL: {e}')
+            logger.error(f'Failed to get users statistics from PostgreSQL: {e}')
             return {
                 'total_users': 0,
                 'users_today': 0,
@@ -0,0 +1,127 @@
+"""
+Пул подключений к PostgreSQL, общий для процесса.
+
+Все экземпляры Database и все боты процесса берут подключения из одного
+пула размером POOL_SIZE, поэтому число подключений к PostgreSQL не растет
+с числом ботов и потоков. Методы Database по-прежнему вызывают conn.close():
+подключение пула при этом не закрывается, а после rollback возвращается
+в пул. Подключение, простоявшее без дела дольше check_after, перед выдачей
+проверяется SELECT 1; разорванные подключения выбрасываются.
+"""
+import threading
+import time
+
+import db_module.config as config
+from logger_system import logger
+
+
+class PoolTimeout(Exception):
+    """Все подключения пула заняты дольше timeout."""
+
+
+class PooledConnection:
+    """Подключение psycopg2 из пула; close() возвращает его в пул."""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool._release(conn)
+
+    def __del__(self):
+        # Подключение, брошенное из-за исключения до close(), тоже возвращается в пул
+        if self.__dict__.get('_conn') is not None:
+            self.close()
+
+
+class ConnectionPool:
+    def __init__(self, maxsize, timeout, check_after):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.check_after = check_after
+        self._slots = threading.BoundedSemaphore(maxsize)
+        self._idle = []  # (подключение, время возврата в пул)
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+
+    def acquire(self, connect):
+        """
+        Выдает подключение из пула; если свободных нет, а лимит не исчерпан - создает его через connect().
+        Бросает PoolTimeout, если все подключения заняты дольше timeout.
+        """
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeout(f'no free PostgreSQL connection in {self.timeout}s (pool size {self.maxsize})')
+        try:
+            while True:
+                with self._lock:
+                    conn, returned_at = self._idle.pop() if self._idle else (None, None)
+                if conn is None:
+                    conn = connect()
+                    self.created += 1
+                    break
+                if not conn.closed and (time.monotonic() - returned_at < self.check_after or self._is_alive(conn)):
+                    self.reused += 1
+                    break
+                self._discard(conn)
+        except BaseException:
+            self._slots.release()
+            raise
+        return PooledConnection(self, conn)
+
+    def _is_alive(self, conn):
+        from psycopg2.extensions import cursor as plain_cursor
+        try:
+            # Обычный курсор: разорванное свободное подключение - не неудача размыкателя
+            cursor = conn.cursor(cursor_factory=plain_cursor)
+            cursor.execute("SELECT 1;")
+            cursor.close()
+            conn.rollback()
+            return True
+        except Exception as e:
+            logger.info(f'Dropping stale PostgreSQL connection: {e}')
+            return False
+
+    def _release(self, conn):
+        try:
+            if conn.closed:
+                self._discard(conn)
+                return
+            # Незавершенная транзакция (метод упал до commit) не должна достаться следующему
+            conn.rollback()
+            with self._lock:
+                self._idle.append((conn, time.monotonic()))
+        except Exception:
+            self._discard(conn)
+        finally:
+            self._slots.release()
+
+    def _discard(self, conn):
+        self.discarded += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def clear(self):
+        """Закрывает свободные подключения (например, после недоступности PostgreSQL)."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def stats(self):
+        return {'size': self.maxsize, 'idle': len(self._idle), 'created': self.created,
+                'reused': self.reused, 'discarded': self.discarded}
+
+
+# Общий для процесса, как и postgres_breaker; None - пул выключен (DB_POOL_SIZE=0)
+postgres_pool = ConnectionPool(config.POOL_SIZE, config.POOL_TIMEOUT, config.POOL_CHECK_AFTER) \
+    if config.POOL_SIZE > 0 else None
@@ -0,0 +1,71 @@
+"""
+Перенос регистраций, сохраненных в локальную очередь (SQLite) во время
+недоступности PostgreSQL, обратно в PostgreSQL.
+
+Очередь проверяется локально; к PostgreSQL обращение идет, только если
+в ней есть записи и размыкатель разрешает попытку. Регистрации переносятся
+пачками одним запросом (Database.add_users_bulk); если пачка не прошла
+из-за конфликта данных, она переносится по одной через add_user.
+"""
+import threading
+
+import db_module.config as config
+from db_module.breaker import postgres_breaker
+from logger_system import logger
+
+
+class RegistrationReplayer:
+    def __init__(self, db, interval=config.SPOOL_REPLAY_INTERVAL, batch_size=config.SPOOL_REPLAY_BATCH_SIZE):
+        self.db = db
+        self.interval = interval
+        self.batch_size = batch_size
+        self.replayed = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name='RegistrationReplayer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while True:
+            try:
+                self.replay()
+            except Exception as e:
+                logger.error(f'Registration replay failed: {e}')
+            if self._stop.wait(self.interval):
+                return
+
+    def replay(self):
+        """Переносит очередь в PostgreSQL. Возвращает количество перенесенных регистраций."""
+        replayed = 0
+        while not self._stop.is_set():
+            registrations = self.db.get_spooled_registrations(self.batch_size)
+            if not registrations:
+                break
+            if not postgres_breaker.is_closed and not self.db.ping():
+                # PostgreSQL еще недоступен (или размыкатель отклонил пробную попытку)
+                break
+
+            if self.db.add_users_bulk(registrations):
+                stored = [registration[0] for registration in registrations]
+            elif not postgres_breaker.is_closed:
+                break
+            else:
+                # Ошибка данных в пачке - переносим по одной; не перенесенные остаются в очереди
+                stored = [
+                    telegram_id for telegram_id, username, first_name, _, storefront in registrations
+                    if self.db.add_user(telegram_id, username, first_name, storefront)
+                ]
+            self.db.delete_spooled_registrations(stored)
+            replayed += len(stored)
+            if len(stored) < len(registrations) or len(registrations) < self.batch_size:
+                break
+
+        if replayed:
+            self.replayed += replayed
+            logger.info(f'Spooled registrations replayed to PostgreSQL: {replayed}')
+        return replayed
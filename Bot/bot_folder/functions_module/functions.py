@@ -71,6 +71,19 @@ def escape_text_html(text: str) -> str:
     return html.escape(text)
 
 
+def format_money(amount) -> str:
+    """
+    Format money amount with two decimals and spaces between thousands: 1234.5 -> "1 234.50".
+
+    :param amount:
+    :type :obj:int, float or Decimal
+
+    :return: Formatted amount
+    :rtype: :obj:str
+    """
+    return '{:,.2f}'.format(float(amount)).replace(',', ' ')
+
+
 def is_num(x):
     try:
         x = float(x)
@@ -0,0 +1,20 @@
+import os
+
+# Следить за polling и обработчиками и перезапускать их при зависании
+WATCHDOG_ENABLED = os.environ.get('WATCHDOG_ENABLED', '1') == '1'
+# Как часто проверять (в секундах)
+CHECK_INTERVAL = float(os.environ.get('WATCHDOG_CHECK_INTERVAL', '10'))
+# Через сколько секунд без ответа getUpdates polling считается зависшим
+# (long polling возвращает пустой ответ каждые 20 секунд)
+POLL_STALL_TIMEOUT = float(os.environ.get('WATCHDOG_POLL_STALL_TIMEOUT', '90'))
+# Через сколько секунд без запуска обработчика при непустой очереди обработчики считаются зависшими
+DISPATCH_STALL_TIMEOUT = float(os.environ.get('WATCHDOG_DISPATCH_STALL_TIMEOUT', '120'))
+# Сколько ждать остановки зависшего polling перед перезапуском процесса (в секундах)
+POLL_RESTART_TIMEOUT = float(os.environ.get('WATCHDOG_POLL_RESTART_TIMEOUT', '60'))
+
+# HTTP endpoint /health (0 - выключен)
+HTTP_PORT = int(os.environ.get('HEALTH_PORT', '0'))
+HTTP_HOST = os.environ.get('HEALTH_HOST', '127.0.0.1')
+
+# Границы корзин гистограммы задержки апдейтов (в секундах)
+LAG_BUCKETS = (0.5, 1, 2, 3, 5, 10, 30, 60, 120, 300, 900, 1800, 3600)
@@ -0,0 +1,63 @@
+"""
+HTTP endpoint состояния процесса бота для мониторинга.
+
+GET /health отдает JSON: по каждому боту - возраст последнего ответа
+getUpdates, очередь обработчиков, последняя задержка апдейта и ее перцентили;
+размыкатель и пул PostgreSQL и сводку всех гистограмм процесса.
+Код ответа 503, если polling или обработчики какого-либо бота зависли.
+"""
+import json
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from logger_system import logger
+
+
+def _finite(value):
+    """Заменяет inf (перцентиль за верхней корзиной гистограммы) на None: в JSON нет Infinity."""
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    return value
+
+
+class HealthServer:
+    def __init__(self, status, host, port):
+        """:param status: функция без аргументов, возвращает (исправен ли процесс, словарь состояния)"""
+        self.status = status
+        self.host = host
+        self.port = port
+        self._server = None
+
+    def start(self):
+        status = self.status
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != '/health':
+                    self.send_error(404)
+                    return
+                healthy, body = status()
+                payload = json.dumps(_finite(body), ensure_ascii=False, default=str).encode('utf-8')
+                self.send_response(200 if healthy else 503)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='HealthServer', daemon=True).start()
+        logger.info(f'Health endpoint: http://{self.host}:{self._server.server_address[1]}/health')
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
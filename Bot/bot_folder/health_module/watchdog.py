@@ -0,0 +1,173 @@
+"""
+Задержка апдейтов и сторож зависшего polling.
+
+UpdateLag бота отмечает каждый ответ getUpdates (в том числе пустой) и запуск
+каждого обработчика. Задержка апдейта - время от message.date (для
+отредактированных сообщений - edit_date) до запуска обработчика; дата в
+Telegram с точностью до секунды. У callback и inline-запросов даты нет,
+для всех апдейтов отдельно пишется время от получения до запуска обработчика.
+
+Watchdog раз в CHECK_INTERVAL проверяет ботов процесса. Polling считается
+зависшим, если getUpdates не отвечал дольше POLL_STALL_TIMEOUT, обработчики -
+если очередь telebot не пуста, а ни один обработчик не запускался дольше
+DISPATCH_STALL_TIMEOUT. При зависании стеки всех потоков пишутся в лог.
+Зависший polling перезапускается; если он не ожил за POLL_RESTART_TIMEOUT,
+как и при зависших обработчиках, перезапускается процесс (через супервизор
+restart_module, без него - выходом с ненулевым кодом).
+"""
+import sys
+import threading
+import time
+import traceback
+
+import health_module.config as config
+from logger_system import logger
+from metrics_module.metrics import registry
+
+POLLING = 'polling'
+DISPATCHER = 'dispatcher'
+
+
+class UpdateLag:
+    def __init__(self, name):
+        self.lag = registry.histogram('update.lag', buckets=config.LAG_BUCKETS, bot=name)
+        self.queue_lag = registry.histogram('update.queue_lag', buckets=config.LAG_BUCKETS, bot=name)
+        self.last_lag = None
+        # Время по time.monotonic(); polling_started_at None - бот сейчас не опрашивает Telegram
+        self.polling_started_at = None
+        self.last_poll_at = None
+        self.last_dispatch_at = None
+
+    def polling_started(self):
+        now = time.monotonic()
+        self.polling_started_at = now
+        self.last_poll_at = now
+
+    def polling_stopped(self):
+        self.polling_started_at = None
+
+    def polled(self):
+        """Вызывается после каждого ответа getUpdates."""
+        self.last_poll_at = time.monotonic()
+
+    def dispatched(self, obj):
+        """Вызывается при запуске обработчика объекта апдейта obj (Message, CallbackQuery...)."""
+        self.last_dispatch_at = time.monotonic()
+        now = time.time()
+        received_at = getattr(obj, 'received_at', None)
+        if received_at:
+            self.queue_lag.observe(max(now - received_at, 0.0))
+        date = getattr(obj, 'edit_date', None) or getattr(obj, 'date', None)
+        if isinstance(date, int):
+            lag = max(now - date, 0.0)
+            self.lag.observe(lag)
+            self.last_lag = lag
+
+    def poll_age(self, now):
+        """Сколько секунд нет ответа getUpdates; None, если бот не опрашивает Telegram."""
+        if self.polling_started_at is None:
+            return None
+        return now - self.last_poll_at
+
+    def dispatch_idle(self, now):
+        """Сколько секунд не запускался ни один обработчик (с начала polling)."""
+        if self.polling_started_at is None:
+            return 0.0
+        return now - max(self.last_dispatch_at or 0.0, self.polling_started_at)
+
+    def stats(self):
+        return {'last_lag': self.last_lag, 'lag': self.lag.summary(), 'queue_lag': self.queue_lag.summary()}
+
+
+def dump_stacks(reason):
+    """Пишет в лог стеки всех потоков процесса."""
+    frames = sys._current_frames()
+    lines = [f'Thread stacks ({reason}):']
+    for thread in threading.enumerate():
+        frame = frames.get(thread.ident)
+        if frame is None:
+            continue
+        lines.append(f'--- {thread.name} (daemon={thread.daemon})')
+        lines.extend(line.rstrip('\n') for line in traceback.format_stack(frame))
+    logger.error('\n'.join(lines))
+
+
+class Watchdog:
+    def __init__(self, bots, on_restart, interval=config.CHECK_INTERVAL, poll_timeout=config.POLL_STALL_TIMEOUT,
+                 dispatch_timeout=config.DISPATCH_STALL_TIMEOUT, restart_timeout=config.POLL_RESTART_TIMEOUT):
+        """
+        :param bots: словарь {имя витрины: Bot} (SharedResources.bots)
+        :param on_restart: вызывается с причиной, когда нужен перезапуск процесса
+        """
+        self.bots = bots
+        self.on_restart = on_restart
+        self.interval = interval
+        self.poll_timeout = poll_timeout
+        self.dispatch_timeout = dispatch_timeout
+        self.restart_timeout = restart_timeout
+        self.polling_restarts = 0
+        self.restart_requested = False
+        self._restarting = {}  # имя витрины -> когда перезапущен ее polling
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name='Watchdog', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def status(self, bot, now=None):
+        """Состояние polling и обработчиков бота; 'stall' - что зависло (None - все в порядке)."""
+        now = now or time.monotonic()
+        poll_age = bot.health.poll_age(now)
+        queued = bot.bot.worker_pool.tasks.qsize() if bot.bot.threaded else 0
+        dispatch_idle = bot.health.dispatch_idle(now)
+        stall = None
+        if poll_age is not None and poll_age > self.poll_timeout:
+            stall = POLLING
+        elif queued and dispatch_idle > self.dispatch_timeout:
+            stall = DISPATCHER
+        return {'polling': poll_age is not None, 'poll_age': poll_age, 'queued': queued,
+                'dispatch_idle': dispatch_idle, 'stall': stall}
+
+    def check(self):
+        now = time.monotonic()
+        for bot in list(self.bots.values()):
+            status = self.status(bot, now)
+            stall = status['stall']
+            if stall is None:
+                self._restarting.pop(bot.name, None)
+                continue
+            if self.restart_requested:
+                continue
+
+            if stall == POLLING:
+                reason = f'{bot.name}: no getUpdates response for {status["poll_age"]:.0f}s'
+                restarted_at = self._restarting.get(bot.name)
+                if restarted_at is None:
+                    dump_stacks(reason)
+                    logger.error(f'Polling stalled ({reason}), restarting polling')
+                    self._restarting[bot.name] = now
+                    self.polling_restarts += 1
+                    bot.restart_polling()
+                    continue
+                if now - restarted_at < self.restart_timeout:
+                    continue
+                reason += f', polling restart did not help in {now - restarted_at:.0f}s'
+            else:
+                reason = (f'{bot.name}: {status["queued"]} updates queued, '
+                          f'no handler started for {status["dispatch_idle"]:.0f}s')
+                dump_stacks(reason)
+
+            logger.error(f'Bot stalled ({reason}), restarting process')
+            self.restart_requested = True
+            self.on_restart(reason)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception:
+                logger.exception('Watchdog check failed')
@@ -0,0 +1,8 @@
+import os
+
+# JSON-файл с витринами, которые обслуживает один процесс бота. Формат:
+# [{"name": "main", "token": "...", "admin_ids": [123], "global_rate": 30, "broadcast_rate": 25, "workers": 8}, ...]
+# global_rate, broadcast_rate и workers необязательны (по умолчанию - из sender_module.config).
+# Первая витрина - основная: через ее бота отправляются уведомления о покупках и пополнениях.
+# Без файла процесс обслуживает одну витрину 'main' с ACCESS_TOKEN и ADMIN_IDS.
+STOREFRONTS_FILE = os.environ.get('STOREFRONTS_FILE', '')
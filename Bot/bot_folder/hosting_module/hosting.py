@@ -0,0 +1,255 @@
+"""
+Несколько ботов-витрин в одном процессе.
+
+Витрины отличаются токеном, списком админов и лимитами отправки, а код,
+обработчики и база данных у них общие. SharedResources создается один раз
+на процесс и держит все, что не зависит от бота: подключения к базе (общий
+пул db_module.pool), HTTP-транспорт к Telegram API, планировщик и очередь
+рассылок, уведомления, кэш аккаунтов, индекс каталога, метрики и сторож
+зависаний (health_module). У каждого
+Bot свои TeleBot, обработчики, сессии /mail, лимиты апдейтов и OutboundSender
+(лимит Telegram действует на бота).
+"""
+import json
+import os
+import signal
+import threading
+import time
+
+import account_module.config as account_config
+import activity_module.config as activity_config
+import catalog_module.config as catalog_config
+import config_module.config as bot_config
+import health_module.config as health_config
+import hosting_module.config as config
+import mailing_module.config as mailing_config
+import notifications_module.config as notifications_config
+import sender_module.config as sender_config
+import transport_module.config as transport_config
+from account_module.account import AccountService
+from activity_module.tracker import ActivityTracker
+from catalog_module.catalog import CatalogRefresher
+from catalog_module.index import CatalogIndex
+from db_module.breaker import postgres_breaker
+from db_module.db import Database
+from db_module.pool import postgres_pool
+from db_module.spool import RegistrationReplayer
+from health_module.server import HealthServer
+from health_module.watchdog import Watchdog
+from logger_system import logger
+from mailing_module.scheduler import MailingScheduler
+from mailing_module.worker import MailingWorker
+from metrics_module.metrics import registry
+from notifications_module.listener import NotificationListener
+from stats_module.rollups import RollupJob
+from transport_module.transport import Transport
+
+MAIN_STOREFRONT = 'main'
+
+
+class Storefront:
+    def __init__(self, name, token, admin_ids=(), global_rate=sender_config.GLOBAL_RATE,
+                 broadcast_rate=sender_config.BROADCAST_RATE, workers=sender_config.WORKERS):
+        self.name = name
+        self.token = token
+        self.admin_ids = [int(admin_id) for admin_id in admin_ids]
+        self.global_rate = float(global_rate)
+        self.broadcast_rate = float(broadcast_rate)
+        self.workers = int(workers)
+
+
+def load_storefronts(path=config.STOREFRONTS_FILE):
+    """Витрины из JSON-файла path; без файла - одна витрина из ACCESS_TOKEN и ADMIN_IDS."""
+    if not path:
+        if not bot_config.ACCESS_TOKEN:
+            raise BaseException('ACCESS_TOKEN is not set (.env file not found?)')
+        return [Storefront(MAIN_STOREFRONT, bot_config.ACCESS_TOKEN, bot_config.ADMIN_IDS)]
+
+    with open(path, encoding='utf-8') as file:
+        storefronts = [Storefront(**entry) for entry in json.load(file)]
+    if not storefronts:
+        raise BaseException(f'No storefronts in {path}')
+    names = [storefront.name for storefront in storefronts]
+    if len(set(names)) != len(names) or len({storefront.token for storefront in storefronts}) != len(names):
+        raise BaseException(f'Storefront names and tokens in {path} must be unique')
+    return storefronts
+
+
+class SharedResources:
+    def __init__(self, storefronts):
+        self.storefronts = storefronts
+        self.bots = {}  # имя витрины -> Bot
+        self.db = Database()
+        self.metrics = registry
+        # Один пул keep-alive соединений на все боты: по потоку отправки каждого бота + long polling каждого бота
+        self.transport = Transport(transport_config.POOL_SIZE or
+                                   sum(storefront.workers + 1 for storefront in storefronts))
+        self.transport.install()
+        # Один поток расписания на все витрины; рассылку выполняет бот витрины из payload
+        self.scheduler = MailingScheduler(self.db, self._execute_scheduled_mailing)
+        # Пополняет ежедневные агрегаты для /stats <период>
+        self.rollup_job = RollupJob(self.db)
+        # Регистрации, сохраненные локально во время недоступности PostgreSQL, переносятся в него в фоне
+        self.registration_replayer = RegistrationReplayer(self.db)
+        # Индекс каталога для inline-поиска; снимок хранится в SQLite и обновляется в фоне
+        self.catalog_index = CatalogIndex()
+        self.catalog_refresher = CatalogRefresher(self.db, self.catalog_index) if catalog_config.ENABLED else None
+        # Кэш /balance и /orders; записи сбрасываются по NOTIFY
+        self.accounts = AccountService(self.db)
+        # Последнее обращение и счетчики пользователей копятся в памяти и записываются пачками
+        self.activity = ActivityTracker(self.db) if activity_config.ENABLED else None
+        # Следит за polling и обработчиками всех ботов процесса
+        self.watchdog = Watchdog(self.bots, self._restart_process)
+        self.health_server = HealthServer(self.health, health_config.HTTP_HOST, health_config.HTTP_PORT) \
+            if health_config.HTTP_PORT else None
+        self.supervisor = None  # restart_module.handoff.Handoff, если процесс запущен супервизором
+        self.exit_code = 0
+        self._exit_timer = None  # Принудительный выход, если зависший polling не дает начать остановку
+        self.notification_listener = None
+        self.mailing_worker = None
+        self._started_at = time.monotonic()
+        self._started = False
+        self._start_lock = threading.Lock()
+
+    @property
+    def primary(self):
+        """Бот основной витрины (первой в списке)."""
+        return self.bots[self.storefronts[0].name]
+
+    def add(self, bot):
+        self.bots[bot.name] = bot
+
+    def resolve_name(self, payload):
+        """Имя витрины, от имени которой создана рассылка (рассылки без витрины - основной)."""
+        return (payload or {}).get('bot') or self.storefronts[0].name
+
+    def resolve(self, payload):
+        """Бот витрины, от имени которой создана рассылка."""
+        name = self.resolve_name(payload)
+        bot = self.bots.get(name)
+        if bot is None:
+            raise LookupError(f'Storefront {name!r} is not hosted by this process')
+        return bot
+
+    def start(self, boot):
+        """Запускает общие фоновые задачи. Вызывается фоновой настройкой каждого бота, выполняется один раз."""
+        with self._start_lock:
+            if self._started:
+                return
+            self._started = True
+
+        with boot.phase('db_warmup'):
+            self.db.ping()
+
+        with boot.phase('scheduler'):
+            self.scheduler.start()
+
+        self.rollup_job.start()
+        self.registration_replayer.start()
+        if self.activity:
+            self.activity.start()
+
+        # Воркер очереди рассылок внутри процесса бота (дополнительно к отдельным воркерам)
+        if mailing_config.QUEUE_ENABLED and mailing_config.EMBEDDED_WORKER:
+            self.mailing_worker = MailingWorker(self.primary.bot, self.db, self.primary.sender,
+                                                resolve=self._resolve_sender)
+            self.mailing_worker.start()
+
+        # Уведомления пользователей о покупках и пополнениях и сброс кэша (LISTEN/NOTIFY);
+        # уведомление отправляет бот витрины, которую пользователь запускал последним
+        self.notification_listener = NotificationListener(
+            self.primary.bot, self.db, self.primary.sender, send_notifications=notifications_config.ENABLED,
+            resolve=self._resolve_notification
+        )
+        self.notification_listener.subscribe(account_config.CHANNEL, self.accounts.on_notify)
+        self.notification_listener.start()
+
+        if self.catalog_refresher:
+            self.catalog_refresher.start()
+
+        if health_config.WATCHDOG_ENABLED:
+            self.watchdog.start()
+        if self.health_server:
+            self.health_server.start()
+
+    def stop(self, timeout=30):
+        """Останавливает общие фоновые задачи; вызывается до drain() ботов, пока их отправка еще работает."""
+        if self._exit_timer:
+            # Polling остановился, штатная остановка ограничена своими таймаутами - не обрываем ее
+            self._exit_timer.cancel()
+        self.watchdog.stop()
+        if self.health_server:
+            self.health_server.stop()
+        # Запланированные рассылки сохраняют позицию и продолжатся в следующем процессе
+        self.scheduler.stop(timeout)
+        self.rollup_job.stop()
+        self.registration_replayer.stop()
+        if self.mailing_worker:
+            # Недоотправленная часть рассылки из очереди вернется в очередь
+            self.mailing_worker.stop(timeout)
+        if self.catalog_refresher:
+            self.catalog_refresher.stop()
+        if self.notification_listener:
+            # Неотправленные уведомления остаются в outbox и будут отправлены следующим процессом
+            self.notification_listener.stop(timeout)
+        if self.activity:
+            # Накопленная активность записывается перед выходом
+            self.activity.stop(timeout)
+
+    def report(self):
+        """Пишет в лог сводку общих ресурсов (после drain() ботов)."""
+        logger.info(f'Account cache: {self.accounts.stats()}')
+        if self.activity:
+            logger.info(f'User activity: {self.activity.stats()}')
+        logger.info(f'PostgreSQL breaker: {postgres_breaker.stats()}, replayed registrations: '
+                    f'{self.registration_replayer.replayed}')
+        if postgres_pool is not None:
+            logger.info(f'PostgreSQL pool: {postgres_pool.stats()}')
+        logger.info(f'Telegram API call timings: {self.transport.stats()}')
+
+    def health(self):
+        """(исправен ли процесс, состояние для /health)."""
+        now = time.monotonic()
+        bots = {}
+        for name, bot in list(self.bots.items()):
+            bots[name] = self.watchdog.status(bot, now)
+            bots[name].update(bot.health.stats())
+        healthy = not self.watchdog.restart_requested and all(status['stall'] is None for status in bots.values())
+        return healthy, {
+            'status': 'ok' if healthy else 'stalled',
+            'uptime': now - self._started_at,
+            'bots': bots,
+            'polling_restarts': self.watchdog.polling_restarts,
+            'postgres': {
+                'breaker': postgres_breaker.stats(),
+                'pool': postgres_pool.stats() if postgres_pool is not None else None,
+            },
+            'metrics': self.metrics.snapshot(),
+        }
+
+    def _restart_process(self, reason):
+        """Перезапуск процесса по решению сторожа."""
+        if self.supervisor:
+            # Супервизор поднимет новый процесс и заберет у этого polling, как при изменении кода
+            self.supervisor.request_restart(reason)
+            return
+        # Без супервизора процесс завершается с ненулевым кодом, перезапускает его менеджер сервисов;
+        # если зависший polling не остановился за POLL_RESTART_TIMEOUT, выход принудительный
+        # (с началом штатной остановки таймер отменяется, см. stop)
+        self.exit_code = 1
+        os.kill(os.getpid(), signal.SIGTERM)
+        self._exit_timer = threading.Timer(health_config.POLL_RESTART_TIMEOUT, os._exit, (1,))
+        self._exit_timer.daemon = True
+        self._exit_timer.start()
+
+    def _resolve_sender(self, payload):
+        bot = self.resolve(payload)
+        return bot.bot, bot.sender
+
+    def _resolve_notification(self, notification):
+        # Пользователи без витрины и витрины, которых нет в процессе, - у основной
+        bot = self.bots.get(notification.get('storefront')) or self.primary
+        return bot.bot, bot.sender
+
+    def _execute_scheduled_mailing(self, schedule, on_progress, should_stop):
+        return self.resolve(schedule['payload'])._execute_scheduled_mailing(schedule, on_progress, should_stop)
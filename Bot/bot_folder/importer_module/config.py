@@ -0,0 +1,8 @@
+import os
+
+# Наибольший размер файла /import (Bot API отдает ботам файлы до 20 МБ); CLI не ограничен
+MAX_FILE_SIZE = int(os.environ.get('IMPORT_MAX_FILE_SIZE', str(20 * 1024 * 1024)))
+# Как часто сообщать о ходе импорта (в секундах)
+PROGRESS_INTERVAL = float(os.environ.get('IMPORT_PROGRESS_INTERVAL', '3'))
+# Сколько символов CSV готовить за одно чтение COPY
+READ_CHUNK_SIZE = 64 * 1024
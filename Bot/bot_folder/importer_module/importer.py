@@ -0,0 +1,221 @@
+"""
+Массовый импорт пользователей (chat id) из CSV или JSON.
+
+Файл разбирается потоком: строки проверяются и сразу пишутся в COPY временной
+таблицы (Database.import_users), без промежуточного списка в памяти и без
+запросов на каждую строку; затем временная таблица сливается с users
+несколькими запросами над всем набором.
+
+Форматы:
+- CSV (разделитель , ; или табуляция): telegram_id[,username[,first_name]];
+  заголовок необязателен, колонки по заголовку: telegram_id/chat_id/user_id/id, username, first_name/name;
+- JSON: массив чисел или объектов {"telegram_id": ..., "username": ..., "first_name": ...};
+- JSON Lines (.jsonl): по числу или объекту на строке.
+
+Запуск из командной строки: python importer_module/importer.py users.csv
+"""
+import csv
+import io
+import itertools
+import json
+import os
+import sys
+import time
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import importer_module.config as config
+from logger_system import logger
+
+ID_COLUMNS = ('telegram_id', 'chat_id', 'user_id', 'id')
+USERNAME_COLUMNS = ('username',)
+FIRST_NAME_COLUMNS = ('first_name', 'name')
+
+STAGE_TITLES = {
+    'copy': 'загрузка',
+    'dedupe': 'удаление повторов',
+    'update': 'обновление существующих',
+    'insert': 'добавление новых',
+    'commit': 'сохранение',
+}
+
+
+def _parse_id(value):
+    try:
+        telegram_id = int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+    # Импортируются только пользователи: у групп и каналов chat id отрицательный
+    return telegram_id if 0 < telegram_id < 2 ** 63 else None
+
+
+def _text(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _column(header, names):
+    return next((header.index(name) for name in names if name in header), None)
+
+
+def _csv_rows(text):
+    first_line = text.readline()
+    delimiter = max(',;\t', key=first_line.count)
+    first = next(csv.reader([first_line], delimiter=delimiter), [])
+    rows = csv.reader(text, delimiter=delimiter)
+
+    header = [cell.strip().lower() for cell in first]
+    if first and _parse_id(first[0]) is None and _column(header, ID_COLUMNS) is not None:
+        columns = (_column(header, ID_COLUMNS), _column(header, USERNAME_COLUMNS), _column(header, FIRST_NAME_COLUMNS))
+    else:
+        columns = (0, 1, 2)
+        rows = itertools.chain([first], rows)
+
+    for row in rows:
+        yield [row[index] if index is not None and index < len(row) else None for index in columns]
+
+
+def _json_item(item):
+    if isinstance(item, dict):
+        return [
+            next((item[name] for name in names if item.get(name) is not None), None)
+            for names in (ID_COLUMNS, USERNAME_COLUMNS, FIRST_NAME_COLUMNS)
+        ]
+    return [item, None, None]
+
+
+def _json_rows(text):
+    head = text.read(1)
+    while head.isspace():
+        head = text.read(1)
+    if head == '[':
+        # Массив JSON разбирается целиком (файлы /import - до 20 МБ)
+        for item in json.loads(head + text.read()):
+            yield _json_item(item)
+        return
+
+    # JSON Lines
+    for line in itertools.chain([head + text.readline()], text):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield _json_item(json.loads(line))
+        except ValueError:
+            yield [None, None, None]
+
+
+def iter_rows(file, name=''):
+    """
+    Строки [telegram_id, username, first_name] (сырые значения) из двоичного файла file.
+    Формат определяется по расширению name (.json, .jsonl, .ndjson), иначе - CSV.
+    """
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', errors='replace', newline='')
+    if name.lower().endswith(('.json', '.jsonl', '.ndjson')):
+        return _json_rows(text)
+    return _csv_rows(text)
+
+
+class CopySource:
+    """
+    Файловый объект для COPY ... FROM STDIN: по запросу psycopg2 разбирает следующие строки
+    файла и отдает их в CSV. Неверные строки пропускаются и учитываются в invalid.
+    """
+
+    def __init__(self, rows, on_progress=None, interval=config.PROGRESS_INTERVAL):
+        self.rows = rows
+        self.on_progress = on_progress
+        self.interval = interval
+        self.parsed = 0
+        self.invalid = 0
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer, lineterminator='\n')
+        self._reported_at = time.monotonic()
+
+    def read(self, size=-1):
+        size = size if size and size > 0 else config.READ_CHUNK_SIZE
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        for telegram_id, username, first_name in self.rows:
+            telegram_id = _parse_id(telegram_id)
+            if telegram_id is None:
+                self.invalid += 1
+                continue
+            self._writer.writerow((telegram_id, _text(username), _text(first_name)))
+            self.parsed += 1
+            if self._buffer.tell() >= size:
+                break
+        self._report()
+        return self._buffer.getvalue()
+
+    def _report(self):
+        now = time.monotonic()
+        if self.on_progress and now - self._reported_at >= self.interval:
+            self._reported_at = now
+            self.on_progress('copy', self.parsed)
+
+
+def run_import(db, file, name='', on_progress=None):
+    """
+    Импортирует пользователей из двоичного файла file.
+    on_progress(этап, прочитано строк) вызывается не чаще PROGRESS_INTERVAL во время загрузки и на каждом этапе слияния.
+    Возвращает статистику Database.import_users с полями invalid и elapsed или None при ошибке.
+    """
+    started_at = time.monotonic()
+    source = CopySource(iter_rows(file, name), on_progress)
+
+    def on_stage(stage):
+        if on_progress:
+            on_progress(stage, source.parsed)
+
+    result = db.import_users(source, on_stage=on_stage)
+    if result is None:
+        return None
+    result['invalid'] = source.invalid
+    result['elapsed'] = time.monotonic() - started_at
+    return result
+
+
+def progress_text(stage, parsed):
+    return f'⏳ Импорт: {STAGE_TITLES.get(stage, stage)}, прочитано строк: {parsed}'
+
+
+def result_text(result):
+    rate = result['rows'] / result['elapsed'] * 60 if result['elapsed'] else 0
+    rate = '{:,.0f}'.format(rate).replace(',', ' ')
+    return (
+        f'✅ Импорт завершен за {result["elapsed"]:.1f} с (~{rate} строк/мин)\n\n'
+        f'Строк в файле: {result["rows"] + result["invalid"]}\n'
+        f'Неверных: {result["invalid"]}\n'
+        f'Уникальных chat id: {result["unique"]}\n'
+        f'Добавлено: {result["inserted"]}\n'
+        f'Обновлено: {result["updated"]}\n'
+        f'Не добавлено: {result["skipped"]}'
+    )
+
+
+def main():
+    import logger_system
+    from db_module.db import Database
+
+    if len(sys.argv) != 2:
+        print('Usage: python importer_module/importer.py <users.csv|users.json>')
+        sys.exit(2)
+
+    path = sys.argv[1]
+    with open(path, 'rb') as file:
+        result = run_import(Database(), file, path, on_progress=lambda stage, parsed: logger.info(
+            progress_text(stage, parsed)))
+    if result is None:
+        logger.error(f'Import of {path} failed')
+    else:
+        logger.info(result_text(result))
+    logger_system.shutdown()
+    sys.exit(0 if result is not None else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,185 @@
-import logging, sys
+import atexit
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import queue
+import random
+import sys
+import time
+import traceback
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+import logger_system.config as config
+from tracing_module import tracing
+
+# Поля, которые привязываются к каждой записи в рамках обработки апдейта
+CONTEXT_FIELDS = ('update_id', 'chat_id', 'handler')
+
+_log_context = contextvars.ContextVar('log_context', default={})
+
+
+class ContextFilter(logging.Filter):
+    """Добавляет к записи update_id, chat_id и handler текущего апдейта."""
+
+    def filter(self, record):
+        context = _log_context.get()
+        for field in CONTEXT_FIELDS:
+            if not hasattr(record, field):
+                setattr(record, field, context.get(field))
+        return True
+
+
+class DebugSampler(logging.Filter):
+    """
+    Пропускает только долю частых DEBUG-записей (сообщения, начинающиеся с prefixes);
+    остальные DEBUG-записи, INFO и выше проходят всегда.
+    """
+
+    def __init__(self, rate, prefixes):
+        super().__init__()
+        self.rate = rate
+        self.prefixes = tuple(prefixes)
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.rate >= 1.0:
+            return True
+        if not (isinstance(record.msg, str) and record.msg.startswith(self.prefixes)):
+            return True
+        return random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """Форматирует запись в одну строку JSON."""
+
+    def format(self, record):
+        data = {
+            'ts': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                data[field] = value
+        if record.exc_text:
+            data['exc'] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Ставит записи в очередь, не блокируя вызывающий поток.
+    Если очередь заполнена, запись отбрасывается и учитывается в dropped.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Форматируем сообщение и трейсбек здесь, чтобы не тащить args в другой поток
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = ''.join(traceback.format_exception(*record.exc_info)).rstrip()
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_queue = queue.Queue(maxsize=config.QUEUE_MAXSIZE)
+
+_stream_handler = logging.StreamHandler(sys.stdout)
+_stream_handler.setFormatter(JsonFormatter())
+
+queue_handler = NonBlockingQueueHandler(_queue)
+queue_handler.addFilter(ContextFilter())
+queue_handler.addFilter(DebugSampler(config.DEBUG_SAMPLE_RATE, config.DEBUG_SAMPLED_PREFIXES))
+
+listener = QueueListener(_queue, _stream_handler, respect_handler_level=True)
 
 # Logging settings
-logging.basicConfig(
-    format='%(asctime)s - %(levelname)s - %(name)s - %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S',
-    handlers=[
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+logging.basicConfig(handlers=[queue_handler])
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
+logger.setLevel(config.LOG_LEVEL)
+
+listener.start()
+
+
+def shutdown():
+    """Останавливает listener, дописывая все записи из очереди."""
+    if listener._thread is not None:
+        listener.stop()
+    try:
+        _stream_handler.flush()
+    except (OSError, ValueError):
+        # stdout уже закрыт (например, перехват вывода тестов завершился раньше atexit)
+        pass
+
+
+atexit.register(shutdown)
+
+
+@contextmanager
+def log_context(**fields):
+    """Привязывает поля (update_id, chat_id, handler) ко всем записям внутри блока."""
+    token = _log_context.set({**_log_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+
+@contextmanager
+def _handler_context(obj, name):
+    message = getattr(obj, 'message', None) or obj
+    chat = getattr(message, 'chat', None)
+    update_id = getattr(obj, 'update_id', None)
+    user = getattr(obj, 'from_user', None)
+    chat_id = chat.id if chat else (user.id if user else None)
+    received_at = getattr(obj, 'received_at', None)
+    with log_context(update_id=update_id, chat_id=chat_id, handler=name), \
+            tracing.trace('update', start_time=received_at, update_id=update_id, chat_id=chat_id, handler=name):
+        if received_at:
+            # Время ожидания свободного потока обработчиков telebot
+            tracing.record_span('dispatch.wait', received_at, time.time())
+        try:
+            with tracing.span(f'handler.{name}'):
+                yield
+        except Exception:
+            logger.exception('Unhandled error in handler')
+            raise
+
+
+def logged_handler(func):
+    """
+    Декоратор для обработчиков telebot: привязывает к логам update_id,
+    chat_id и имя обработчика, и ведет трейс апдейта (tracing_module).
+    Работает с Message, CallbackQuery и InlineQuery (chat_id - id пользователя),
+    в том числе с async-обработчиками AsyncTeleBot (aio_module).
+    """
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(obj, *args, **kwargs):
+            with _handler_context(obj, func.__name__):
+                return await func(obj, *args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(obj, *args, **kwargs):
+        with _handler_context(obj, func.__name__):
+            return func(obj, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,11 @@
+import os
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'DEBUG').upper()
+# Доля DEBUG-записей, которые доходят до вывода (0.0 - 1.0)
+DEBUG_SAMPLE_RATE = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', '0.1'))
+# Начала частых DEBUG-сообщений (по одному на отправку или апдейт), которые сэмплируются; остальные DEBUG пишутся все
+DEBUG_SAMPLED_PREFIXES = tuple(
+    prefix for prefix in os.environ.get('LOG_DEBUG_SAMPLED_PREFIXES', 'Mailing send to |Update ').split('|') if prefix
+)
+# Максимальный размер очереди записей; при переполнении записи отбрасываются
+QUEUE_MAXSIZE = int(os.environ.get('LOG_QUEUE_MAXSIZE', '10000'))
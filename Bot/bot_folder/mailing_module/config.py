@@ -0,0 +1,20 @@
+import os
+
+# Рассылки из админ-панели ставятся в очередь PostgreSQL и выполняются воркерами рассылки
+QUEUE_ENABLED = os.environ.get('MAILING_QUEUE_ENABLED', '0') == '1'
+# Рассылка копирует исходное сообщение админа (copyMessage/copyMessages) вместо повторной отправки по file_id
+COPY_MODE = os.environ.get('MAILING_COPY_MODE', '1') == '1'
+# Через сколько минут без действий админа незавершенная сессия /mail удаляется
+SESSION_TTL_MINUTES = float(os.environ.get('MAILING_SESSION_TTL_MINUTES', '30'))
+# Как часто проверять сессии /mail (в секундах)
+SESSION_SWEEP_INTERVAL = float(os.environ.get('MAILING_SESSION_SWEEP_INTERVAL', '60'))
+# Сколько получателей в одной части рассылки
+CHUNK_SIZE = int(os.environ.get('MAILING_CHUNK_SIZE', '500'))
+# Через сколько минут без обновления часть считается брошенной и забирается другим воркером
+CLAIM_TIMEOUT_MINUTES = int(os.environ.get('MAILING_CLAIM_TIMEOUT_MINUTES', '10'))
+# Процесс бота тоже выполняет части рассылок из очереди
+EMBEDDED_WORKER = os.environ.get('MAILING_EMBEDDED_WORKER', '1') == '1'
+# Как часто воркер проверяет очередь, если она пуста (в секундах)
+WORKER_POLL_INTERVAL = float(os.environ.get('MAILING_WORKER_POLL_INTERVAL', '5'))
+# Каталог чекпоинтов состояния доставки запланированных рассылок (mailing_module/recipients.py)
+STATE_DIR = os.environ.get('MAILING_STATE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'state'))
@@ -0,0 +1,314 @@
+"""
+Доставка рассылки получателям.
+
+Используется и процессом бота (обычные и запланированные рассылки),
+и воркерами очереди рассылок (mailing_module/worker.py).
+"""
+import time
+from collections import deque
+
+import mailing_module.config as config
+import sender_module.config as sender_config
+from logger_system import logger
+from mailing_module.personalize import iter_rendered, render_missing
+from mailing_module.recipients import RecipientLog, SENT, FAILED, BLOCKED, RETRYING
+from mailing_module.segments import compile_segments
+from sender_module.sender import BROADCAST
+
+# Как часто (в отправках и секундах) рассылка сохраняет позицию через on_progress
+PROGRESS_EVERY_SENDS = 100
+PROGRESS_EVERY_SECONDS = 10
+
+
+def build_reply_markup(payload):
+    """Клавиатура с кнопкой поста или None, если кнопка не задана."""
+    if not payload.get('button_text'):
+        return None
+
+    from telebot import types
+    reply_markup = types.InlineKeyboardMarkup()
+    button_type = payload.get('button_type') or 'url'
+    if button_type == 'web_app':
+        reply_markup.add(
+            types.InlineKeyboardButton(
+                text=payload['button_text'],
+                web_app=types.WebAppInfo(url=payload.get('button_url') or 'https://os-gift.store/')
+            )
+        )
+    else:
+        reply_markup.add(
+            types.InlineKeyboardButton(text=payload['button_text'], url=payload['button_url'])
+        )
+    return reply_markup
+
+
+def _build_media_list(media_group, caption=None, parse_mode=None):
+    """Элементы альбома; caption - подпись альбома (по умолчанию - подпись из элементов)."""
+    from telebot.types import InputMediaPhoto, InputMediaVideo, InputMediaDocument
+
+    # Находим caption (обычно он только у последнего элемента)
+    if caption is None:
+        for media_item in media_group:
+            if media_item['caption']:
+                caption = media_item['caption']
+
+    media_list = []
+    for i, media_item in enumerate(media_group):
+        is_last = (i == len(media_group) - 1)
+        media_caption = caption if is_last else None
+
+        media_parse_mode = parse_mode if is_last else None
+
+        if media_item['type'] == 'photo':
+            media_list.append(InputMediaPhoto(media=media_item['file_id'], caption=media_caption,
+                                              parse_mode=media_parse_mode))
+        elif media_item['type'] == 'video':
+            media_list.append(InputMediaVideo(media=media_item['file_id'], caption=media_caption,
+                                              parse_mode=media_parse_mode))
+        elif media_item['type'] == 'document':
+            media_list.append(InputMediaDocument(media=media_item['file_id'], caption=media_caption,
+                                                 parse_mode=media_parse_mode))
+    return media_list
+
+
+def build_copy_send(bot, payload, reply_markup=None):
+    """
+    send(user_id), копирующий исходное сообщение админа (или медиа-группу) одним запросом.
+    Копия сохраняет форматирование (entities) и подходит для любого типа контента.
+    """
+    from_chat_id = payload['source_chat_id']
+    message_ids = payload['source_message_ids']
+
+    if len(message_ids) == 1:
+        def send(user_id):
+            bot.copy_message(chat_id=user_id, from_chat_id=from_chat_id, message_id=message_ids[0],
+                             reply_markup=reply_markup)
+        return send
+
+    def send(user_id):
+        bot.copy_messages(chat_id=user_id, from_chat_id=from_chat_id, message_ids=message_ids)
+        # copyMessages не принимает reply_markup, кнопка к альбому идет отдельным сообщением
+        if reply_markup:
+            bot.send_message(chat_id=user_id, text='👇', reply_markup=reply_markup)
+    return send
+
+
+def mailing_title(payload):
+    """Заголовок статусного сообщения рассылки для админа."""
+    return '📤 Начало рассылки медиа-группы...' if payload['content_type'] == 'media_group' else '📤 Начало рассылки...'
+
+
+def build_send(bot, payload):
+    """
+    Возвращает (send, title): send(user_id) отправляет пост одному получателю,
+    title - заголовок статусного сообщения для админа.
+    Для персонализированного поста - send(user_id, text) с готовым HTML-текстом получателя.
+    """
+    content_type = payload['content_type']
+    content_data = payload['content_data']
+    reply_markup = build_reply_markup(payload)
+    title = mailing_title(payload)
+
+    if content_data and content_data.get('template'):
+        # Копия отправила бы всем один и тот же текст, поэтому пост отправляется заново
+        if content_type == 'text':
+            def send(user_id, text):
+                bot.send_message(chat_id=user_id, text=text, parse_mode='HTML', reply_markup=reply_markup)
+        elif content_type == 'media_group':
+            def send(user_id, text):
+                # Подпись альбома своя у каждого получателя
+                bot.send_media_group(chat_id=user_id, media=_build_media_list(payload['media_group'], text, 'HTML'))
+                if reply_markup:
+                    bot.send_message(chat_id=user_id, text='👇', reply_markup=reply_markup)
+        else:
+            send_media = getattr(bot, f'send_{content_type}')
+
+            def send(user_id, text):
+                send_media(user_id, content_data['file_id'], caption=text, parse_mode='HTML',
+                           reply_markup=reply_markup)
+        return send, title
+
+    if config.COPY_MODE and payload.get('source_message_ids'):
+        return build_copy_send(bot, payload, reply_markup), title
+
+    if content_type == 'text':
+        def send(user_id):
+            bot.send_message(chat_id=user_id, text=content_data['text'], reply_markup=reply_markup)
+    elif content_type == 'photo':
+        def send(user_id):
+            bot.send_photo(chat_id=user_id, photo=content_data['file_id'],
+                           caption=content_data.get('caption'), reply_markup=reply_markup)
+    elif content_type == 'video':
+        def send(user_id):
+            bot.send_video(chat_id=user_id, video=content_data['file_id'],
+                           caption=content_data.get('caption'), reply_markup=reply_markup)
+    elif content_type == 'document':
+        def send(user_id):
+            bot.send_document(chat_id=user_id, document=content_data['file_id'],
+                              caption=content_data.get('caption'), reply_markup=reply_markup)
+    elif content_type == 'media_group':
+        media_list = _build_media_list(payload['media_group'])
+
+        def send(user_id):
+            # Отправляем медиа-группу
+            bot.send_media_group(chat_id=user_id, media=media_list)
+            # Если есть кнопка, отправляем её отдельным сообщением после медиа-группы
+            if reply_markup:
+                bot.send_message(chat_id=user_id, text='👇', reply_markup=reply_markup)
+    else:
+        raise ValueError(f'Unknown mailing content type: {content_type}')
+
+    return send, title
+
+
+def sleep_until(deadline, should_stop=None):
+    """Спит до deadline (time.monotonic). Возвращает False, если should_stop() сработал раньше."""
+    while True:
+        if should_stop and should_stop():
+            return False
+        delay = deadline - time.monotonic()
+        if delay <= 0:
+            return True
+        time.sleep(min(delay, 1.0))
+
+
+def _status_for_error(error):
+    """Код статуса получателя по ошибке отправки."""
+    error_str = str(error).lower()
+    if 'blocked' in error_str or 'chat not found' in error_str:
+        return BLOCKED
+    if 'too many requests' in error_str or 'error code: 429' in error_str:
+        # Лимит Telegram: отправка не выполнена, получатель будет повторен в конце
+        return RETRYING
+    return FAILED
+
+
+def deliver(db, sender, send, segments=None, start_after=0, end_id=None, total=None,
+            window_seconds=0, on_progress=None, should_stop=None, log=None, checkpoint=None, template=None,
+            storefront=None):
+    """
+    Отправляет пост каждому получателю из сегментов с users.id в (start_after, end_id].
+    Получатели читаются из PostgreSQL потоком, отправки выполняет OutboundSender
+    с приоритетом рассылки; одновременно в очереди не больше BROADCAST_WINDOW отправок.
+
+    total - число получателей (нужно для растягивания на window_seconds).
+    on_progress(last_user_id) - вызывается периодически для сохранения позиции.
+    should_stop() - если возвращает True, доставка прерывается.
+    log - RecipientLog с результатами предыдущего запуска (для возобновленной рассылки).
+    checkpoint - путь к файлу, куда вместе с on_progress сохраняется log.
+    template - mailing_module.personalize.Template персонализированного поста:
+    поля получателей читаются вместе с ними, а send получает готовый текст.
+    storefront - витрина, пользователям которой идет рассылка (см. segments.compile_segments).
+    Возвращает словарь successful/failed/blocked/finished/log.
+    """
+    log = log if log is not None else RecipientLog()
+    finished = True
+
+    # Интервал между отправками, чтобы равномерно растянуть рассылку на окно
+    interval = window_seconds / total if window_seconds and total else 0
+    started_at = time.monotonic()
+    progress_at = started_at
+    last_row_id = start_after
+    collected = len(log)
+    job = object()
+    in_flight = deque()
+    retry_args = {}  # Номер получателя -> аргументы send для повтора после 429
+
+    def submit(row_id, index, args):
+        future = sender.submit(send, log.ids[index], *args, priority=BROADCAST, job=job)
+        in_flight.append((row_id, index, args, future))
+        while len(in_flight) >= sender_config.BROADCAST_WINDOW:
+            collect()
+
+    def collect():
+        nonlocal last_row_id, collected
+        row_id, index, args, future = in_flight.popleft()
+        try:
+            future.result()
+            log.mark(index, SENT)
+        except Exception as e:
+            logger.debug(f'Mailing send to {log.ids[index]} failed: {e}')
+            status = _status_for_error(e)
+            log.mark(index, status)
+            if status == RETRYING:
+                retry_args[index] = args
+        if row_id is not None:
+            last_row_id = row_id
+            collected = index + 1
+
+    def save_progress():
+        if on_progress:
+            on_progress(last_row_id)
+        if checkpoint:
+            try:
+                log.save(checkpoint, length=collected)
+            except OSError as e:
+                logger.error(f'Failed to save mailing checkpoint {checkpoint}: {e}')
+
+    rows = db.iter_recipients(compile_segments(segments, storefront), start_after=start_after, end_id=end_id,
+                              columns=template.columns if template else ())
+    for index, (row_id, user_id, args) in enumerate(iter_rendered(rows, template)):
+        if interval and not sleep_until(started_at + index * interval, should_stop):
+            finished = False
+            break
+        if should_stop and should_stop():
+            finished = False
+            break
+
+        submit(row_id, log.add(user_id), args)
+
+        if index % PROGRESS_EVERY_SENDS == 0 or time.monotonic() - progress_at >= PROGRESS_EVERY_SECONDS:
+            save_progress()
+            progress_at = time.monotonic()
+
+    # Получатели, которым не удалось отправить из-за лимита Telegram, повторяются один раз
+    if finished:
+        while in_flight:
+            collect()
+        retries = log.indexes_with(RETRYING)
+        render_missing(db, template, log, retries, retry_args)
+        for index in retries:
+            if should_stop and should_stop():
+                finished = False
+                break
+            submit(None, index, retry_args[index])
+
+    while in_flight:
+        collect()
+
+    if finished:
+        for index in log.indexes_with(RETRYING):
+            log.mark(index, FAILED)
+
+    save_progress()
+
+    blocked = log.count(BLOCKED)
+    return {
+        'successful': log.count(SENT),
+        'failed': log.count(FAILED) + log.count(RETRYING) + blocked,
+        'blocked': blocked,
+        'finished': finished,
+        'log': log,
+    }
+
+
+def statistics_text(total_users, successful, failed, blocked, elapsed_time, finished=True):
+    """Текст итоговой статистики рассылки для админа."""
+    # Форматируем время
+    if elapsed_time < 60:
+        time_str = f'{elapsed_time:.2f} сек'
+    else:
+        minutes = int(elapsed_time // 60)
+        seconds = elapsed_time % 60
+        time_str = f'{minutes} мин {seconds:.1f} сек'
+
+    return (
+        f'{"✅ Рассылка завершена!" if finished else "⏸ Рассылка приостановлена."}\n\n'
+        f'📊 Статистика:\n'
+        f'• Всего пользователей: {total_users}\n'
+        f'• Успешно отправлено: {successful}\n'
+        f'• Ошибок: {failed}\n'
+        f'• Заблокировали бота: {blocked}\n'
+        f'• Время выполнения: {time_str}\n'
+        f'• Процент успеха: {(successful/total_users*100) if total_users > 0 else 0:.1f}%'
+    )
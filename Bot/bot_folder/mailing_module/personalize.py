@@ -0,0 +1,118 @@
+"""
+Персонализация рассылок: подстановка полей получателя в текст поста.
+
+Админ пишет в тексте или подписи поста {first_name}, {balance} и т.п.,
+можно со значением по умолчанию: {first_name|друг}. Поля получателя
+читаются тем же постраничным запросом, что и сами получатели
+(Database.iter_recipients с columns), отдельных запросов на получателя нет.
+Шаблон разбирается один раз на рассылку в строку формата, тексты
+рендерятся пачками по мере чтения получателей. Значения экранируются
+для HTML, пост отправляется с parse_mode=HTML.
+"""
+import re
+from itertools import islice
+
+from functions_module import functions
+
+
+def _format_date(value):
+    return value.strftime('%d.%m.%Y')
+
+
+# Поле шаблона -> (выражение SQL по таблице users u, форматирование значения)
+FIELDS = {
+    'first_name': ('u.first_name', str),
+    'last_name': ('u.last_name', str),
+    'username': ('u.username', str),
+    'balance': ('u.balance', functions.format_money),
+    'total_spent': ('u.total_spent', functions.format_money),
+    'join_date': ('u.join_date', _format_date),
+}
+
+# {поле} или {поле|значение по умолчанию}; скобки с неизвестным полем остаются в тексте как есть
+PLACEHOLDER = re.compile(r'\{(\w+)(?:\|([^{}]*))?\}')
+
+# Сколько получателей рендерится за раз
+RENDER_BATCH = 1000
+
+
+def has_placeholders(text):
+    """Есть ли в тексте поля для подстановки."""
+    return any(match.group(1) in FIELDS for match in PLACEHOLDER.finditer(text or ''))
+
+
+class Template:
+    def __init__(self, source):
+        """
+        :param source: HTML-текст поста с полями (Message.html_text или html_caption).
+        Значения по умолчанию уже в HTML, поэтому подставляются без экранирования.
+        """
+        self.source = source
+        self.fields = []  # Поля шаблона в порядке первого появления - колонки в строке получателя
+        self._slots = []  # (номер поля, значение по умолчанию) для каждого %s строки формата
+        parts = []
+        position = 0
+        for match in PLACEHOLDER.finditer(source):
+            name, default = match.group(1), match.group(2)
+            if name not in FIELDS:
+                continue
+            if name not in self.fields:
+                self.fields.append(name)
+            parts.append(source[position:match.start()].replace('%', '%%'))
+            parts.append('%s')
+            self._slots.append((self.fields.index(name), default or ''))
+            position = match.end()
+        parts.append(source[position:].replace('%', '%%'))
+        self._format = ''.join(parts)
+        self.columns = [FIELDS[name][0] for name in self.fields]  # Выражения SQL полей для Database
+        self._formatters = [FIELDS[name][1] for name in self.fields]
+
+    def render(self, values):
+        """Текст поста для получателя; values - значения self.fields (None - получатель не найден)."""
+        if values is None:
+            values = (None,) * len(self.fields)
+        texts = [functions.escape_text_html(formatter(value)) if value is not None and value != '' else ''
+                 for formatter, value in zip(self._formatters, values)]
+        return self._format % tuple(texts[field] or default for field, default in self._slots)
+
+
+def template_for(payload):
+    """Шаблон персонализированного поста или None, если пост отправляется всем одинаково."""
+    content_data = payload.get('content_data') or {}
+    source = content_data.get('template')
+    return Template(source) if source else None
+
+
+def iter_rendered(rows, template, batch_size=RENDER_BATCH):
+    """
+    Генератор (row_id, user_id, args) по строкам Database.iter_recipients:
+    args - аргументы send после user_id (текст поста, если есть template).
+    """
+    rows = iter(rows)
+    if template is None:
+        for row_id, user_id in rows:
+            yield row_id, user_id, ()
+        return
+
+    render = template.render
+    while True:
+        batch = list(islice(rows, batch_size))
+        yield from [(row[0], row[1], (render(row[2:]),)) for row in batch]
+        if len(batch) < batch_size:
+            return
+
+
+def render_missing(db, template, log, indexes, rendered):
+    """
+    Дополняет rendered (номер в log -> args) текстами для получателей indexes,
+    которых в нем нет (повторы из журнала прошлого запуска). Поля читаются одним запросом.
+    """
+    missing = [index for index in indexes if index not in rendered]
+    if not missing:
+        return
+    if template is None:
+        rendered.update((index, ()) for index in missing)
+        return
+    values = db.get_recipient_fields([log.ids[index] for index in missing], template.columns)
+    for index in missing:
+        rendered[index] = (template.render(values.get(log.ids[index])),)
@@ -0,0 +1,107 @@
+"""
+Компактное состояние доставки рассылки.
+
+Получатели хранятся вектором int64 (array('q')), статус каждого - одним байтом
+(bytearray): 9 байт на получателя вместо ~70 байт для списка int и счетчиков.
+Подсчет по статусам выполняется на уровне C (bytearray.count), выборка
+индексов по статусу - векторно через NumPy, если он установлен.
+
+Формат файла чекпоинта плоский: заголовок, затем ids (int64 little-endian)
+и статусы (uint8), поэтому файл можно открыть через mmap / numpy.memmap без разбора.
+"""
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+PENDING = 0
+SENT = 1
+FAILED = 2
+BLOCKED = 3
+RETRYING = 4
+
+STATUS_NAMES = {PENDING: 'pending', SENT: 'sent', FAILED: 'failed', BLOCKED: 'blocked', RETRYING: 'retrying'}
+
+_MAGIC = b'RCPLOG1\0'
+_HEADER = struct.Struct('<8sQ')
+
+_numpy = None
+
+
+def _get_numpy():
+    """NumPy импортируется при первом векторном запросе; без него используется чистый Python."""
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy or None
+
+
+class RecipientLog:
+    def __init__(self, ids=None, statuses=None):
+        self.ids = ids if ids is not None else array('q')
+        self.statuses = statuses if statuses is not None else bytearray()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, user_id, status=PENDING):
+        """Добавляет получателя. Возвращает его индекс."""
+        self.ids.append(user_id)
+        self.statuses.append(status)
+        return len(self.ids) - 1
+
+    def mark(self, index, status):
+        self.statuses[index] = status
+
+    def count(self, status):
+        return self.statuses.count(status)
+
+    def counts(self):
+        return {name: self.count(status) for status, name in STATUS_NAMES.items()}
+
+    def indexes_with(self, status):
+        """Индексы получателей с указанным статусом."""
+        np = _get_numpy()
+        if np is not None:
+            return np.flatnonzero(np.frombuffer(self.statuses, dtype=np.uint8) == status).tolist()
+        return [index for index, value in enumerate(self.statuses) if value == status]
+
+    @property
+    def nbytes(self):
+        return self.ids.itemsize * len(self.ids) + len(self.statuses)
+
+    def save(self, path, length=None):
+        """
+        Записывает первые length получателей (по умолчанию всех) в файл чекпоинта.
+        Файл заменяется атомарно, поэтому прерванная запись не портит предыдущий чекпоинт.
+        """
+        length = len(self.ids) if length is None else length
+        ids = self.ids[:length]
+        if sys.byteorder != 'little':
+            ids.byteswap()
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as file:
+            file.write(_HEADER.pack(_MAGIC, length))
+            file.write(ids.tobytes())
+            file.write(self.statuses[:length])
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Читает чекпоинт через mmap."""
+        with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            magic, length = _HEADER.unpack_from(data)
+            if magic != _MAGIC:
+                raise ValueError(f'Not a recipient log: {path}')
+            ids_end = _HEADER.size + 8 * length
+            ids = array('q')
+            ids.frombytes(data[_HEADER.size:ids_end])
+            if sys.byteorder != 'little':
+                ids.byteswap()
+            statuses = bytearray(data[ids_end:ids_end + length])
+        return cls(ids, statuses)
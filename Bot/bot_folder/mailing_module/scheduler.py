@@ -0,0 +1,134 @@
+"""
+Планировщик отложенных и растянутых по времени рассылок.
+
+Расписание хранится в локальной SQLite-базе (Database), поэтому переживает
+перезапуск бота. Запущенная рассылка периодически сохраняет users.id
+последнего обработанного получателя и heartbeat: при остановке процесса
+рассылка возвращается в 'pending' и продолжается с этого места новым процессом,
+а рассылку упавшего процесса подхватывают, когда ее heartbeat устаревает.
+Позиция и heartbeat записываются, только пока рассылкой владеет этот процесс:
+если ее отменили или забрал другой процесс, выполнение останавливается.
+"""
+import os
+import threading
+import time
+
+from logger_system import logger
+
+# Как часто планировщик проверяет расписание и обновляет heartbeat своих рассылок
+POLL_INTERVAL = 30
+# Через сколько секунд без heartbeat рассылка считается брошенной
+STALE_AFTER = 120
+
+
+class MailingScheduler:
+    def __init__(self, db, execute):
+        """
+        :param db: Database
+        :param execute: execute(schedule, on_progress, should_stop) - выполняет рассылку;
+            возвращает True, если рассылка дошла до конца, и False, если была прервана
+        """
+        self.db = db
+        self.execute = execute
+        self.pid = os.getpid()
+        self._running = {}  # id рассылки -> (поток, событие потери рассылки)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.db.create_mailing_schedules_table()
+        self._thread = threading.Thread(target=self._loop, name='MailingScheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=30):
+        """Останавливает планировщик; идущие рассылки сохраняют позицию и возвращаются в 'pending'."""
+        self._stop.set()
+        self._wakeup.set()
+        with self._lock:
+            threads = [thread for thread, _ in self._running.values()]
+        for thread in threads:
+            thread.join(timeout)
+
+    def add(self, admin_id, run_at, window_seconds, payload):
+        """Сохраняет рассылку в расписание. run_at - unix time начала, window_seconds - длительность отправки."""
+        schedule_id = self.db.add_mailing_schedule(admin_id, run_at, window_seconds, payload)
+        self._wakeup.set()
+        return schedule_id
+
+    def cancel(self, schedule_id):
+        """
+        Отменяет рассылку; если она уже идет, она остановится на следующем получателе.
+        Возвращает False, если рассылка уже завершена.
+        """
+        return self.db.cancel_mailing_schedule(schedule_id)
+
+    def pending(self, admin_id=None):
+        schedules = self.db.get_mailing_schedules()
+        if admin_id is not None:
+            schedules = [schedule for schedule in schedules if schedule['admin_id'] == admin_id]
+        return schedules
+
+    def _loop(self):
+        while not self._stop.is_set():
+            next_run_at = None
+            try:
+                now = time.time()
+                with self._lock:
+                    owned = dict(self._running)
+                for schedule_id, (_, lost) in owned.items():
+                    if not self.db.update_mailing_schedule(schedule_id, self.pid, heartbeat=now):
+                        lost.set()
+
+                for schedule in self.db.get_mailing_schedules():
+                    if schedule['id'] in owned:
+                        continue
+                    if schedule['run_at'] > now:
+                        next_run_at = min(next_run_at or schedule['run_at'], schedule['run_at'])
+                        continue
+                    if self.db.claim_mailing_schedule(schedule['id'], self.pid, now, now - STALE_AFTER):
+                        self._launch(schedule)
+            except Exception as e:
+                logger.error(f'Mailing scheduler error: {e}')
+
+            timeout = POLL_INTERVAL
+            if next_run_at is not None:
+                timeout = max(0.0, min(timeout, next_run_at - time.time()))
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+
+    def _launch(self, schedule):
+        # Выставляется, когда рассылкой больше не владеет этот процесс (отменена или забрана другим)
+        lost = threading.Event()
+        thread = threading.Thread(target=self._run, args=(schedule, lost), name=f'Mailing-{schedule["id"]}',
+                                  daemon=True)
+        with self._lock:
+            self._running[schedule['id']] = (thread, lost)
+        thread.start()
+
+    def _run(self, schedule, lost):
+        schedule_id = schedule['id']
+
+        def on_progress(last_user_id):
+            if not self.db.update_mailing_schedule(schedule_id, self.pid, last_user_id=last_user_id,
+                                                   heartbeat=time.time()):
+                lost.set()
+
+        def should_stop():
+            return self._stop.is_set() or lost.is_set()
+
+        logger.info(f'Starting scheduled mailing {schedule_id} from user id {schedule["last_user_id"]}')
+        try:
+            finished = self.execute(schedule, on_progress, should_stop)
+            # Если рассылку успели отменить (или ее забрал другой процесс), статус не меняется;
+            # при остановке процесса рассылка отдается следующему процессу
+            status = 'done' if finished else 'pending'
+            if lost.is_set() or not self.db.release_mailing_schedule(schedule_id, self.pid, status):
+                logger.info(f'Scheduled mailing {schedule_id} cancelled or taken over by another process')
+        except Exception as e:
+            logger.exception(f'Scheduled mailing {schedule_id} failed: {e}')
+            self.db.release_mailing_schedule(schedule_id, self.pid, 'failed')
+        finally:
+            with self._lock:
+                self._running.pop(schedule_id, None)
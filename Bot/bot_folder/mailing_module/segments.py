@@ -0,0 +1,153 @@
+"""
+Сегменты аудитории для рассылок.
+
+Каждый сегмент компилируется в SQL-условие над таблицей users (алиас u),
+поэтому фильтрация и подсчет получателей выполняются в PostgreSQL,
+а не в Python. Условия опираются на индексы из
+backend/database/migration_add_bot_mailing_segments.sql и на таблицу
+активности из migration_add_bot_user_activity.sql.
+
+Аудитория витрины (hosting_module) ограничивается пользователями, которые
+запускали ее бота (таблица bot_user_storefronts); основной витрине достаются
+и пользователи без записей - зарегистрированные до появления витрин или не через бота.
+"""
+from datetime import datetime
+
+
+class Segment:
+    def __init__(self, title, description, condition, parse=None, prompt=None):
+        self.title = title              # Текст кнопки
+        self.description = description  # Описание для превью, {} - значение параметра
+        self.condition = condition      # SQL-условие, %s - значение параметра
+        self.parse = parse              # Разбор значения, введенного админом
+        self.prompt = prompt            # Запрос значения у админа
+
+    @property
+    def has_value(self):
+        return self.parse is not None
+
+
+def _parse_days(text):
+    days = int(text.strip())
+    if days <= 0:
+        raise ValueError('days must be positive')
+    return days
+
+
+def _parse_amount(text):
+    return float(text.strip().replace(',', '.'))
+
+
+def _parse_date(text):
+    return datetime.strptime(text.strip(), '%d.%m.%Y').date()
+
+
+SEGMENTS = {
+    'joined': Segment(
+        title='🆕 Новые за N дней',
+        description='зарегистрировались за последние {} дн.',
+        condition="u.join_date >= CURRENT_TIMESTAMP - %s * INTERVAL '1 day'",
+        parse=_parse_days,
+        prompt='📅 Укажите количество дней (например, 7):'
+    ),
+    'spent': Segment(
+        title='💸 Потратили больше X',
+        description='потратили больше {}$',
+        condition='u.total_spent > %s',
+        parse=_parse_amount,
+        prompt='💸 Укажите сумму в $ (например, 10):'
+    ),
+    'balance': Segment(
+        title='💰 Положительный баланс',
+        description='баланс больше 0',
+        condition='u.balance > 0'
+    ),
+    'purchased': Segment(
+        title='🛒 Покупали с даты',
+        description='покупали с {}',
+        condition="""EXISTS (
+            SELECT 1 FROM purchases p
+            WHERE p.user_id = u.id AND p.status = 'completed' AND p.purchase_date >= %s
+        )""",
+        parse=_parse_date,
+        prompt='📅 Укажите дату в формате ДД.ММ.ГГГГ:'
+    ),
+    'deposited': Segment(
+        title='💳 Пополняли с даты',
+        description='пополняли баланс с {}',
+        condition="""EXISTS (
+            SELECT 1 FROM transactions t
+            WHERE t.user_id = u.id AND t.type = 'deposit'
+              AND t.status = 'completed' AND t.created_at >= %s
+        )""",
+        parse=_parse_date,
+        prompt='📅 Укажите дату в формате ДД.ММ.ГГГГ:'
+    ),
+    'active': Segment(
+        title='🔥 Активны за N дней',
+        description='обращались к боту за последние {} дн.',
+        condition="""EXISTS (
+            SELECT 1 FROM bot_user_activity a
+            WHERE a.telegram_id = u.telegram_id AND a.last_seen_at >= CURRENT_TIMESTAMP - %s * INTERVAL '1 day'
+        )""",
+        parse=_parse_days,
+        prompt='📅 Укажите количество дней (например, 7):'
+    ),
+    'inactive': Segment(
+        title='💤 Неактивны N дней',
+        description='не обращались к боту {} дн.',
+        condition="""NOT EXISTS (
+            SELECT 1 FROM bot_user_activity a
+            WHERE a.telegram_id = u.telegram_id AND a.last_seen_at >= CURRENT_TIMESTAMP - %s * INTERVAL '1 day'
+        )""",
+        parse=_parse_days,
+        prompt='📅 Укажите количество дней (например, 30):'
+    ),
+}
+
+
+# Пользователи, запускавшие бота витрины
+STOREFRONT_CONDITION = """EXISTS (
+    SELECT 1 FROM bot_user_storefronts s
+    WHERE s.telegram_id = u.telegram_id AND s.storefront = %s
+)"""
+# Пользователи, не привязанные ни к одной витрине
+UNASSIGNED_CONDITION = """NOT EXISTS (
+    SELECT 1 FROM bot_user_storefronts s WHERE s.telegram_id = u.telegram_id
+)"""
+
+
+def compile_segments(segments, storefront=None):
+    """
+    Собирает WHERE-условие для списка сегментов [(key, value), ...].
+    Сегменты объединяются через AND. Возвращает (sql, params).
+
+    storefront - [имя, основная ли витрина]: ограничивает аудиторию пользователями витрины.
+    """
+    conditions = ['u.telegram_id IS NOT NULL']
+    params = []
+    if storefront:
+        name, primary = storefront
+        if primary:
+            conditions.append(f'({STOREFRONT_CONDITION} OR {UNASSIGNED_CONDITION})')
+        else:
+            conditions.append(f'({STOREFRONT_CONDITION})')
+        params.append(name)
+    for key, value in segments or []:
+        segment = SEGMENTS[key]
+        conditions.append(f'({segment.condition})')
+        if segment.has_value:
+            params.append(value)
+    return ' AND '.join(conditions), params
+
+
+def describe_segments(segments):
+    """Человекочитаемое описание выбранных сегментов."""
+    if not segments:
+        return 'все пользователи'
+    parts = []
+    for key, value in segments:
+        if hasattr(value, 'strftime'):
+            value = value.strftime('%d.%m.%Y')
+        parts.append(SEGMENTS[key].description.format(value))
+    return ', '.join(parts)
@@ -0,0 +1,145 @@
+"""
+Время жизни незавершенных сессий /mail.
+
+SessionStore - словарь состояний рассылки, который помнит время последнего
+обращения к каждому состоянию. SessionSweeper в фоне удаляет сессии, к которым
+не обращались дольше ttl, отменяет их таймеры медиа-групп, сообщает админу
+и публикует количество живых сессий и их примерный объем в памяти в реестре
+метрик (видны в /health) и в логе.
+"""
+import sys
+import threading
+import time
+
+from logger_system import logger
+from metrics_module.metrics import registry
+
+
+def approximate_size(obj, _seen=None):
+    """Примерный объем объекта в памяти вместе с вложенными dict/list/tuple/set."""
+    _seen = _seen if _seen is not None else set()
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(approximate_size(key, _seen) + approximate_size(value, _seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(approximate_size(item, _seen) for item in obj)
+    return size
+
+
+class SessionStore(dict):
+    """
+    dict состояний рассылки; чтение (по ключу и через get) и запись продлевают жизнь сессии.
+    Обработчики берут состояние один раз через get: сессию между проверкой и чтением может удалить SessionSweeper.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.touched_at = {}
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        self.touched_at[key] = time.monotonic()
+        return value
+
+    def get(self, key, default=None):
+        """Состояние сессии или default; как и чтение по ключу, продлевает жизнь сессии."""
+        value = super().get(key, default)
+        if key in self.touched_at:
+            self.touched_at[key] = time.monotonic()
+        return value
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.touched_at[key] = time.monotonic()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.touched_at.pop(key, None)
+
+    def pop(self, key, *default):
+        self.touched_at.pop(key, None)
+        return super().pop(key, *default)
+
+    def idle(self, ttl):
+        """Ключи сессий, к которым не обращались дольше ttl секунд."""
+        deadline = time.monotonic() - ttl
+        return [key for key, touched_at in list(self.touched_at.items()) if touched_at < deadline]
+
+    def stats(self):
+        return {
+            'sessions': len(self),
+            'approx_bytes': sum(approximate_size(state) for state in list(self.values())),
+        }
+
+
+class SessionSweeper:
+    def __init__(self, sessions, timers, ttl, interval, on_expire=None, name='bot'):
+        """
+        :param sessions: SessionStore
+        :param timers: dict admin_id -> threading.Timer (таймеры сборки медиа-групп)
+        :param ttl: через сколько секунд без обращений сессия удаляется
+        :param interval: как часто проверять сессии (в секундах)
+        :param on_expire: on_expire(admin_id) - вызывается после удаления сессии
+        :param name: имя бота - метка gauge в реестре метрик
+        """
+        self.sessions = sessions
+        self.timers = timers
+        self.ttl = ttl
+        self.interval = interval
+        self.on_expire = on_expire
+        self._stop = threading.Event()
+        self._thread = None
+        self.gauges = {
+            'sessions': registry.gauge('mailing.sessions', bot=name),
+            'approx_bytes': registry.gauge('mailing.sessions_bytes', bot=name),
+            'timers': registry.gauge('mailing.session_timers', bot=name),
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name='SessionSweeper', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f'Session sweeper error: {e}')
+
+    def sweep(self):
+        """Удаляет просроченные сессии и таймеры без сессии. Возвращает количество удаленных сессий."""
+        expired = self.sessions.idle(self.ttl)
+        for admin_id in expired:
+            self._cancel_timer(admin_id)
+            if self.sessions.pop(admin_id, None) is None:
+                continue
+            logger.info(f'Mailing session of admin {admin_id} expired after {self.ttl:.0f}s of inactivity')
+            if self.on_expire:
+                try:
+                    self.on_expire(admin_id)
+                except Exception as e:
+                    logger.error(f'Failed to notify admin {admin_id} about expired mailing session: {e}')
+
+        # Таймеры, оставшиеся от уже удаленных сессий
+        for admin_id in list(self.timers):
+            if admin_id not in self.sessions:
+                self._cancel_timer(admin_id)
+
+        stats = self.sessions.stats()
+        self.gauges['sessions'].set(stats['sessions'])
+        self.gauges['approx_bytes'].set(stats['approx_bytes'])
+        self.gauges['timers'].set(len(self.timers))
+        if stats['sessions'] or expired:
+            logger.info(f'Mailing sessions: {stats}, timers={len(self.timers)}, expired={len(expired)}')
+        return len(expired)
+
+    def _cancel_timer(self, admin_id):
+        timer = self.timers.pop(admin_id, None)
+        if timer is not None:
+            timer.cancel()
@@ -0,0 +1,177 @@
+"""
+Воркер очереди рассылок.
+
+Рассылка, поставленная в очередь (Database.create_mailing_job), делится на части -
+диапазоны users.id. Любое количество воркеров (на одном или нескольких серверах)
+забирает части через FOR UPDATE SKIP LOCKED, отправляет сообщения и записывает
+результат; последний завершивший воркер отправляет админу итоговую статистику.
+
+Запуск отдельного воркера: python mailing_module/worker.py
+Каждый воркер соблюдает свой SENDER_BROADCAST_RATE, поэтому сумма лимитов
+всех воркеров и бота не должна превышать общий лимит Telegram.
+"""
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mailing_module.config as config
+from logger_system import logger
+from mailing_module.delivery import build_send, deliver, statistics_text
+from mailing_module.personalize import template_for
+
+
+class MailingWorker:
+    def __init__(self, bot, db, sender, worker_id=None, resolve=None):
+        """
+        :param bot: TeleBot
+        :param db: Database
+        :param sender: OutboundSender, через который идут отправки
+        :param resolve: resolve(payload) -> (TeleBot, OutboundSender) бота, от имени которого
+            создана рассылка (несколько витрин в процессе, hosting_module); без него - bot и sender
+        """
+        self.bot = bot
+        self.db = db
+        self.sender = sender
+        self.resolve = resolve
+        self.worker_id = worker_id or f'{socket.gethostname()}:{os.getpid()}'
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Запускает воркер в фоновом потоке (встроенный в процесс бота)."""
+        self._thread = threading.Thread(target=self.run, name='MailingWorker', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=30):
+        """Останавливает воркер; недоотправленная часть возвращается в очередь."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def run(self):
+        logger.info(f'Mailing worker {self.worker_id} started')
+        while not self._stop.is_set():
+            chunk = self.db.claim_mailing_chunk(self.worker_id, config.CLAIM_TIMEOUT_MINUTES)
+            if chunk is None:
+                self._stop.wait(config.WORKER_POLL_INTERVAL)
+                continue
+            try:
+                self._process(chunk)
+            except Exception as e:
+                logger.exception(f'Mailing chunk {chunk["id"]} failed: {e}')
+                # Часть останется захваченной и будет забрана заново после CLAIM_TIMEOUT_MINUTES
+                self._stop.wait(config.WORKER_POLL_INTERVAL)
+        logger.info(f'Mailing worker {self.worker_id} stopped')
+
+    def _process(self, chunk):
+        payload = chunk['payload']
+        bot, sender = self.resolve(payload) if self.resolve else (self.bot, self.sender)
+        send, _ = build_send(bot, payload)
+        last_user_id = chunk['last_user_id']
+        # Часть забрал другой воркер (захват истек): дальше ее отправляет он
+        lost = threading.Event()
+
+        def on_progress(row_id):
+            nonlocal last_user_id
+            last_user_id = row_id
+            if self.db.update_mailing_chunk(chunk['id'], self.worker_id, row_id) is False:
+                lost.set()
+
+        def should_stop():
+            return self._stop.is_set() or lost.is_set()
+
+        started_at = time.monotonic()
+        result = deliver(
+            self.db, sender, send,
+            segments=payload.get('segments'),
+            storefront=payload.get('storefront'),
+            start_after=chunk['last_user_id'],
+            end_id=chunk['end_user_id'],
+            on_progress=on_progress,
+            should_stop=should_stop,
+            template=template_for(payload)
+        )
+        logger.info(f'Mailing job {chunk["job_id"]} chunk {chunk["id"]}: '
+                    f'successful={result["successful"]}, failed={result["failed"]}, '
+                    f'elapsed={time.monotonic() - started_at:.2f}s')
+
+        if lost.is_set():
+            logger.warning(f'Mailing job {chunk["job_id"]} chunk {chunk["id"]} was taken over by another worker')
+            return
+
+        if not result['finished']:
+            self.db.release_mailing_chunk(chunk['id'], self.worker_id, last_user_id,
+                                          result['successful'], result['failed'], result['blocked'])
+            return
+
+        summary = self.db.complete_mailing_chunk(chunk['id'], self.worker_id,
+                                                 result['successful'], result['failed'], result['blocked'])
+        if summary is not None:
+            self._send_statistics(bot, summary)
+
+    def _send_statistics(self, bot, summary):
+        logger.info(f'Mailing job {summary["job_id"]} finished: total={summary["total_users"]}, '
+                    f'successful={summary["successful"]}, failed={summary["failed"]}, '
+                    f'blocked={summary["blocked"]}, elapsed={summary["elapsed_time"]:.2f}s')
+        try:
+            bot.send_message(
+                chat_id=summary['admin_id'],
+                text=f'📨 Рассылка #{summary["job_id"]}\n' + statistics_text(
+                    summary['total_users'], summary['successful'], summary['failed'],
+                    summary['blocked'], summary['elapsed_time']
+                )
+            )
+        except Exception as e:
+            logger.error(f'Failed to send mailing job statistics: {e}')
+
+
+def main():
+    import logger_system
+    from telebot import TeleBot
+    from db_module.db import Database
+    import transport_module.config as transport_config
+    from hosting_module.hosting import load_storefronts
+    from sender_module.sender import OutboundSender
+    from transport_module.transport import Transport
+
+    # Рассылки всех витрин (hosting_module) отправляются от имени своего бота
+    storefronts = load_storefronts()
+    transport = Transport(transport_config.POOL_SIZE or sum(storefront.workers for storefront in storefronts))
+    transport.install()
+    bots = {}
+    for storefront in storefronts:
+        sender = OutboundSender(workers=storefront.workers, global_rate=storefront.global_rate,
+                                broadcast_rate=storefront.broadcast_rate, transport=transport,
+                                token=storefront.token, name=storefront.name)
+        sender.install()
+        sender.start()
+        bots[storefront.name] = (TeleBot(token=storefront.token), sender)
+
+    def resolve(payload):
+        name = payload.get('bot') or storefronts[0].name
+        if name not in bots:
+            raise LookupError(f'Storefront {name!r} is not configured')
+        return bots[name]
+
+    bot, sender = bots[storefronts[0].name]
+    worker = MailingWorker(bot, Database(), sender, resolve=resolve)
+
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        worker.stop()
+    for _, sender in bots.values():
+        sender.stop()
+    logger.info(f'Telegram API call timings: {transport.stats()}')
+    logger_system.shutdown()
+
+
+if __name__ == '__main__':
+    main()
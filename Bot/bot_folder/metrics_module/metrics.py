@@ -0,0 +1,156 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+from logger_system import logger
+
+
+class BootTimer:
+    """
+    Замеряет фазы запуска бота (импорты, создание TeleBot, регистрация
+    обработчиков, фоновая настройка) и время до первого обработанного апдейта.
+    """
+
+    def __init__(self, started_at=None):
+        self.started_at = started_at or time.perf_counter()
+        self.phases = {}
+        self._lock = threading.Lock()
+        self._first_update_seen = False
+
+    def record(self, phase, started_at):
+        """Сохраняет длительность фазы, начатой в started_at (perf_counter)."""
+        with self._lock:
+            self.phases[phase] = time.perf_counter() - started_at
+
+    @contextmanager
+    def phase(self, name):
+        """Контекстный менеджер для замера фазы."""
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, started_at)
+
+    def mark(self, name):
+        """Сохраняет время от начала запуска до текущего момента."""
+        self.record(name, self.started_at)
+
+    def first_update_handled(self):
+        """Фиксирует время до первого обработанного апдейта и пишет сводку в лог."""
+        if self._first_update_seen:
+            return
+        with self._lock:
+            if self._first_update_seen:
+                return
+            self._first_update_seen = True
+        self.mark('first_update')
+        self.report()
+
+    def report(self):
+        with self._lock:
+            breakdown = ', '.join(f'{name}={seconds * 1000:.0f}ms' for name, seconds in self.phases.items())
+        logger.info(f'Boot phases: {breakdown}')
+
+
+class Histogram:
+    """
+    Гистограмма с фиксированными границами корзин (в секундах).
+    Хранит только счетчики, поэтому подходит для горячих путей.
+    """
+
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += value
+
+    def percentile(self, q):
+        """Верхняя граница корзины, в которую попадает q-й процентиль (q от 0 до 100)."""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            rank = self.count * q / 100
+            seen = 0
+            for index, count in enumerate(self.counts):
+                seen += count
+                if seen >= rank:
+                    return self.buckets[index] if index < len(self.buckets) else float('inf')
+        return float('inf')
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'avg': self.total / self.count if self.count else 0.0,
+            'p50': self.percentile(50),
+            'p99': self.percentile(99),
+        }
+
+
+class Gauge:
+    """Текущее значение величины (количество, объем), которое периодически обновляет ее владелец."""
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+
+class Registry:
+    """
+    Общий для процесса реестр гистограмм и gauge по имени и меткам:
+    компоненты всех ботов процесса пишут в один реестр.
+    """
+
+    def __init__(self):
+        self._histograms = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name, buckets=Histogram.DEFAULT_BUCKETS, **labels):
+        """
+        Возвращает гистограмму name с метками labels, создавая ее при первом обращении.
+        buckets учитываются только при создании.
+        """
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram(buckets))
+        return histogram
+
+    def gauge(self, name, **labels):
+        """Возвращает gauge name с метками labels, создавая его при первом обращении."""
+        key = (name, tuple(sorted(labels.items())))
+        gauge = self._gauges.get(key)
+        if gauge is None:
+            with self._lock:
+                gauge = self._gauges.setdefault(key, Gauge())
+        return gauge
+
+    def snapshot(self):
+        """{'name{label=value,...}': summary гистограммы или значение gauge} по всему реестру."""
+        snapshot = {}
+        for (name, labels), histogram in list(self._histograms.items()):
+            snapshot[name + self._suffix(labels)] = histogram.summary()
+        for (name, labels), gauge in list(self._gauges.items()):
+            snapshot[name + self._suffix(labels)] = gauge.value
+        return snapshot
+
+    @staticmethod
+    def _suffix(labels):
+        return '{' + ','.join(f'{key}={value}' for key, value in labels) + '}' if labels else ''
+
+
+registry = Registry()
@@ -0,0 +1,16 @@
+import os
+
+# Уведомления пользователей о покупках и пополнениях (LISTEN/NOTIFY, см. migration_add_bot_notifications.sql)
+ENABLED = os.environ.get('NOTIFICATIONS_ENABLED', '1') == '1'
+# Канал NOTIFY, который вызывают триггеры purchases и transactions (задан в миграции)
+CHANNEL = 'bot_notifications'
+# Сколько уведомлений забирать из outbox за один запрос
+BATCH_SIZE = int(os.environ.get('NOTIFICATIONS_BATCH_SIZE', '100'))
+# Через сколько минут захваченное, но не подтвержденное уведомление забирается заново
+CLAIM_TIMEOUT_MINUTES = int(os.environ.get('NOTIFICATIONS_CLAIM_TIMEOUT_MINUTES', '5'))
+# Сколько раз пытаться отправить уведомление при временных ошибках
+MAX_ATTEMPTS = int(os.environ.get('NOTIFICATIONS_MAX_ATTEMPTS', '5'))
+# Через сколько секунд повторить неотправленные уведомления
+RETRY_DELAY = float(os.environ.get('NOTIFICATIONS_RETRY_DELAY', '30'))
+# Пауза перед переподключением к PostgreSQL (в секундах)
+RECONNECT_DELAY = float(os.environ.get('NOTIFICATIONS_RECONNECT_DELAY', '5'))
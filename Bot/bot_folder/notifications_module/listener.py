@@ -0,0 +1,195 @@
+"""
+Уведомления пользователей о покупках и пополнениях.
+
+Триггеры purchases и transactions кладут уведомление в bot_notification_outbox
+и вызывают NOTIFY. NotificationListener держит отдельное подключение с LISTEN
+и ждет на его сокете: запросов к базе, пока событий нет, не выполняется.
+По NOTIFY уведомления забираются пачками, отправляются через OutboundSender
+с транзакционным приоритетом и удаляются из outbox.
+
+На том же подключении можно слушать и другие каналы (subscribe), например
+для сброса кэшей при изменении данных в PostgreSQL.
+"""
+import os
+import select
+import socket
+import threading
+import time
+
+import notifications_module.config as config
+from functions_module import functions
+from logger_system import logger
+from sender_module.sender import TRANSACTIONAL
+
+# Как часто проверять флаг остановки и живость подключения, если событий нет (в секундах)
+IDLE_TIMEOUT = 5
+
+
+def _format_amount(notification):
+    if notification['amount'] is None:
+        return ''
+    currency = notification['currency'] or 'USD'
+    return f'{notification["amount"]:.2f}$' if currency == 'USD' else f'{notification["amount"]:.2f} {currency}'
+
+
+def render(notification):
+    """Текст уведомления (HTML)."""
+    amount = _format_amount(notification)
+    if notification['kind'] == 'deposit':
+        return f'💳 <b>Баланс пополнен</b> на <code>{amount}</code>'
+
+    title = functions.escape_text_html(notification['title'])
+    if notification['status'] == 'completed':
+        return f'✅ <b>Заказ выполнен</b>\n\n{title}\nСумма: <code>{amount}</code>'
+    return (
+        f'❌ <b>Заказ не выполнен</b>\n\n{title}\nСумма: <code>{amount}</code>\n\n'
+        f'Подробности - в разделе покупок приложения.'
+    )
+
+
+def _is_permanent(error):
+    """Ошибка, при которой повторная отправка бессмысленна (бот заблокирован, чат не найден и т.п.)."""
+    code = getattr(error, 'error_code', None)
+    return code is not None and 400 <= code < 500 and code != 429
+
+
+class NotificationListener:
+    def __init__(self, bot, db, sender, channel=config.CHANNEL, batch_size=config.BATCH_SIZE, worker_id=None,
+                 send_notifications=True, resolve=None):
+        """
+        :param send_notifications: отправлять уведомления из outbox (иначе слушаются только каналы subscribe)
+        :param resolve: resolve(notification) -> (TeleBot, OutboundSender) бота витрины пользователя
+            (несколько витрин в процессе, hosting_module); без него - bot и sender
+        """
+        self.bot = bot
+        self.db = db
+        self.sender = sender
+        self.resolve = resolve
+        self.channel = channel
+        self.batch_size = batch_size
+        self.send_notifications = send_notifications
+        self._subscribers = {}  # канал -> callback(payload)
+        self.worker_id = worker_id or f'{socket.gethostname()}:{os.getpid()}:notifications'
+        self._stop = threading.Event()
+        self._thread = None
+        self._retry_at = None
+        self.sent = 0
+        self.failed = 0
+
+    def subscribe(self, channel, callback):
+        """
+        Вызывает callback(payload) на каждый NOTIFY канала channel (до start()).
+        После каждого (пере)подключения вызывается callback(None): события,
+        пришедшие без подключения, потеряны, и подписчик должен сбросить свое состояние.
+        """
+        self._subscribers[channel] = callback
+
+    @property
+    def channels(self):
+        return ([self.channel] if self.send_notifications else []) + list(self._subscribers)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name='NotificationListener', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                conn = self.db.listen(*self.channels)
+            except Exception as e:
+                logger.error(f'Notification listener failed to connect: {e}')
+                self._stop.wait(config.RECONNECT_DELAY)
+                continue
+
+            logger.info(f'Listening for notifications on channels {", ".join(self.channels)}')
+            try:
+                # События, пришедшие, пока подключения не было
+                for channel in self._subscribers:
+                    self._dispatch(channel, None)
+                if self.send_notifications:
+                    self.drain()
+                self._listen(conn)
+            except Exception as e:
+                logger.error(f'Notification listener error: {e}')
+                self._stop.wait(config.RECONNECT_DELAY)
+            finally:
+                conn.close()
+
+    def _listen(self, conn):
+        while not self._stop.is_set():
+            timeout = IDLE_TIMEOUT
+            if self._retry_at is not None:
+                timeout = max(0.0, min(timeout, self._retry_at - time.monotonic()))
+
+            select.select([conn], [], [], timeout)
+            # poll() читает сокет без запроса к базе и бросает исключение, если подключение разорвано
+            conn.poll()
+            pending = False
+            for notify in conn.notifies:
+                if notify.channel == self.channel:
+                    pending = True
+                else:
+                    self._dispatch(notify.channel, notify.payload)
+            conn.notifies.clear()
+
+            if pending and self.send_notifications:
+                self.drain()
+            elif self._retry_at is not None and time.monotonic() >= self._retry_at:
+                self.drain()
+
+    def _dispatch(self, channel, payload):
+        callback = self._subscribers.get(channel)
+        if callback is None:
+            return
+        try:
+            callback(payload)
+        except Exception as e:
+            logger.error(f'Notification callback for channel {channel} failed: {e}')
+
+    def drain(self):
+        """Отправляет все готовые уведомления из outbox. Возвращает количество отправленных."""
+        self._retry_at = None
+        sent = 0
+        while not self._stop.is_set():
+            notifications = self.db.claim_notifications(self.worker_id, self.batch_size,
+                                                        config.CLAIM_TIMEOUT_MINUTES)
+            if not notifications:
+                break
+
+            futures = [(notification, self._submit(notification)) for notification in notifications]
+            done_ids, retry_ids = [], []
+            for notification, future in futures:
+                try:
+                    future.result()
+                    done_ids.append(notification['id'])
+                    sent += 1
+                except Exception as e:
+                    self.failed += 1
+                    if _is_permanent(e):
+                        logger.info(f'Notification {notification["id"]} to {notification["telegram_id"]} dropped: {e}')
+                        done_ids.append(notification['id'])
+                    else:
+                        logger.error(f'Notification {notification["id"]} to {notification["telegram_id"]} failed: {e}')
+                        retry_ids.append(notification['id'])
+
+            self.db.finish_notifications(done_ids, retry_ids, config.MAX_ATTEMPTS, config.RETRY_DELAY)
+            if retry_ids:
+                # Неотправленные уведомления станут доступны через RETRY_DELAY, тогда и повторим
+                self._retry_at = time.monotonic() + config.RETRY_DELAY
+            if len(notifications) < self.batch_size:
+                break
+
+        self.sent += sent
+        if sent:
+            logger.info(f'Notifications sent: {sent} (total sent={self.sent}, failed={self.failed})')
+        return sent
+
+    def _submit(self, notification):
+        bot, sender = self.resolve(notification) if self.resolve else (self.bot, self.sender)
+        return sender.submit(bot.send_message, notification['telegram_id'], render(notification),
+                             parse_mode='HTML', priority=TRANSACTIONAL)
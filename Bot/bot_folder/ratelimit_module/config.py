@@ -0,0 +1,20 @@
+import os
+
+
+def _policy(name, default):
+    """Политика из переменной окружения RATE_LIMIT_<NAME>="<в секунду>,<запас>[,coalesce]"."""
+    value = os.environ.get(f'RATE_LIMIT_{name.upper()}', default)
+    parts = [part.strip() for part in value.split(',')]
+    return float(parts[0]), float(parts[1]), len(parts) > 2 and parts[2] == 'coalesce'
+
+
+# Лимиты апдейтов на чат: (токенов в секунду, размер запаса, склеивать ли повторы в одном пакете апдейтов).
+# Ключ - имя команды без '/', либо 'command' (прочие команды), 'message' (не команды), 'callback' (нажатия кнопок)
+POLICIES = {
+    'start': _policy('start', '0.1,3,coalesce'),
+    'command': _policy('command', '0.5,5'),
+    'message': _policy('message', '1,10'),
+    'callback': _policy('callback', '2,10'),
+}
+# Как часто (в проверках) удалять записи чатов, запас которых уже полностью восстановился
+EXPIRE_EVERY = int(os.environ.get('RATE_LIMIT_EXPIRE_EVERY', '1000'))
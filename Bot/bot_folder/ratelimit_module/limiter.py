@@ -0,0 +1,119 @@
+"""
+Ограничение частоты апдейтов от одного чата.
+
+Апдейты фильтруются до передачи в telebot, поэтому флуд /start
+не доходит ни до add_user (PostgreSQL), ни до send_message.
+Для каждой пары (политика, chat_id) хранится только кортеж
+(токены, время обновления); записи чатов с полностью восстановленным
+запасом удаляются лениво - при очередной периодической проверке.
+"""
+import threading
+import time
+from collections import Counter
+
+import ratelimit_module.config as config
+from logger_system import logger
+
+
+class Policy:
+    __slots__ = ('name', 'rate', 'burst', 'coalesce')
+
+    def __init__(self, name, rate, burst, coalesce=False):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.coalesce = coalesce
+
+
+class ChatRateLimiter:
+    def __init__(self, policies=config.POLICIES, exempt_chat_ids=(), expire_every=config.EXPIRE_EVERY):
+        """
+        :param policies: {ключ: (токенов в секунду, запас, coalesce)}, см. ratelimit_module.config
+        :param exempt_chat_ids: чаты без ограничений (админы)
+        """
+        self.policies = {name: Policy(name, *values) for name, values in policies.items()}
+        self.exempt_chat_ids = set(exempt_chat_ids)
+        self.expire_every = expire_every
+        self._buckets = {}  # (имя политики, chat_id) -> (токены, время обновления)
+        self._checks = 0
+        self._lock = threading.Lock()
+        self.allowed = Counter()
+        self.throttled = Counter()
+        self.coalesced = Counter()
+
+    def classify(self, update):
+        """Возвращает (политика, chat_id, ключ склейки) апдейта или (None, None, None), если он не ограничивается."""
+        if update.message is not None:
+            message = update.message
+            text = message.text or ''
+            if text.startswith('/'):
+                command = text.split(maxsplit=1)[0][1:].split('@', 1)[0].lower()
+                policy = self.policies.get(command) or self.policies.get('command')
+                return policy, message.chat.id, text
+            return self.policies.get('message'), message.chat.id, None
+
+        if update.callback_query is not None:
+            call = update.callback_query
+            chat_id = call.message.chat.id if call.message else call.from_user.id
+            return self.policies.get('callback'), chat_id, call.data
+        return None, None, None
+
+    def filter(self, updates):
+        """Возвращает апдейты, прошедшие лимиты; лишние отбрасываются и учитываются в счетчиках."""
+        now = time.monotonic()
+        passed = []
+        seen = set()
+        with self._lock:
+            for update in updates:
+                policy, chat_id, coalesce_key = self.classify(update)
+                if policy is None or chat_id in self.exempt_chat_ids:
+                    passed.append(update)
+                    continue
+
+                # Одинаковые команды одного чата в одном пакете апдейтов выполняются один раз
+                if policy.coalesce:
+                    key = (chat_id, coalesce_key)
+                    if key in seen:
+                        self.coalesced[policy.name] += 1
+                        continue
+                    seen.add(key)
+
+                if self._take(policy, chat_id, now):
+                    self.allowed[policy.name] += 1
+                    passed.append(update)
+                else:
+                    self.throttled[policy.name] += 1
+                    logger.debug(f'Update {update.update_id} from chat {chat_id} throttled by policy {policy.name}')
+
+            self._checks += len(updates)
+            if self._checks >= self.expire_every:
+                self._checks = 0
+                self._expire(now)
+        return passed
+
+    def _take(self, policy, chat_id, now):
+        key = (policy.name, chat_id)
+        tokens, updated_at = self._buckets.get(key, (policy.burst, now))
+        tokens = min(policy.burst, tokens + (now - updated_at) * policy.rate)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            return False
+        self._buckets[key] = (tokens - 1, now)
+        return True
+
+    def _expire(self, now):
+        """Удаляет записи, запас которых уже восстановился: они эквивалентны отсутствующим."""
+        expired = [
+            key for key, (tokens, updated_at) in self._buckets.items()
+            if tokens + (now - updated_at) * self.policies[key[0]].rate >= self.policies[key[0]].burst
+        ]
+        for key in expired:
+            del self._buckets[key]
+
+    def stats(self):
+        return {
+            'chats': len(self._buckets),
+            'allowed': dict(self.allowed),
+            'throttled': dict(self.throttled),
+            'coalesced': dict(self.coalesced),
+        }
@@ -0,0 +1,37 @@
+import os
+
+BOT_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BOT_SCRIPT = os.path.join(BOT_FOLDER, 'bot.py')
+
+# Каталоги, изменения в которых не перезапускают бота
+IGNORED_DIRS = {'__pycache__', 'tests'}
+
+
+def _source_dirs(root):
+    """root и его подкаталоги-пакеты бота (*_module, logger_system...) - каталоги с .py файлами."""
+    dirs = [root]
+    for entry in sorted(os.scandir(root), key=lambda entry: entry.name):
+        if not entry.is_dir() or entry.name in IGNORED_DIRS or entry.name.startswith('.'):
+            continue
+        if any(name.endswith('.py') for name in os.listdir(entry.path)):
+            dirs.append(entry.path)
+    return dirs
+
+
+# Отслеживаемые каталоги (без рекурсии) - только исходники бота; новый пакет подхватывается перезапуском супервизора
+WATCH_DIRS = _source_dirs(BOT_FOLDER)
+
+# Сколько секунд тишины ждать после последнего изменения перед перезапуском
+DEBOUNCE_SECONDS = 1.0
+# Сколько ждать, пока новый процесс прогреется и сообщит о готовности
+WARMUP_TIMEOUT = 60
+# Сколько ждать, пока старый процесс остановит polling (до ответа текущего getUpdates, до 20 секунд)
+# и завершит текущие обработчики
+DRAIN_TIMEOUT = 30
+# Сколько ждать выхода старого процесса после остановки polling, прежде чем завершить его принудительно:
+# больше суммы таймаутов штатной остановки (фоновые задачи SharedResources.stop, затем Bot.drain)
+EXIT_TIMEOUT = 300
+
+# Переменные окружения для связи дочернего процесса с супервизором
+ADDRESS_ENV = 'BOT_SUPERVISOR_ADDRESS'
+AUTHKEY_ENV = 'BOT_SUPERVISOR_AUTHKEY'
@@ -0,0 +1,70 @@
+"""
+Дочерняя сторона протокола передачи polling между процессами бота.
+
+Супервизор (restart_bot.py) запускает новый процесс, тот прогревается
+и сообщает 'ready'. Затем супервизор просит старый процесс остановить
+polling ('drain'), получает от него последние update_id ('stopped')
+и передает их новому процессу вместе с командой 'poll'. Супервизор
+не разбирает значение: процесс с несколькими ботами (hosting_module)
+передает словарь {имя витрины: update_id}.
+
+Процесс может сам попросить о перезапуске ('restart'), например когда
+сторож health_module обнаружил зависший polling: супервизор перезапускает
+его так же, как при изменении кода.
+"""
+import os
+from multiprocessing.connection import Client
+
+import restart_module.config as config
+
+
+class Handoff:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def ready(self):
+        """Сообщает супервизору, что процесс прогрет и готов начать polling."""
+        self.conn.send(('ready', os.getpid()))
+
+    def wait_for_poll(self):
+        """Ждет команды 'poll'. Возвращает update_id (или словарь по витринам), с которого продолжить, или None."""
+        command, last_update_id = self.conn.recv()
+        return last_update_id if command == 'poll' else None
+
+    def polling(self):
+        self.conn.send(('polling', None))
+
+    def wait_for_drain(self):
+        """Ждет команды 'drain'. Возвращает False, если супервизор отключился."""
+        try:
+            command, _ = self.conn.recv()
+        except (EOFError, OSError):
+            return False
+        return command == 'drain'
+
+    def stopped(self, last_update_id):
+        """
+        Сообщает, что polling остановлен (все bot.run() вернули управление, последний getUpdates
+        завершен), и передает последние полученные update_id.
+        """
+        self.conn.send(('stopped', last_update_id))
+
+    def request_restart(self, reason):
+        """Просит супервизор заменить этот процесс новым."""
+        self.conn.send(('restart', reason))
+
+    def close(self):
+        try:
+            self.conn.close()
+        except OSError:
+            pass
+
+
+def connect():
+    """Подключается к супервизору. Возвращает None, если бот запущен без него."""
+    address = os.environ.get(config.ADDRESS_ENV)
+    if not address:
+        return None
+    host, port = address.rsplit(':', 1)
+    conn = Client((host, int(port)), authkey=bytes.fromhex(os.environ[config.AUTHKEY_ENV]))
+    return Handoff(conn)
@@ -1,58 +1,230 @@
 import os
 import sys
 import time
+import threading
 import subprocess
+from multiprocessing.connection import Listener
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 
-BOT_SCRIPT = 'bot_folder/bot.py'
-bot_process = None
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger_system import logger
+import restart_module.config as config
+
 
 class BotRestartHandler(FileSystemEventHandler):
-    def on_modified(self, event):
-        global bot_process
+    """Запоминает время последнего изменения .py файла; сам перезапуск делает Supervisor."""
+
+    def __init__(self):
+        super().__init__()
+        self.changed_at = None
+
+    def on_any_event(self, event):
+        if event.is_directory or event.event_type not in ('modified', 'created', 'moved'):
+            return
 
-        if '__pycache__' in event.src_path:
+        path = getattr(event, 'dest_path', None) or event.src_path
+        if '__pycache__' in path or not path.endswith('.py'):
             return
-        
-        if event.src_path.endswith('.py'):
-            print(f"Detected changes in {event.src_path}. Restarting bot...")
-            if bot_process:
-                try:
-                    bot_process.terminate()
-                    bot_process.wait(timeout=5)
-                except subprocess.TimeoutExpired:
-                    bot_process.kill()
-                except Exception as e:
-                    print(f"Error terminating bot process: {e}")
-            
-            bot_process = subprocess.Popen([sys.executable, BOT_SCRIPT])
+
+        logger.info(f"Detected changes in {path}")
+        self.changed_at = time.monotonic()
+
+
+class BotProcess:
+    """Процесс бота и канал связи с ним."""
+
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+
+    def send(self, command, payload=None):
+        self.conn.send((command, payload))
+
+    def recv(self, timeout):
+        if not self.conn.poll(timeout):
+            return None, None
+        return self.conn.recv()
+
+    def wait(self, timeout):
+        try:
+            self.process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            logger.error(f"Bot process {self.process.pid} did not exit in {timeout}s, killing it")
+            self.process.kill()
+        except Exception as e:
+            logger.error(f"Error terminating bot process: {e}")
+        self.conn.close()
+
+
+class Supervisor:
+    """
+    Перезапускает бота без простоя: новый процесс прогревается
+    (импорты, set_my_commands, подключение к БД) параллельно со старым,
+    и только после этого старый останавливает polling и передает
+    последний update_id новому.
+    """
+
+    def __init__(self):
+        self.authkey = os.urandom(16)
+        self.listener = Listener(('127.0.0.1', 0), authkey=self.authkey)
+        self.connections = {}
+        self.connections_cond = threading.Condition()
+        self.current = None
+        threading.Thread(target=self._accept_loop, name='SupervisorAccept', daemon=True).start()
+
+    def _accept_loop(self):
+        while True:
+            try:
+                conn = self.listener.accept()
+                command, pid = conn.recv()
+            except Exception as e:
+                logger.error(f"Supervisor handshake failed: {e}")
+                continue
+            if command != 'ready':
+                conn.close()
+                continue
+            with self.connections_cond:
+                self.connections[pid] = conn
+                self.connections_cond.notify_all()
+
+    def _spawn(self):
+        """Запускает новый процесс и ждет, пока он прогреется."""
+        host, port = self.listener.address
+        env = dict(os.environ)
+        env[config.ADDRESS_ENV] = f'{host}:{port}'
+        env[config.AUTHKEY_ENV] = self.authkey.hex()
+
+        started_at = time.perf_counter()
+        process = subprocess.Popen([sys.executable, config.BOT_SCRIPT], env=env)
+        deadline = time.monotonic() + config.WARMUP_TIMEOUT
+
+        with self.connections_cond:
+            while process.pid not in self.connections:
+                if process.poll() is not None or time.monotonic() >= deadline:
+                    break
+                self.connections_cond.wait(timeout=0.5)
+            conn = self.connections.pop(process.pid, None)
+
+        if conn is None:
+            logger.error(f"Bot process {process.pid} failed to warm up (exit code {process.poll()})")
+            if process.poll() is None:
+                process.kill()
+            return None
+
+        logger.info(f"Bot process {process.pid} warmed up in {time.perf_counter() - started_at:.2f}s")
+        return BotProcess(process, conn)
+
+    def start(self):
+        self.current = self._spawn()
+        if self.current:
+            self.current.send('poll')
+
+    def _stop_polling(self, bot_process):
+        """
+        Просит процесс остановить polling. Возвращает (остановка подтверждена, последний update_id).
+        Без подтверждения процесс, возможно, еще опрашивает Telegram.
+        """
+        try:
+            bot_process.send('drain')
+            command, last_update_id = bot_process.recv(config.DRAIN_TIMEOUT)
+        except (EOFError, OSError):
+            return False, None
+        if command != 'stopped':
+            return False, None
+        return True, last_update_id
+
+    def restart(self):
+        new = self._spawn()
+        if new is None:
+            logger.error("Restart aborted, keeping the running bot process")
+            return
+
+        old = self.current
+        handoff_started = time.perf_counter()
+        last_update_id = None
+        if old:
+            stopped, last_update_id = self._stop_polling(old)
+            if not stopped:
+                # Два процесса не должны опрашивать Telegram одновременно (409 Conflict, повтор апдейтов):
+                # новый процесс завершается, старый остается текущим; если он все же остановится,
+                # poll_requests заметит его выход и запустит новый
+                logger.error(f"Bot process {old.process.pid} did not confirm polling stop, restart aborted")
+                new.process.kill()
+                new.wait(config.WARMUP_TIMEOUT)
+                return
+        new.send('poll', last_update_id)
+        try:
+            new.recv(config.WARMUP_TIMEOUT)
+        except (EOFError, OSError):
+            pass
+        downtime = time.perf_counter() - handoff_started
+        self.current = new
+        logger.info(f"Polling handed over to process {new.process.pid}, downtime {downtime * 1000:.0f} ms")
+
+        if old:
+            # Старый процесс дожидается текущих обработчиков и сбрасывает буферы
+            old.wait(config.EXIT_TIMEOUT)
+
+    def poll_requests(self):
+        """
+        Перезапускает текущий процесс, если он об этом попросил ('restart')
+        или завершился сам.
+        """
+        current = self.current
+        if current is None:
+            return
+        if current.process.poll() is not None:
+            logger.error(f"Bot process {current.process.pid} exited with code {current.process.returncode}, "
+                         f"starting a new one")
+            current.conn.close()
+            self.current = None
+            self.start()
+            return
+        try:
+            if not current.conn.poll():
+                return
+            command, reason = current.conn.recv()
+        except (EOFError, OSError):
+            # Процесс завершается; перезапуск на следующей проверке
+            return
+        if command == 'restart':
+            logger.error(f"Bot process {current.process.pid} requested restart: {reason}")
+            self.restart()
+
+    def stop(self):
+        if self.current:
+            self._stop_polling(self.current)
+            self.current.wait(config.EXIT_TIMEOUT)
+            self.current = None
 
 
 def run():
-    global bot_process
-    bot_process = subprocess.Popen([sys.executable, BOT_SCRIPT])
+    supervisor = Supervisor()
+    supervisor.start()
 
     event_handler = BotRestartHandler()
     observer = Observer()
-    observer.schedule(event_handler, path='.', recursive=True)
+    for path in config.WATCH_DIRS:
+        if os.path.isdir(path):
+            observer.schedule(event_handler, path=path, recursive=False)
     observer.start()
 
     try:
         while True:
-            time.sleep(1)
+            time.sleep(0.2)
+            changed_at = event_handler.changed_at
+            if changed_at and time.monotonic() - changed_at >= config.DEBOUNCE_SECONDS:
+                if event_handler.changed_at == changed_at:
+                    event_handler.changed_at = None
+                logger.info("Restarting bot...")
+                supervisor.restart()
+            supervisor.poll_requests()
     except KeyboardInterrupt:
         observer.stop()
     observer.join()
 
-    if bot_process:
-        try:
-            bot_process.terminate()
-            bot_process.wait(timeout=5)
-        except subprocess.TimeoutExpired:
-            bot_process.kill()
-        except Exception as e:
-            print(f"Error terminating bot process: {e}")
+    supervisor.stop()
 
 
 if __name__ == "__main__":
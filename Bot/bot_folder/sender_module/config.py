@@ -0,0 +1,12 @@
+import os
+
+# Количество потоков, выполняющих запросы к Telegram API
+WORKERS = int(os.environ.get('SENDER_WORKERS', '8'))
+# Потоки, которые никогда не занимаются рассылками (всегда свободны для ответов пользователям)
+RESERVED_WORKERS = int(os.environ.get('SENDER_RESERVED_WORKERS', '2'))
+# Общий лимит Telegram (сообщений в секунду на бота)
+GLOBAL_RATE = float(os.environ.get('SENDER_GLOBAL_RATE', '30'))
+# Доля общего лимита, доступная рассылкам; остаток всегда остается для интерактивных ответов
+BROADCAST_RATE = float(os.environ.get('SENDER_BROADCAST_RATE', '25'))
+# Сколько отправок одной рассылки может выполняться одновременно
+BROADCAST_WINDOW = int(os.environ.get('SENDER_BROADCAST_WINDOW', '4'))
@@ -0,0 +1,300 @@
+"""
+Центральный планировщик исходящих запросов к Telegram API.
+
+Все запросы TeleBot (кроме getUpdates и служебных) проходят через
+OutboundSender: он соблюдает общий лимит Telegram и раздает его по
+классам приоритета. Интерактивные ответы всегда обслуживаются первыми,
+транзакционные уведомления - вторыми, рассылки получают остаток лимита
+и делят его поровну (round-robin) между одновременно идущими рассылками.
+
+Если в процессе работает несколько ботов, у каждого свой OutboundSender
+(лимит Telegram действует на бота), а запросы telebot распределяются
+между ними по токену бота в адресе запроса.
+"""
+import contextvars
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+import sender_module.config as config
+from logger_system import logger
+from metrics_module.metrics import registry
+from tracing_module import tracing
+
+INTERACTIVE = 0
+TRANSACTIONAL = 1
+BROADCAST = 2
+
+PRIORITY_NAMES = {INTERACTIVE: 'interactive', TRANSACTIONAL: 'transactional', BROADCAST: 'broadcast'}
+
+# Методы, которые не расходуют лимит отправки и не должны ждать в очереди
+UNTHROTTLED_METHODS = {'getUpdates', 'getMe', 'setMyCommands', 'deleteWebhook', 'getFile'}
+
+_priority = contextvars.ContextVar('send_priority', default=INTERACTIVE)
+_local = threading.local()
+_senders = {}  # токен бота -> OutboundSender (install)
+
+
+@contextmanager
+def send_priority(priority):
+    """Все запросы к API внутри блока отправляются с указанным приоритетом."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority():
+    """Приоритет отправки, заданный send_priority для текущего контекста."""
+    return _priority.get()
+
+
+def _route(method, url, **kwargs):
+    """CUSTOM_REQUEST_SENDER для telebot.apihelper: выбирает планировщик бота по токену в адресе запроса."""
+    # Адрес запроса: .../bot<token>/<method>
+    token = url.rsplit('/', 2)[-2][3:]
+    sender = _senders.get(token) or _senders.get(None) or next(iter(_senders.values()))
+    return sender._request(method, url, **kwargs)
+
+
+class TokenBucket:
+    def __init__(self, rate):
+        self.rate = rate
+        self.capacity = max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self):
+        """Через сколько секунд появится целый токен."""
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+
+class _Task:
+    __slots__ = ('fn', 'args', 'kwargs', 'future', 'priority', 'enqueued_at', 'context')
+
+    def __init__(self, fn, args, kwargs, priority):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+        # Контекст вызывающего потока (трейс апдейта) переносится в поток отправки
+        self.context = contextvars.copy_context()
+
+    def run(self):
+        waited = time.monotonic() - self.enqueued_at
+        now = time.time()
+        tracing.record_span('sender.queue_wait', now - waited, now, priority=PRIORITY_NAMES[self.priority])
+        return self.fn(*self.args, **self.kwargs)
+
+
+class OutboundSender:
+    def __init__(self, workers=config.WORKERS, global_rate=config.GLOBAL_RATE,
+                 broadcast_rate=config.BROADCAST_RATE, reserved_workers=config.RESERVED_WORKERS, transport=None,
+                 token=None, name='main'):
+        """
+        :param transport: transport_module.transport.Transport; без него используется сессия telebot
+        :param token: токен бота, запросы которого обслуживает планировщик (None - всех ботов процесса)
+        :param name: имя бота для потоков и метрик
+        """
+        self.workers = workers
+        self.transport = transport
+        self.token = token
+        self.name = name
+        self.reserved_workers = min(reserved_workers, workers - 1)
+        self._global = TokenBucket(global_rate)
+        self._broadcast = TokenBucket(min(broadcast_rate, global_rate))
+        self._queues = {INTERACTIVE: deque(), TRANSACTIONAL: deque()}
+        self._jobs = OrderedDict()  # id рассылки -> очередь ее задач
+        self._busy_broadcast = 0
+        self._paused_until = 0.0
+        self._stopped = False
+        self._cond = threading.Condition()
+        self._threads = []
+        # Время ожидания в очереди по классам приоритета (в общем реестре метрик процесса)
+        self.wait_time = {
+            priority: registry.histogram('sender.queue_wait', bot=name, priority=priority_name)
+            for priority, priority_name in PRIORITY_NAMES.items()
+        }
+
+    def start(self):
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f'Sender-{self.name}-{index}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=30):
+        """Дожидается выполнения поставленных задач и останавливает потоки."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+
+    def install(self):
+        """Направляет запросы telebot с токеном self.token (без токена - все запросы) через планировщик."""
+        from telebot import apihelper
+        _senders[self.token] = self
+        apihelper.CUSTOM_REQUEST_SENDER = _route
+
+    def submit(self, fn, *args, priority=INTERACTIVE, job=None, **kwargs):
+        """
+        Ставит fn(*args, **kwargs) в очередь. Возвращает Future.
+        Для priority=BROADCAST job - идентификатор рассылки, между рассылками лимит делится поровну.
+        """
+        task = _Task(fn, args, kwargs, priority)
+        with self._cond:
+            if priority == BROADCAST:
+                self._jobs.setdefault(job, deque()).append(task)
+            else:
+                self._queues[priority].append(task)
+            self._cond.notify()
+        return task.future
+
+    def call(self, fn, *args, priority=INTERACTIVE, **kwargs):
+        """Выполняет fn через очередь и возвращает результат (или пробрасывает исключение)."""
+        return self.submit(fn, *args, priority=priority, **kwargs).result()
+
+    def pause(self, seconds):
+        """Приостанавливает все отправки (Telegram ответил 429 Too Many Requests)."""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        logger.error(f'Telegram rate limit hit, pausing sends for {seconds}s')
+
+    def stats(self):
+        return {PRIORITY_NAMES[priority]: histogram.summary() for priority, histogram in self.wait_time.items()}
+
+    def _request(self, method, url, **kwargs):
+        """CUSTOM_REQUEST_SENDER для telebot.apihelper."""
+        if url.rsplit('/', 1)[-1] in UNTHROTTLED_METHODS:
+            return self._do_request(method, url, **kwargs)
+        task = getattr(_local, 'task', None)
+        if task is not None:
+            # Запрос из задачи планировщика: первый запрос оплачен токеном при выдаче задачи,
+            # каждый следующий (copyMessages и кнопка '👇' после альбома) берет свой токен
+            if _local.requests:
+                self._take_token(task.priority)
+            _local.requests += 1
+            return self._do_request(method, url, **kwargs)
+        return self.call(self._do_request, method, url, priority=current_priority(), **kwargs)
+
+    def try_take(self, priority):
+        """
+        Берет токен для запроса в обход очереди планировщика (AsyncSender того же бота делит с ним лимит).
+        Возвращает 0, если токен взят, иначе - через сколько секунд повторить.
+        """
+        with self._cond:
+            return self._take_locked(priority)
+
+    def _take_token(self, priority):
+        """Ждет токен для дополнительного запроса уже выполняющейся задачи."""
+        with self._cond:
+            while True:
+                wait = self._take_locked(priority)
+                if not wait:
+                    return
+                self._cond.wait(wait)
+
+    def _take_locked(self, priority):
+        now = time.monotonic()
+        self._global.refill(now)
+        self._broadcast.refill(now)
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self._global.tokens < 1:
+            return self._global.wait_time()
+        if priority == BROADCAST and self._broadcast.tokens < 1:
+            return self._broadcast.wait_time()
+        self._global.tokens -= 1
+        if priority == BROADCAST:
+            self._broadcast.tokens -= 1
+        return 0.0
+
+    def _do_request(self, method, url, **kwargs):
+        if self.transport is not None:
+            response = self.transport.request(method, url, **kwargs)
+        else:
+            from telebot import apihelper
+            response = apihelper._get_req_session().request(method, url, **kwargs)
+        if response.status_code == 429:
+            try:
+                retry_after = response.json().get('parameters', {}).get('retry_after', 1)
+            except ValueError:
+                retry_after = 1
+            self.pause(retry_after)
+        return response
+
+    def _next_task(self):
+        with self._cond:
+            while True:
+                has_work = any(self._queues.values()) or bool(self._jobs)
+                if self._stopped and not has_work:
+                    return None
+
+                now = time.monotonic()
+                self._global.refill(now)
+                self._broadcast.refill(now)
+                wait = 1.0
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif has_work and self._global.tokens < 1:
+                    wait = self._global.wait_time()
+                elif has_work:
+                    task = self._pop_task()
+                    if task is not None:
+                        self._global.tokens -= 1
+                        if task.priority == BROADCAST:
+                            self._broadcast.tokens -= 1
+                            self._busy_broadcast += 1
+                        return task
+                    wait = max(self._broadcast.wait_time(), 0.01)
+                self._cond.wait(wait)
+
+    def _pop_task(self):
+        for priority in (INTERACTIVE, TRANSACTIONAL):
+            if self._queues[priority]:
+                return self._queues[priority].popleft()
+
+        if not self._jobs or self._broadcast.tokens < 1:
+            return None
+        if self._busy_broadcast >= self.workers - self.reserved_workers:
+            return None
+
+        # Round-robin между рассылками
+        job, tasks = next(iter(self._jobs.items()))
+        task = tasks.popleft()
+        if tasks:
+            self._jobs.move_to_end(job)
+        else:
+            del self._jobs[job]
+        return task
+
+    def _worker(self):
+        while True:
+            task = self._next_task()
+            if task is None:
+                return
+            self.wait_time[task.priority].observe(time.monotonic() - task.enqueued_at)
+            _local.task = task
+            _local.requests = 0
+            try:
+                if task.future.set_running_or_notify_cancel():
+                    try:
+                        task.future.set_result(task.context.run(task.run))
+                    except BaseException as e:
+                        task.future.set_exception(e)
+            finally:
+                _local.task = None
+                if task.priority == BROADCAST:
+                    with self._cond:
+                        self._busy_broadcast -= 1
+                        self._cond.notify_all()
@@ -0,0 +1,6 @@
+import os
+
+# Как часто пополнять ежедневные агрегаты статистики (в минутах)
+ROLLUP_INTERVAL_MINUTES = float(os.environ.get('STATS_ROLLUP_INTERVAL_MINUTES', '10'))
+# Сколько последних недель показывать в разбивке /stats <период>
+REPORT_WEEKS = int(os.environ.get('STATS_REPORT_WEEKS', '8'))
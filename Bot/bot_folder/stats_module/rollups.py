@@ -0,0 +1,138 @@
+"""
+Статистика за период по ежедневным агрегатам (bot_daily_stats).
+
+RollupJob периодически пополняет агрегаты (Database.update_daily_rollups),
+а /stats <период> строит отчет только по ним, не сканируя users,
+purchases и transactions.
+"""
+import threading
+from datetime import date, timedelta
+
+import stats_module.config as config
+from functions_module import functions
+from logger_system import logger
+
+PERIODS = {
+    'week': 7, 'неделя': 7,
+    'month': 30, 'месяц': 30,
+    'quarter': 90, 'квартал': 90,
+    'year': 365, 'год': 365,
+}
+
+# Максимальный период отчета в днях
+MAX_PERIOD_DAYS = 3 * 365
+
+
+def parse_period(text):
+    """
+    Период отчета в днях: 'week'/'неделя', 'month', 'quarter', 'year'
+    или число с суффиксом d/w/m (14d, 4w, 3m). Бросает ValueError.
+    """
+    text = text.strip().lower()
+    if text in PERIODS:
+        return PERIODS[text]
+
+    multipliers = {'d': 1, 'д': 1, 'w': 7, 'н': 7, 'm': 30, 'м': 30}
+    multiplier = 1
+    if text and text[-1] in multipliers:
+        multiplier = multipliers[text[-1]]
+        text = text[:-1]
+    if not text.isdigit() or int(text) == 0:
+        raise ValueError(f'Unknown stats period: {text}')
+    return min(int(text) * multiplier, MAX_PERIOD_DAYS)
+
+
+class RollupJob:
+    def __init__(self, db, interval=config.ROLLUP_INTERVAL_MINUTES * 60):
+        self.db = db
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name='StatsRollup', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def run_once(self):
+        processed = self.db.update_daily_rollups()
+        if processed:
+            logger.info(f'Daily stats rollup processed: {processed}')
+        return processed
+
+    def _loop(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f'Daily stats rollup failed: {e}')
+            if self._stop.wait(self.interval):
+                return
+
+
+def _totals(rows, start_day, end_day):
+    totals = {'registrations': 0, 'purchases': 0, 'purchases_amount': 0.0, 'deposits': 0, 'deposits_amount': 0.0}
+    for row in rows:
+        if start_day <= row['day'] <= end_day:
+            for key in totals:
+                totals[key] += row[key]
+    return totals
+
+
+def _change(current, previous):
+    if not previous:
+        return ''
+    percent = (current - previous) / previous * 100
+    return f' ({"▲" if percent >= 0 else "▼"} {abs(percent):.0f}%)'
+
+
+def _format_number(num):
+    return '{:,}'.format(int(num)).replace(',', ' ')
+
+
+def build_report(db, days, today=None):
+    """Текст отчета /stats <период> (HTML) со сравнением с предыдущим периодом и разбивкой по неделям."""
+    today = today or date.today()
+    weeks = max(2, min(config.REPORT_WEEKS, days // 7))
+    history_days = max(2 * days, weeks * 7)
+    rows = db.get_daily_rollups(today - timedelta(days=history_days - 1), today)
+
+    start_day = today - timedelta(days=days - 1)
+    current = _totals(rows, start_day, today)
+    previous = _totals(rows, start_day - timedelta(days=days), start_day - timedelta(days=1))
+
+    lines = [
+        f'📊 <b>Статистика за {days} дн.</b> ({start_day.strftime("%d.%m.%Y")} – {today.strftime("%d.%m.%Y")})',
+        f'<i>Сравнение с предыдущими {days} дн.</i>\n',
+        f'👥 <b>Регистрации:</b> <code>{_format_number(current["registrations"])}</code>'
+        f'{_change(current["registrations"], previous["registrations"])}',
+        f'🛒 <b>Покупки:</b> <code>{_format_number(current["purchases"])}</code> на '
+        f'<code>{functions.format_money(current["purchases_amount"])}$</code>'
+        f'{_change(current["purchases_amount"], previous["purchases_amount"])}',
+        f'💳 <b>Пополнения:</b> <code>{_format_number(current["deposits"])}</code> на '
+        f'<code>{functions.format_money(current["deposits_amount"])}$</code>'
+        f'{_change(current["deposits_amount"], previous["deposits_amount"])}',
+        '',
+        '📅 <b>По неделям</b> (регистрации / покупки):',
+    ]
+
+    week_totals = []
+    for index in range(weeks):
+        week_end = today - timedelta(days=7 * index)
+        week_start = week_end - timedelta(days=6)
+        week_totals.append((week_start, week_end, _totals(rows, week_start, week_end)))
+
+    for index, (week_start, week_end, totals) in enumerate(week_totals):
+        previous_week = week_totals[index + 1][2] if index + 1 < len(week_totals) else None
+        lines.append(
+            f'• {week_start.strftime("%d.%m")}–{week_end.strftime("%d.%m")}: '
+            f'<code>{_format_number(totals["registrations"])}</code>'
+            f'{_change(totals["registrations"], previous_week["registrations"]) if previous_week else ""} / '
+            f'<code>{functions.format_money(totals["purchases_amount"])}$</code>'
+            f'{_change(totals["purchases_amount"], previous_week["purchases_amount"]) if previous_week else ""}'
+        )
+
+    lines.append(f'\n<i>Данные обновляются каждые {int(config.ROLLUP_INTERVAL_MINUTES)} мин.</i>')
+    return '\n'.join(lines)
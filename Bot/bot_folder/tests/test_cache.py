@@ -0,0 +1,77 @@
+"""
+LRU-кэш с временем жизни записей (account_module.cache.LRUCache).
+
+Запуск: python -m unittest discover -s tests (из Bot/bot_folder)
+"""
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from account_module.cache import LRUCache
+
+
+class _Loader:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, key):
+        self.calls.append(key)
+        return f'value {key} #{len(self.calls)}'
+
+
+class LRUCacheTest(unittest.TestCase):
+    def test_read_through(self):
+        cache, loader = LRUCache(10, 60), _Loader()
+        self.assertEqual(cache.get_or_load(1, loader), 'value 1 #1')
+        self.assertEqual(cache.get_or_load(1, loader), 'value 1 #1')
+        self.assertEqual(loader.calls, [1])
+        self.assertEqual(cache.stats(), {'size': 1, 'hits': 1, 'misses': 1})
+
+    def test_evicts_least_recently_read(self):
+        cache, loader = LRUCache(2, 60), _Loader()
+        cache.get_or_load(1, loader)
+        cache.get_or_load(2, loader)
+        cache.get_or_load(1, loader)  # 2 теперь читался давнее всех
+        cache.get_or_load(3, loader)
+        cache.get_or_load(1, loader)
+        cache.get_or_load(2, loader)
+        self.assertEqual(loader.calls, [1, 2, 3, 2])
+
+    def test_expired_entries_are_reloaded(self):
+        cache, loader = LRUCache(10, 5), _Loader()
+        with mock.patch('account_module.cache.time') as clock:
+            clock.monotonic.return_value = 100.0
+            cache.get_or_load(1, loader)
+            clock.monotonic.return_value = 104.0
+            self.assertEqual(cache.get_or_load(1, loader), 'value 1 #1')
+            clock.monotonic.return_value = 105.5
+            self.assertEqual(cache.get_or_load(1, loader), 'value 1 #2')
+
+    def test_invalidate(self):
+        cache, loader = LRUCache(10, 60), _Loader()
+        cache.get_or_load(1, loader)
+        cache.get_or_load(2, loader)
+        cache.invalidate(1)
+        cache.get_or_load(1, loader)
+        cache.get_or_load(2, loader)
+        self.assertEqual(loader.calls, [1, 2, 1])
+        cache.clear()
+        self.assertEqual(cache.stats()['size'], 0)
+
+    def test_value_loaded_during_invalidation_is_not_cached(self):
+        cache = LRUCache(10, 60)
+
+        def loader(key):
+            # Данные изменились, пока значение читалось из источника
+            cache.invalidate(key)
+            return 'stale'
+
+        self.assertEqual(cache.get_or_load(1, loader), 'stale')
+        self.assertEqual(cache.get_or_load(1, lambda key: 'fresh'), 'fresh')
+
+
+if __name__ == '__main__':
+    unittest.main()
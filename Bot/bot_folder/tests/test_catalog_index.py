@@ -0,0 +1,70 @@
+"""
+Поиск по индексу каталога для inline-режима (catalog_module.index.CatalogIndex).
+
+Запуск: python -m unittest discover -s tests (из Bot/bot_folder)
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog_module.index import CatalogIndex, tokenize
+
+
+def _item(service_id, name, description=''):
+    return {'service_id': service_id, 'service_name': name, 'service_description': description}
+
+
+def _ids(items):
+    return [item['service_id'] for item in items]
+
+
+class CatalogIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = CatalogIndex()
+        self.index.update([
+            _item(1, 'Telegram Premium 3 месяца', 'Подписка на премиум'),
+            _item(2, 'Telegram Stars 100', 'Звёзды для оплаты'),
+            _item(3, 'Spotify Premium', 'Музыка без рекламы'),
+            _item(4, 'Netflix', 'Фильмы и сериалы, premium-тариф'),
+        ])
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize('Звёзды, 100 шт.!'), ['звезды', '100', 'шт'])
+        self.assertEqual(tokenize(None), [])
+
+    def test_all_query_words_must_match(self):
+        self.assertEqual(_ids(self.index.search('telegram premium', 10)), [1])
+        self.assertEqual(_ids(self.index.search('spotify telegram', 10)), [])
+
+    def test_name_prefix_ranks_first(self):
+        # Совпадение в начале слова названия выше, чем только в описании; затем короче название
+        self.assertEqual(_ids(self.index.search('prem', 10)), [3, 1, 4])
+
+    def test_substring_and_short_prefix(self):
+        self.assertEqual(_ids(self.index.search('flix', 10)), [4])
+        self.assertEqual(_ids(self.index.search('te', 10)), [2, 1])
+        self.assertEqual(_ids(self.index.search('звезды', 10)), [2])
+
+    def test_long_word_checks_substring(self):
+        # Все триграммы 'premiumx' есть в индексе, но подстрокой слова он не является
+        self.index.update([_item(5, 'umx')])
+        self.assertEqual(self.index.search('premiumx', 10), [])
+
+    def test_limit_and_empty_query(self):
+        self.assertEqual(len(self.index.search('premium', 2)), 2)
+        self.assertEqual(self.index.search('  ...', 10), [])
+
+    def test_update_replaces_and_removes(self):
+        self.index.update([_item(2, 'Telegram Gifts')], removed_ids=[3])
+        self.assertEqual(len(self.index), 3)
+        self.assertEqual(self.index.search('stars', 10), [])
+        self.assertEqual(_ids(self.index.search('gifts', 10)), [2])
+        self.assertEqual(_ids(self.index.search('spotify', 10)), [])
+        # Ключи удаленных товаров не остаются в индексе
+        self.assertNotIn('spo', self.index._postings)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+"""
+Разбор файла /import и источник COPY (importer_module.importer).
+
+Запуск: python -m unittest discover -s tests (из Bot/bot_folder)
+"""
+import csv
+import io
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from importer_module.importer import CopySource, iter_rows
+
+
+def _copy(data, name='users.csv', size=-1):
+    """Все данные, которые COPY прочитает из CopySource, разобранные обратно из CSV."""
+    source = CopySource(iter_rows(io.BytesIO(data), name))
+    chunks = []
+    while True:
+        chunk = source.read(size)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    return source, list(csv.reader(io.StringIO(''.join(chunks))))
+
+
+class CopySourceTest(unittest.TestCase):
+    def test_csv_without_header(self):
+        source, rows = _copy(b'101,alice,Alice\n102\n103;x\n')
+        self.assertEqual(rows, [['101', 'alice', 'Alice'], ['102', '', '']])
+        self.assertEqual((source.parsed, source.invalid), (2, 1))
+
+    def test_csv_header_and_delimiter(self):
+        data = 'name;chat_id;username\n Анна ;101; anna \n;102;\n'.encode('utf-8-sig')
+        source, rows = _copy(data)
+        self.assertEqual(rows, [['101', 'anna', 'Анна'], ['102', '', '']])
+        self.assertEqual(source.invalid, 0)
+
+    def test_invalid_ids_are_skipped(self):
+        # Группы и каналы (отрицательные id), нули, текст и слишком большие числа
+        source, rows = _copy(b'-100123\n0\nabc\n9223372036854775808\n42\n')
+        self.assertEqual(rows, [['42', '', '']])
+        self.assertEqual((source.parsed, source.invalid), (1, 4))
+
+    def test_json_array(self):
+        data = b' [101, {"chat_id": "102", "first_name": "Bob"}, {"username": "x"}]'
+        source, rows = _copy(data, 'users.json')
+        self.assertEqual(rows, [['101', '', ''], ['102', '', 'Bob']])
+        self.assertEqual(source.invalid, 1)
+
+    def test_json_lines(self):
+        data = b'{"id": 101, "username": "a"}\n\nnot json\n102\n'
+        source, rows = _copy(data, 'users.jsonl')
+        self.assertEqual(rows, [['101', 'a', ''], ['102', '', '']])
+        self.assertEqual(source.invalid, 1)
+
+    def test_small_reads_return_every_row(self):
+        data = ''.join(f'{telegram_id},user{telegram_id}\n' for telegram_id in range(1, 1001)).encode()
+        source, rows = _copy(data, size=100)
+        self.assertEqual([int(row[0]) for row in rows], list(range(1, 1001)))
+        self.assertEqual(source.parsed, 1000)
+
+    def test_progress(self):
+        progress = []
+        source = CopySource(iter([(1, None, None), (2, None, None)]),
+                            lambda stage, parsed: progress.append((stage, parsed)), interval=0)
+        source.read()
+        self.assertEqual(progress, [('copy', 2)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+"""
+Персонализация рассылок: шаблон поста с полями получателя (mailing_module.personalize).
+
+Запуск: python -m unittest discover -s tests (из Bot/bot_folder)
+"""
+import os
+import sys
+import unittest
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mailing_module.personalize import Template, has_placeholders, iter_rendered, template_for
+
+
+class TemplateTest(unittest.TestCase):
+    def test_fields_and_columns(self):
+        template = Template('Привет, {first_name|друг}! Баланс: {balance}. {first_name}')
+        self.assertEqual(template.fields, ['first_name', 'balance'])
+        self.assertEqual(template.columns, ['u.first_name', 'u.balance'])
+
+    def test_render(self):
+        template = Template('Привет, {first_name|друг}! Баланс: {balance}')
+        self.assertEqual(template.render(('Анна', 12.5)), 'Привет, Анна! Баланс: 12.50')
+
+    def test_defaults_for_missing_values(self):
+        template = Template('Привет, {first_name|<b>друг</b>}! {username}')
+        self.assertEqual(template.render((None, '')), 'Привет, <b>друг</b>! ')
+        # Получатель не найден
+        self.assertEqual(template.render(None), 'Привет, <b>друг</b>! ')
+
+    def test_values_are_escaped(self):
+        template = Template('<b>{first_name}</b>')
+        self.assertEqual(template.render(('<script>&',)), '<b>&lt;script&gt;&amp;</b>')
+
+    def test_unknown_fields_and_percent_stay_as_is(self):
+        template = Template('Скидка 10% для {first_name}, код {promo}')
+        self.assertEqual(template.fields, ['first_name'])
+        self.assertEqual(template.render(('Анна',)), 'Скидка 10% для Анна, код {promo}')
+
+    def test_date_field(self):
+        template = Template('С нами с {join_date}')
+        self.assertEqual(template.render((datetime(2024, 3, 1, 12, 0),)), 'С нами с 01.03.2024')
+
+    def test_has_placeholders(self):
+        self.assertTrue(has_placeholders('Привет, {first_name}'))
+        self.assertFalse(has_placeholders('Привет, {promo}'))
+        self.assertFalse(has_placeholders(None))
+
+    def test_template_for(self):
+        self.assertIsNone(template_for({'content_data': {'text': 'hi'}}))
+        self.assertIsNone(template_for({'content_type': 'media_group', 'content_data': None}))
+        self.assertEqual(template_for({'content_data': {'template': '{username}'}}).fields, ['username'])
+
+    def test_iter_rendered(self):
+        template = Template('{first_name|друг}')
+        rows = [(1, 101, 'Анна'), (2, 102, None), (3, 103, 'Борис')]
+        self.assertEqual(list(iter_rendered(rows, template, batch_size=2)),
+                         [(1, 101, ('Анна',)), (2, 102, ('друг',)), (3, 103, ('Борис',))])
+        self.assertEqual(list(iter_rendered([(1, 101)], None)), [(1, 101, ())])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+"""
+Перезапуск polling сторожем зависаний (Bot.restart_polling).
+
+getMe и getUpdates подменены заглушками, сеть не используется.
+Запуск: python -m unittest discover -s tests (из Bot/bot_folder)
+"""
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telebot import TeleBot
+from telebot.types import User
+
+from bot import Bot
+from health_module.watchdog import UpdateLag
+
+TIMEOUT = 5
+
+
+class PollingRestartTest(unittest.TestCase):
+    def setUp(self):
+        self.calls = 0
+        self.cond = threading.Condition()
+
+        telebot = TeleBot('123456:test')
+        telebot.get_me = lambda: User(id=1, is_bot=True, first_name='test', username='test_bot')
+        telebot.get_updates = self._get_updates
+        # Bot без __init__: для polling нужны только telebot, UpdateLag и флаги остановки
+        self.bot = Bot.__new__(Bot)
+        self.bot.name = 'test'
+        self.bot.bot = telebot
+        self.bot.health = UpdateLag('test')
+        self.bot._restart_polling = threading.Event()
+        self.bot._stopping = False
+        telebot.process_new_updates = self.bot._process_new_updates
+
+        self.thread = threading.Thread(target=self.bot.run, daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        self.bot.stop()
+        self.thread.join(TIMEOUT)
+
+    def _get_updates(self, *args, **kwargs):
+        time.sleep(0.01)
+        with self.cond:
+            self.calls += 1
+            self.cond.notify_all()
+        return []
+
+    def _wait_for_calls(self, count):
+        with self.cond:
+            return self.cond.wait_for(lambda: self.calls >= count, TIMEOUT)
+
+    def test_restart_resumes_polling(self):
+        self.assertTrue(self._wait_for_calls(1))
+        for _ in range(2):
+            self.bot.restart_polling()
+            calls = self.calls
+            self.assertTrue(self._wait_for_calls(calls + 3), 'polling did not resume after restart')
+        self.assertTrue(self.thread.is_alive())
+        self.assertIsNotNone(self.bot.health.poll_age(time.monotonic()))
+
+    def test_stop_ends_run(self):
+        self.assertTrue(self._wait_for_calls(1))
+        self.bot.stop()
+        self.thread.join(TIMEOUT)
+        self.assertFalse(self.thread.is_alive())
+        self.assertIsNone(self.bot.health.poll_age(time.monotonic()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+"""
+Корзины токенов: лимит отправки (sender_module.sender.TokenBucket)
+и лимиты апдейтов на чат (ratelimit_module.limiter.ChatRateLimiter).
+
+Запуск: python -m unittest discover -s tests (из Bot/bot_folder)
+"""
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ratelimit_module.limiter import ChatRateLimiter
+from sender_module.sender import TokenBucket
+
+# Запас восстанавливается так медленно, что за время теста не появляется ни одного токена
+POLICIES = {
+    'start': (1e-6, 2, True),
+    'command': (1e-6, 3, False),
+    'message': (1e-6, 2, False),
+    'callback': (1e-6, 1, False),
+}
+
+_update_ids = iter(range(1, 10 ** 6))
+
+
+def _message(chat_id, text):
+    message = SimpleNamespace(text=text, chat=SimpleNamespace(id=chat_id))
+    return SimpleNamespace(update_id=next(_update_ids), message=message, callback_query=None)
+
+
+def _callback(chat_id, data):
+    call = SimpleNamespace(data=data, message=SimpleNamespace(chat=SimpleNamespace(id=chat_id)), from_user=None)
+    return SimpleNamespace(update_id=next(_update_ids), message=None, callback_query=call)
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_starts_full_and_refills_to_capacity(self):
+        bucket = TokenBucket(5)
+        self.assertEqual(bucket.tokens, 5)
+        bucket.tokens = 0
+        bucket.refill(bucket.updated_at + 0.4)
+        self.assertAlmostEqual(bucket.tokens, 2)
+        bucket.refill(bucket.updated_at + 10)
+        self.assertEqual(bucket.tokens, 5)
+
+    def test_wait_time(self):
+        bucket = TokenBucket(4)
+        self.assertEqual(bucket.wait_time(), 0)
+        bucket.tokens = 0.5
+        self.assertAlmostEqual(bucket.wait_time(), 0.125)
+
+    def test_slow_rate_keeps_one_token_capacity(self):
+        bucket = TokenBucket(0.5)
+        self.assertEqual(bucket.capacity, 1)
+        bucket.tokens = 0
+        self.assertAlmostEqual(bucket.wait_time(), 2)
+
+
+class ChatRateLimiterTest(unittest.TestCase):
+    def setUp(self):
+        self.limiter = ChatRateLimiter(POLICIES, exempt_chat_ids={1})
+
+    def test_burst_then_throttle(self):
+        updates = [_message(10, f'text {index}') for index in range(4)]
+        self.assertEqual(self.limiter.filter(updates), updates[:2])
+        self.assertEqual(self.limiter.throttled['message'], 2)
+
+    def test_chats_are_limited_separately(self):
+        self.assertEqual(len(self.limiter.filter([_message(10, 'a'), _message(10, 'b')])), 2)
+        self.assertEqual(len(self.limiter.filter([_message(11, 'a'), _message(10, 'c')])), 1)
+
+    def test_command_policies(self):
+        # У /start своя политика, остальные команды делят 'command'; /help@bot - тоже команда
+        updates = [_message(10, '/help@shop_bot'), _message(10, '/balance'), _message(10, '/orders 5'),
+                   _message(10, '/balance')]
+        self.assertEqual(self.limiter.filter(updates), updates[:3])
+        self.assertEqual(self.limiter.throttled['command'], 1)
+        self.assertEqual(len(self.limiter.filter([_message(10, '/start')])), 1)
+
+    def test_coalesce_repeats_in_one_batch(self):
+        updates = [_message(10, '/start'), _message(10, '/start'), _message(11, '/start')]
+        self.assertEqual(self.limiter.filter(updates), [updates[0], updates[2]])
+        self.assertEqual(self.limiter.coalesced['start'], 1)
+        # В следующем пакете /start того же чата снова расходует запас
+        self.assertEqual(len(self.limiter.filter([_message(10, '/start')])), 1)
+        self.assertEqual(len(self.limiter.filter([_message(10, '/start')])), 0)
+
+    def test_callbacks(self):
+        updates = [_callback(10, 'mail_confirm'), _callback(10, 'mail_cancel')]
+        self.assertEqual(self.limiter.filter(updates), updates[:1])
+
+    def test_exempt_chats_and_other_updates_pass(self):
+        other = SimpleNamespace(update_id=next(_update_ids), message=None, callback_query=None)
+        updates = [_message(1, str(index)) for index in range(10)] + [other]
+        self.assertEqual(self.limiter.filter(updates), updates)
+
+    def test_refill(self):
+        limiter = ChatRateLimiter({'message': (1, 2, False)})
+        policy = limiter.policies['message']
+        self.assertTrue(limiter._take(policy, 10, 100.0))
+        self.assertTrue(limiter._take(policy, 10, 100.0))
+        self.assertFalse(limiter._take(policy, 10, 100.5))
+        self.assertTrue(limiter._take(policy, 10, 101.0))
+
+    def test_expire_drops_refilled_chats(self):
+        limiter = ChatRateLimiter({'message': (1, 2, False)})
+        policy = limiter.policies['message']
+        limiter._take(policy, 10, 100.0)
+        limiter._take(policy, 11, 100.0)
+        limiter._take(policy, 11, 100.0)
+        limiter._expire(101.5)
+        self.assertEqual(list(limiter._buckets), [('message', 11)])
+
+
+if __name__ == '__main__':
+    unittest.main()
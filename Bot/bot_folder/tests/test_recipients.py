@@ -0,0 +1,131 @@
+"""
+Состояние доставки рассылки (RecipientLog) и продолжение прерванной рассылки (deliver).
+
+Отправки выполняются заглушкой планировщика синхронно, база - заглушка iter_recipients.
+Запуск: python -m unittest discover -s tests (из Bot/bot_folder)
+"""
+import os
+import sys
+import tempfile
+import unittest
+from concurrent.futures import Future
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mailing_module.delivery import deliver
+from mailing_module.recipients import BLOCKED, FAILED, PENDING, RETRYING, SENT, RecipientLog
+
+
+class _Sender:
+    """OutboundSender, выполняющий отправку сразу в вызывающем потоке."""
+
+    def submit(self, fn, *args, priority=None, job=None, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+class _Recipients:
+    """Database с одним методом iter_recipients: получатели 1..count (users.id = telegram_id)."""
+
+    def __init__(self, count):
+        self.count = count
+
+    def iter_recipients(self, where, batch_size=1000, start_after=0, end_id=None, columns=()):
+        end_id = self.count if end_id is None else end_id
+        return ((user_id, user_id) for user_id in range(start_after + 1, end_id + 1))
+
+
+class RecipientLogTest(unittest.TestCase):
+    def test_add_mark_count(self):
+        log = RecipientLog()
+        for user_id in (10, 20, 30, 40):
+            log.add(user_id)
+        log.mark(0, SENT)
+        log.mark(1, BLOCKED)
+        log.mark(3, SENT)
+        self.assertEqual(len(log), 4)
+        self.assertEqual(log.counts(), {'pending': 1, 'sent': 2, 'failed': 0, 'blocked': 1, 'retrying': 0})
+        self.assertEqual(log.indexes_with(SENT), [0, 3])
+        self.assertEqual(log.indexes_with(PENDING), [2])
+
+    def test_save_load_roundtrip(self):
+        log = RecipientLog()
+        for user_id, status in ((1, SENT), (2 ** 40, FAILED), (7, RETRYING)):
+            log.mark(log.add(user_id), status)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'mailing.log')
+            log.save(path)
+            loaded = RecipientLog.load(path)
+        self.assertEqual(list(loaded.ids), [1, 2 ** 40, 7])
+        self.assertEqual(bytes(loaded.statuses), bytes([SENT, FAILED, RETRYING]))
+
+    def test_save_prefix(self):
+        log = RecipientLog()
+        for user_id in range(5):
+            log.add(user_id, SENT)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'mailing.log')
+            log.save(path, length=3)
+            self.assertEqual(list(RecipientLog.load(path).ids), [0, 1, 2])
+
+    def test_load_rejects_other_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'other.bin')
+            with open(path, 'wb') as file:
+                file.write(b'\0' * 32)
+            with self.assertRaises(ValueError):
+                RecipientLog.load(path)
+
+
+class ResumeTest(unittest.TestCase):
+    def test_resume_sends_each_recipient_once(self):
+        sent = []
+        positions = []
+
+        def send(user_id):
+            sent.append(user_id)
+
+        with tempfile.TemporaryDirectory() as directory:
+            checkpoint = os.path.join(directory, 'mailing.log')
+            # Первый запуск прерывается после 5 отправок
+            first = deliver(_Recipients(12), _Sender(), send, on_progress=positions.append,
+                            should_stop=lambda: len(sent) >= 5, checkpoint=checkpoint)
+            self.assertFalse(first['finished'])
+            self.assertEqual(positions[-1], 5)
+
+            log = RecipientLog.load(checkpoint)
+            second = deliver(_Recipients(12), _Sender(), send, start_after=positions[-1], log=log,
+                             checkpoint=checkpoint)
+            self.assertTrue(second['finished'])
+            self.assertEqual(len(RecipientLog.load(checkpoint)), 12)
+
+        self.assertEqual(sent, list(range(1, 13)))
+        self.assertEqual(second['successful'], 12)
+        self.assertEqual(second['failed'], 0)
+
+    def test_rate_limited_recipients_are_retried_once(self):
+        attempts = {}
+
+        def send(user_id):
+            attempts[user_id] = attempts.get(user_id, 0) + 1
+            if user_id == 2 and attempts[user_id] == 1:
+                raise Exception('Error code: 429. Description: Too Many Requests')
+            if user_id == 3:
+                raise Exception('Error code: 403. Description: Forbidden: bot was blocked by the user')
+            if user_id == 4:
+                raise Exception('Error code: 429. Description: Too Many Requests')
+
+        result = deliver(_Recipients(4), _Sender(), send)
+        self.assertEqual(attempts, {1: 1, 2: 2, 3: 1, 4: 2})
+        self.assertEqual(result['successful'], 2)
+        self.assertEqual(result['blocked'], 1)
+        self.assertEqual(result['failed'], 2)
+        self.assertEqual(result['log'].counts()['failed'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+"""
+Компиляция сегментов аудитории рассылки в SQL (mailing_module.segments).
+
+Запуск: python -m unittest discover -s tests (из Bot/bot_folder)
+"""
+import os
+import sys
+import unittest
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mailing_module.segments import SEGMENTS, compile_segments, describe_segments
+
+
+class CompileSegmentsTest(unittest.TestCase):
+    def test_no_segments_selects_all_users(self):
+        self.assertEqual(compile_segments([]), ('u.telegram_id IS NOT NULL', []))
+        self.assertEqual(compile_segments(None), ('u.telegram_id IS NOT NULL', []))
+
+    def test_segments_are_joined_with_and(self):
+        since = date(2024, 1, 15)
+        where, params = compile_segments([('joined', 7), ('balance', None), ('purchased', since)])
+        self.assertEqual(where.count(' AND ('), 3)
+        self.assertIn(f'({SEGMENTS["balance"].condition})', where)
+        # Параметры только у сегментов со значением и в порядке сегментов
+        self.assertEqual(params, [7, since])
+        self.assertEqual(where.count('%s'), len(params))
+
+    def test_purchased_counts_only_completed(self):
+        self.assertIn("p.status = 'completed'", SEGMENTS['purchased'].condition)
+
+    def test_storefront_audience(self):
+        where, params = compile_segments([('spent', 10.0)], ['second', False])
+        self.assertIn('bot_user_storefronts', where)
+        self.assertNotIn('NOT EXISTS', where)
+        # Условие витрины идет первым, его параметр - тоже
+        self.assertEqual(params, ['second', 10.0])
+        self.assertEqual(where.count('%s'), len(params))
+
+    def test_primary_storefront_includes_unassigned_users(self):
+        where, params = compile_segments([], ['main', True])
+        self.assertIn('NOT EXISTS', where)
+        self.assertEqual(params, ['main'])
+        self.assertEqual(where.count('%s'), 1)
+
+    def test_unknown_segment(self):
+        with self.assertRaises(KeyError):
+            compile_segments([('unknown', 1)])
+
+
+class ParseTest(unittest.TestCase):
+    def test_parse_values(self):
+        self.assertEqual(SEGMENTS['joined'].parse(' 30 '), 30)
+        self.assertEqual(SEGMENTS['spent'].parse('12,5'), 12.5)
+        self.assertEqual(SEGMENTS['purchased'].parse('01.02.2024'), date(2024, 2, 1))
+
+    def test_parse_rejects_invalid(self):
+        for key, text in (('joined', '0'), ('joined', 'abc'), ('spent', 'ten'), ('purchased', '2024-02-01')):
+            with self.subTest(key=key, text=text), self.assertRaises(ValueError):
+                SEGMENTS[key].parse(text)
+
+    def test_describe(self):
+        self.assertEqual(describe_segments([]), 'все пользователи')
+        self.assertEqual(describe_segments([('purchased', date(2024, 2, 1)), ('balance', None)]),
+                         'покупали с 01.02.2024, баланс больше 0')
+
+
+if __name__ == '__main__':
+    unittest.main()
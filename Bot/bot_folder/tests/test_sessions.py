@@ -0,0 +1,41 @@
+"""
+Время жизни сессий /mail и их gauge в реестре метрик (mailing_module.sessions).
+
+Запуск: python -m unittest discover -s tests (из Bot/bot_folder)
+"""
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mailing_module.sessions import SessionStore, SessionSweeper
+from metrics_module.metrics import registry
+
+
+class SessionSweeperTest(unittest.TestCase):
+    def test_sweep_expires_idle_sessions_and_updates_gauges(self):
+        sessions, timers, expired = SessionStore(), {}, []
+        sweeper = SessionSweeper(sessions, timers, ttl=60, interval=10, on_expire=expired.append, name='test_shop')
+        with mock.patch('mailing_module.sessions.time') as clock:
+            clock.monotonic.return_value = 100.0
+            sessions[1] = {'step': 'content'}
+            sessions[2] = {'step': 'confirm', 'content_data': {'text': 'x' * 1000}}
+            timers[3] = mock.Mock()
+            clock.monotonic.return_value = 150.0
+            sessions.get(2)
+            clock.monotonic.return_value = 170.0
+            self.assertEqual(sweeper.sweep(), 1)
+
+        self.assertEqual(expired, [1])
+        self.assertEqual(list(sessions), [2])
+        self.assertNotIn(3, timers)
+        snapshot = registry.snapshot()
+        self.assertEqual(snapshot['mailing.sessions{bot=test_shop}'], 1)
+        self.assertEqual(snapshot['mailing.session_timers{bot=test_shop}'], 0)
+        self.assertGreater(snapshot['mailing.sessions_bytes{bot=test_shop}'], 1000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,10 @@
+import os
+
+# Файл трейсов (формат Chrome Trace Event, открывается в Perfetto / chrome://tracing); пусто - трейсинг выключен
+TRACE_FILE = os.environ.get('TRACE_FILE', '')
+# Доля апдейтов, трейсы которых записываются всегда
+TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', '0.01'))
+# Трейсы апдейтов медленнее этого порога (мс) записываются независимо от TRACE_SAMPLE_RATE
+TRACE_SLOW_MS = float(os.environ.get('TRACE_SLOW_MS', '500'))
+# Максимум спанов, ожидающих записи в файл; лишние отбрасываются
+TRACE_QUEUE_MAXSIZE = int(os.environ.get('TRACE_QUEUE_MAXSIZE', '10000'))
@@ -0,0 +1,169 @@
+"""
+Легковесный трейсинг обработки апдейтов.
+
+Для каждого апдейта создается трейс: ожидание в очереди обработчиков,
+сам обработчик, запросы к базам данных и вызовы Telegram API (в т.ч.
+ожидание в очереди OutboundSender). Спаны трейса копятся в памяти и при
+завершении апдейта записываются в TRACE_FILE в формате Chrome Trace Event
+(JSON-массив событий "ph": "X"; файл открывается в Perfetto или chrome://tracing).
+
+Записываются трейсы доли TRACE_SAMPLE_RATE апдейтов и все трейсы медленнее
+TRACE_SLOW_MS, поэтому медленный апдейт можно разобрать после факта.
+Если TRACE_FILE не задан, span() и trace() ничего не делают.
+"""
+import atexit
+import contextvars
+import json
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import tracing_module.config as config
+
+ENABLED = bool(config.TRACE_FILE)
+
+_current = contextvars.ContextVar('trace_span', default=None)
+_ids = iter(range(1, 1 << 62))
+_ids_lock = threading.Lock()
+
+
+def _next_id():
+    with _ids_lock:
+        return next(_ids)
+
+
+class _Trace:
+    __slots__ = ('trace_id', 'spans', 'sampled')
+
+    def __init__(self, sampled):
+        self.trace_id = f'{os.getpid():x}-{_next_id():x}'
+        self.spans = []
+        self.sampled = sampled
+
+
+class _Span:
+    __slots__ = ('trace', 'name', 'span_id', 'parent_id', 'start', 'attrs')
+
+    def __init__(self, trace, name, parent_id, start, attrs):
+        self.trace = trace
+        self.name = name
+        self.span_id = _next_id()
+        self.parent_id = parent_id
+        self.start = start
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def finish(self, end):
+        self.trace.spans.append({
+            'name': self.name,
+            'cat': self.name.split('.', 1)[0],
+            'ph': 'X',
+            'ts': round(self.start * 1e6),
+            'dur': round((end - self.start) * 1e6),
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'args': {
+                'trace_id': self.trace.trace_id,
+                'span_id': self.span_id,
+                'parent_id': self.parent_id,
+                **self.attrs,
+            },
+        })
+
+
+class SpanExporter:
+    """Пишет спаны в файл из фонового потока, не задерживая обработчики."""
+
+    def __init__(self, path, maxsize):
+        self.path = path
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._thread = threading.Thread(target=self._run, name='TraceExporter', daemon=True)
+        self._thread.start()
+
+    def export(self, spans):
+        for span in spans:
+            try:
+                self._queue.put_nowait(span)
+            except queue.Full:
+                self.dropped += 1
+
+    def _run(self):
+        # Формат допускает незакрытый массив, поэтому события можно дописывать в файл
+        new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        with open(self.path, 'a', encoding='utf-8') as file:
+            if new_file:
+                file.write('[\n')
+            while True:
+                span = self._queue.get()
+                if span is None:
+                    file.flush()
+                    return
+                file.write(json.dumps(span, ensure_ascii=False, default=str) + ',\n')
+                if self._queue.empty():
+                    file.flush()
+
+    def shutdown(self, timeout=5):
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+
+exporter = SpanExporter(config.TRACE_FILE, config.TRACE_QUEUE_MAXSIZE) if ENABLED else None
+if exporter:
+    atexit.register(exporter.shutdown)
+
+
+@contextmanager
+def trace(name, start_time=None, **attrs):
+    """
+    Корневой спан трейса (один на апдейт). start_time - unix time начала,
+    если трейс начался раньше входа в блок (например, при получении апдейта).
+    """
+    if not ENABLED or _current.get() is not None:
+        with span(name, **attrs) as current:
+            yield current
+        return
+
+    root = _Span(_Trace(random.random() < config.TRACE_SAMPLE_RATE), name, None,
+                 start_time or time.time(), attrs)
+    token = _current.set(root)
+    try:
+        yield root
+    finally:
+        _current.reset(token)
+        end = time.time()
+        root.finish(end)
+        if root.trace.sampled or (end - root.start) * 1000 >= config.TRACE_SLOW_MS:
+            exporter.export(root.trace.spans)
+
+
+@contextmanager
+def span(name, **attrs):
+    """Дочерний спан текущего трейса; вне трейса ничего не делает."""
+    parent = _current.get() if ENABLED else None
+    if parent is None:
+        yield None
+        return
+
+    current = _Span(parent.trace, name, parent.span_id, time.time(), attrs)
+    token = _current.set(current)
+    try:
+        yield current
+    finally:
+        _current.reset(token)
+        current.finish(time.time())
+
+
+def record_span(name, start_time, end_time, **attrs):
+    """Добавляет в текущий трейс спан с известными временами начала и конца (unix time)."""
+    parent = _current.get() if ENABLED else None
+    if parent is not None:
+        _Span(parent.trace, name, parent.span_id, start_time, attrs).finish(end_time)
@@ -0,0 +1,11 @@
+import os
+
+# Размер пула соединений с Telegram API (0 - по числу потоков отправки + соединение long polling)
+POOL_SIZE = int(os.environ.get('TRANSPORT_POOL_SIZE', '0'))
+# Таймауты запросов к Telegram API в секундах: установка соединения и ожидание ответа
+CONNECT_TIMEOUT = float(os.environ.get('TRANSPORT_CONNECT_TIMEOUT', '5'))
+READ_TIMEOUT = float(os.environ.get('TRANSPORT_READ_TIMEOUT', '30'))
+# Кэширование DNS api.telegram.org (время жизни записи в секундах, 0 - выключено)
+DNS_CACHE_TTL = float(os.environ.get('TRANSPORT_DNS_CACHE_TTL', '0'))
+# Адрес Bot API (например, локальный Bot API сервер): формат telebot, https://host/bot{0}/{1}
+API_URL = os.environ.get('TELEGRAM_API_URL') or None
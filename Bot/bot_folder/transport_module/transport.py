@@ -0,0 +1,122 @@
+"""
+HTTP-транспорт запросов к Telegram API.
+
+Одна requests.Session с пулом keep-alive соединений, размер которого равен
+числу параллельных отправок: при рассылке соединения и TLS-сессии
+переиспользуются, а не устанавливаются заново. Таймаут установки соединения
+отделен от таймаута ответа. Время каждого запроса пишется в гистограмму
+по методу API.
+
+Сравнение с сессиями telebot по умолчанию: bench_module/transport.py.
+"""
+import socket
+import threading
+import time
+from urllib.parse import urlsplit
+
+import transport_module.config as config
+from logger_system import logger
+from metrics_module.metrics import registry
+from tracing_module import tracing
+
+TELEGRAM_HOST = 'api.telegram.org'
+
+
+class DnsCache:
+    """Кэширует socket.getaddrinfo для указанных хостов на ttl секунд."""
+
+    def __init__(self, ttl, hosts):
+        self.ttl = ttl
+        self.hosts = set(hosts)
+        self._cache = {}
+        self._lock = threading.Lock()
+        self._getaddrinfo = None
+
+    def install(self):
+        self._getaddrinfo = socket.getaddrinfo
+        socket.getaddrinfo = self.getaddrinfo
+
+    def getaddrinfo(self, host, *args, **kwargs):
+        if host not in self.hosts:
+            return self._getaddrinfo(host, *args, **kwargs)
+
+        key = (host, args, tuple(sorted(kwargs.items())))
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(key)
+        if cached and cached[0] > now:
+            return cached[1]
+
+        result = self._getaddrinfo(host, *args, **kwargs)
+        with self._lock:
+            self._cache[key] = (now + self.ttl, result)
+        return result
+
+
+class Transport:
+    def __init__(self, pool_size, connect_timeout=config.CONNECT_TIMEOUT, read_timeout=config.READ_TIMEOUT,
+                 dns_cache_ttl=config.DNS_CACHE_TTL, api_url=config.API_URL):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.api_url = api_url
+
+        self.session = requests.Session()
+        # pool_block: при занятом пуле поток ждет свободное соединение,
+        # а не открывает лишнее, которое потом будет закрыто
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.dns_cache = None
+        if dns_cache_ttl:
+            hosts = {TELEGRAM_HOST}
+            if api_url:
+                hosts.add(urlsplit(api_url).hostname)
+            self.dns_cache = DnsCache(dns_cache_ttl, hosts)
+
+        # Время запросов по методам API (в общем реестре метрик процесса)
+        self.timings = {}
+
+    def install(self):
+        """Настраивает telebot.apihelper на таймауты и адрес API транспорта."""
+        from telebot import apihelper
+        apihelper.CONNECT_TIMEOUT = self.connect_timeout
+        apihelper.READ_TIMEOUT = self.read_timeout
+        if self.api_url:
+            apihelper.API_URL = self.api_url
+        if self.dns_cache:
+            self.dns_cache.install()
+        logger.info(f'Telegram transport: pool={self.pool_size}, connect_timeout={self.connect_timeout}s, '
+                    f'read_timeout={self.read_timeout}s, dns_cache={bool(self.dns_cache)}')
+
+    def request(self, method, url, timeout=None, **kwargs):
+        """Выполняет запрос (сигнатура CUSTOM_REQUEST_SENDER telebot)."""
+        if isinstance(timeout, tuple):
+            # telebot подставляет read timeout и в connect, если у метода свой таймаут
+            timeout = (min(timeout[0], self.connect_timeout), timeout[1])
+        else:
+            timeout = (self.connect_timeout, timeout or self.read_timeout)
+
+        api_method = url.rsplit('/', 1)[-1]
+        started_at = time.perf_counter()
+        try:
+            with tracing.span(f'telegram.{api_method}') as current:
+                response = self.session.request(method, url, timeout=timeout, **kwargs)
+                if current:
+                    current.set(status=response.status_code)
+                return response
+        finally:
+            self._histogram(api_method).observe(time.perf_counter() - started_at)
+
+    def _histogram(self, api_method):
+        histogram = self.timings.get(api_method)
+        if histogram is None:
+            histogram = self.timings.setdefault(api_method, registry.histogram('telegram.request', method=api_method))
+        return histogram
+
+    def stats(self):
+        return {api_method: histogram.summary() for api_method, histogram in list(self.timings.items())}
@@ -0,0 +1,50 @@
+-- Миграция: /balance и /orders в боте
+-- Покрывающие индексы: запросы Database.get_account выполняются только по индексам (index-only scan).
+-- Триггеры вызывают NOTIFY bot_user_changed с telegram_id пользователя, чьи баланс, покупки
+-- или транзакции изменились: бот сбрасывает запись кэша этого пользователя (Bot/bot_folder/account_module).
+
+CREATE INDEX IF NOT EXISTS idx_users_telegram_id_account ON users (telegram_id) INCLUDE (id, balance, total_spent);
+
+CREATE INDEX IF NOT EXISTS idx_purchases_user_id_purchase_date_account
+    ON purchases (user_id, purchase_date) INCLUDE (service_name, amount, currency, status);
+
+CREATE INDEX IF NOT EXISTS idx_transactions_user_id_deposits_account
+    ON transactions (user_id, created_at) INCLUDE (amount)
+    WHERE type = 'deposit' AND status = 'completed';
+
+-- Покрывающие индексы заменяют индексы с тем же ключом: idx_users_telegram_id
+-- (telegram_id уже проиндексирован ограничением UNIQUE) и idx_purchases_user_id_purchase_date,
+-- который создавали прежние версии migration_add_bot_mailing_segments.sql
+DROP INDEX IF EXISTS idx_users_telegram_id;
+DROP INDEX IF EXISTS idx_purchases_user_id_purchase_date;
+
+CREATE OR REPLACE FUNCTION bot_notify_user_changed() RETURNS TRIGGER AS $$
+DECLARE
+    changed_telegram_id BIGINT;
+BEGIN
+    IF TG_TABLE_NAME = 'users' THEN
+        changed_telegram_id := NEW.telegram_id;
+    ELSE
+        SELECT telegram_id INTO changed_telegram_id FROM users WHERE id = NEW.user_id;
+    END IF;
+    IF changed_telegram_id IS NOT NULL THEN
+        PERFORM pg_notify('bot_user_changed', changed_telegram_id::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS bot_user_changed ON users;
+CREATE TRIGGER bot_user_changed
+    AFTER INSERT OR UPDATE OF telegram_id, balance, total_spent ON users
+    FOR EACH ROW EXECUTE FUNCTION bot_notify_user_changed();
+
+DROP TRIGGER IF EXISTS bot_user_changed ON purchases;
+CREATE TRIGGER bot_user_changed
+    AFTER INSERT OR UPDATE OF status ON purchases
+    FOR EACH ROW EXECUTE FUNCTION bot_notify_user_changed();
+
+DROP TRIGGER IF EXISTS bot_user_changed ON transactions;
+CREATE TRIGGER bot_user_changed
+    AFTER INSERT OR UPDATE OF status ON transactions
+    FOR EACH ROW EXECUTE FUNCTION bot_notify_user_changed();
@@ -0,0 +1,98 @@
+-- Миграция: Ежедневные агрегаты статистики для бота
+-- Таблица bot_daily_stats пополняется инкрементально (Bot/bot_folder/stats_module/rollups.py):
+-- каждый запуск обрабатывает только строки users, purchases и transactions с id больше водяного знака.
+-- Знак сдвигается до кандидата pending_id только после завершения всех транзакций, идущих
+-- в момент его чтения (pending_xmax - xmax того снимка): строка с меньшим id, вставленная
+-- в долгой транзакции, становится видимой раньше, чем знак ее пропустит.
+-- Покупки и пополнения учитываются в статусе на момент пересчета; если статус уже учтенной строки
+-- меняется (pending -> completed, completed -> failed), триггеры сразу исправляют агрегат ее дня.
+
+CREATE TABLE IF NOT EXISTS bot_daily_stats (
+    day DATE PRIMARY KEY,
+    registrations INTEGER DEFAULT 0,
+    purchases INTEGER DEFAULT 0,
+    purchases_amount DECIMAL(15, 2) DEFAULT 0,
+    deposits INTEGER DEFAULT 0,
+    deposits_amount DECIMAL(15, 2) DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Водяные знаки: последний учтенный id каждой исходной таблицы и следующий кандидат
+CREATE TABLE IF NOT EXISTS bot_rollup_watermarks (
+    source VARCHAR(50) PRIMARY KEY,
+    last_id INTEGER NOT NULL DEFAULT 0,
+    pending_id INTEGER,
+    pending_xmax BIGINT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+ALTER TABLE bot_rollup_watermarks ADD COLUMN IF NOT EXISTS pending_id INTEGER;
+ALTER TABLE bot_rollup_watermarks ADD COLUMN IF NOT EXISTS pending_xmax BIGINT;
+
+INSERT INTO bot_rollup_watermarks (source)
+VALUES ('users'), ('purchases'), ('transactions')
+ON CONFLICT (source) DO NOTHING;
+
+-- Смена статуса уже учтенной покупки или пополнения (id не больше водяного знака)
+CREATE OR REPLACE FUNCTION bot_rollup_purchase_status() RETURNS TRIGGER AS $$
+DECLARE
+    watermark INTEGER;
+    delta INTEGER;
+BEGIN
+    -- FOR SHARE ждет идущего пересчета: после него строка либо учтена уже в новом статусе,
+    -- либо знак еще не дошел до нее
+    SELECT last_id INTO watermark FROM bot_rollup_watermarks WHERE source = 'purchases' FOR SHARE;
+    IF watermark IS NULL OR NEW.id > watermark OR NEW.purchase_date IS NULL THEN
+        RETURN NULL;
+    END IF;
+    delta := (CASE WHEN NEW.status = 'completed' THEN 1 ELSE 0 END)
+           - (CASE WHEN OLD.status = 'completed' THEN 1 ELSE 0 END);
+    IF delta <> 0 THEN
+        INSERT INTO bot_daily_stats (day, purchases, purchases_amount, updated_at)
+        VALUES (NEW.purchase_date::date, delta, delta * NEW.amount, NOW())
+        ON CONFLICT (day) DO UPDATE
+        SET purchases = bot_daily_stats.purchases + EXCLUDED.purchases,
+            purchases_amount = bot_daily_stats.purchases_amount + EXCLUDED.purchases_amount,
+            updated_at = NOW();
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION bot_rollup_deposit_status() RETURNS TRIGGER AS $$
+DECLARE
+    watermark INTEGER;
+    delta INTEGER;
+BEGIN
+    IF NEW.type IS DISTINCT FROM 'deposit' THEN
+        RETURN NULL;
+    END IF;
+    SELECT last_id INTO watermark FROM bot_rollup_watermarks WHERE source = 'transactions' FOR SHARE;
+    IF watermark IS NULL OR NEW.id > watermark OR NEW.created_at IS NULL THEN
+        RETURN NULL;
+    END IF;
+    delta := (CASE WHEN NEW.status = 'completed' THEN 1 ELSE 0 END)
+           - (CASE WHEN OLD.status = 'completed' THEN 1 ELSE 0 END);
+    IF delta <> 0 THEN
+        INSERT INTO bot_daily_stats (day, deposits, deposits_amount, updated_at)
+        VALUES (NEW.created_at::date, delta, delta * NEW.amount, NOW())
+        ON CONFLICT (day) DO UPDATE
+        SET deposits = bot_daily_stats.deposits + EXCLUDED.deposits,
+            deposits_amount = bot_daily_stats.deposits_amount + EXCLUDED.deposits_amount,
+            updated_at = NOW();
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS bot_rollup_purchase_status ON purchases;
+CREATE TRIGGER bot_rollup_purchase_status
+    AFTER UPDATE OF status ON purchases
+    FOR EACH ROW WHEN (OLD.status IS DISTINCT FROM NEW.status)
+    EXECUTE FUNCTION bot_rollup_purchase_status();
+
+DROP TRIGGER IF EXISTS bot_rollup_deposit_status ON transactions;
+CREATE TRIGGER bot_rollup_deposit_status
+    AFTER UPDATE OF status ON transactions
+    FOR EACH ROW WHEN (OLD.status IS DISTINCT FROM NEW.status)
+    EXECUTE FUNCTION bot_rollup_deposit_status();
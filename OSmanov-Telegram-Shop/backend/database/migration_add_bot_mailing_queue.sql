@@ -0,0 +1,33 @@
+-- Миграция: Очередь рассылок бота
+-- Рассылка делится на части (диапазоны users.id), которые параллельно забирают
+-- воркеры рассылки (Bot/bot_folder/mailing_module/worker.py) через FOR UPDATE SKIP LOCKED.
+
+CREATE TABLE IF NOT EXISTS bot_mailing_jobs (
+    id SERIAL PRIMARY KEY,
+    admin_id BIGINT NOT NULL,
+    payload JSONB NOT NULL,
+    status VARCHAR(20) CHECK (status IN ('running', 'done', 'cancelled')) DEFAULT 'running',
+    total_chunks INTEGER DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS bot_mailing_chunks (
+    id SERIAL PRIMARY KEY,
+    job_id INTEGER REFERENCES bot_mailing_jobs (id) ON DELETE CASCADE,
+    start_user_id INTEGER NOT NULL,
+    -- Диапазон части: users.id в (start_user_id, end_user_id]
+    end_user_id INTEGER NOT NULL,
+    -- Последний обработанный users.id (для продолжения прерванной части)
+    last_user_id INTEGER NOT NULL,
+    status VARCHAR(20) CHECK (status IN ('pending', 'claimed', 'done')) DEFAULT 'pending',
+    claimed_by VARCHAR(100),
+    claimed_at TIMESTAMP,
+    successful INTEGER DEFAULT 0,
+    failed INTEGER DEFAULT 0,
+    blocked INTEGER DEFAULT 0,
+    finished_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_bot_mailing_chunks_status ON bot_mailing_chunks (status, id);
+CREATE INDEX IF NOT EXISTS idx_bot_mailing_chunks_job_id ON bot_mailing_chunks (job_id);
@@ -0,0 +1,10 @@
+-- Миграция: Индексы для сегментированных рассылок бота
+-- Сегменты аудитории (Bot/bot_folder/mailing_module/segments.py) компилируются
+-- в SQL над users, purchases и transactions; эти индексы покрывают их условия.
+-- Условие сегмента покупок (user_id, purchase_date, status) обслуживает покрывающий индекс
+-- idx_purchases_user_id_purchase_date_account из migration_add_bot_account_cache.sql.
+
+CREATE INDEX IF NOT EXISTS idx_users_join_date ON users (join_date);
+CREATE INDEX IF NOT EXISTS idx_users_total_spent ON users (total_spent);
+CREATE INDEX IF NOT EXISTS idx_users_balance ON users (balance);
+CREATE INDEX IF NOT EXISTS idx_transactions_user_id_type_created_at ON transactions (user_id, type, created_at);
@@ -0,0 +1,65 @@
+-- Миграция: Уведомления бота о покупках и пополнениях
+-- Триггеры на purchases и transactions при смене статуса кладут уведомление в bot_notification_outbox
+-- и вызывают NOTIFY bot_notifications. Бот (Bot/bot_folder/notifications_module/listener.py) слушает канал,
+-- забирает уведомления пачкой, отправляет их пользователям и удаляет из таблицы.
+
+CREATE TABLE IF NOT EXISTS bot_notification_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    telegram_id BIGINT NOT NULL,
+    kind VARCHAR(20) CHECK (kind IN ('purchase', 'deposit')) NOT NULL,
+    source_id INTEGER NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    amount DECIMAL(15, 2),
+    currency VARCHAR(10),
+    title VARCHAR(255),
+    attempts INTEGER DEFAULT 0,
+    available_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    claimed_by VARCHAR(100),
+    claimed_at TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Покупка выполнена или не удалась (при создании с окончательным статусом или при смене статуса)
+CREATE OR REPLACE FUNCTION bot_notify_purchase() RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.status IN ('completed', 'failed')
+       AND (TG_OP = 'INSERT' OR OLD.status IS DISTINCT FROM NEW.status) THEN
+        INSERT INTO bot_notification_outbox (telegram_id, kind, source_id, status, amount, currency, title)
+        SELECT u.telegram_id, 'purchase', NEW.id, NEW.status, NEW.amount, NEW.currency, NEW.service_name
+        FROM users u
+        WHERE u.id = NEW.user_id AND u.telegram_id IS NOT NULL;
+        IF FOUND THEN
+            -- Одинаковые NOTIFY одной транзакции доставляются один раз, после COMMIT
+            PERFORM pg_notify('bot_notifications', '');
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Пополнение баланса зачислено (CardLink, промокод, админ)
+CREATE OR REPLACE FUNCTION bot_notify_deposit() RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.type = 'deposit' AND NEW.status = 'completed'
+       AND (TG_OP = 'INSERT' OR OLD.status IS DISTINCT FROM NEW.status) THEN
+        INSERT INTO bot_notification_outbox (telegram_id, kind, source_id, status, amount, currency, title)
+        SELECT u.telegram_id, 'deposit', NEW.id, NEW.status, NEW.amount, 'USD', NEW.payment_method
+        FROM users u
+        WHERE u.id = NEW.user_id AND u.telegram_id IS NOT NULL;
+        IF FOUND THEN
+            PERFORM pg_notify('bot_notifications', '');
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS bot_notify_purchase ON purchases;
+CREATE TRIGGER bot_notify_purchase
+    AFTER INSERT OR UPDATE OF status ON purchases
+    FOR EACH ROW EXECUTE FUNCTION bot_notify_purchase();
+
+DROP TRIGGER IF EXISTS bot_notify_deposit ON transactions;
+CREATE TRIGGER bot_notify_deposit
+    AFTER INSERT OR UPDATE OF status ON transactions
+    FOR EACH ROW EXECUTE FUNCTION bot_notify_deposit();
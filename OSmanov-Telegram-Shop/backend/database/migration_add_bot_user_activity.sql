@@ -0,0 +1,16 @@
+-- Миграция: активность пользователей бота
+-- Время последнего обращения к боту и счетчики обращений по типам. Бот копит их в памяти
+-- и записывает пачками (Bot/bot_folder/activity_module): не чаще одной записи на пользователя за интервал.
+-- Индекс по last_seen_at обслуживает /activity и сегменты рассылок «активны / неактивны N дней».
+
+CREATE TABLE IF NOT EXISTS bot_user_activity (
+    telegram_id BIGINT PRIMARY KEY,
+    first_seen_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_seen_at TIMESTAMP NOT NULL,
+    messages BIGINT DEFAULT 0,
+    commands BIGINT DEFAULT 0,
+    callbacks BIGINT DEFAULT 0,
+    inline_queries BIGINT DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS idx_bot_user_activity_last_seen_at ON bot_user_activity (last_seen_at) INCLUDE (telegram_id);
@@ -0,0 +1,23 @@
+-- Миграция: массовый импорт пользователей в боте (/import, Bot/bot_folder/importer_module)
+-- Импорт вставляет сотни тысяч строк users одной транзакцией. Чтобы триггер bot_user_changed
+-- не отправлял NOTIFY на каждую строку, импорт выставляет SET LOCAL bot.bulk_import = 'on',
+-- а в конце отправляет один NOTIFY bot_user_changed '*' (бот сбрасывает весь кэш /balance).
+
+CREATE OR REPLACE FUNCTION bot_notify_user_changed() RETURNS TRIGGER AS $$
+DECLARE
+    changed_telegram_id BIGINT;
+BEGIN
+    IF current_setting('bot.bulk_import', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    IF TG_TABLE_NAME = 'users' THEN
+        changed_telegram_id := NEW.telegram_id;
+    ELSE
+        SELECT telegram_id INTO changed_telegram_id FROM users WHERE id = NEW.user_id;
+    END IF;
+    IF changed_telegram_id IS NOT NULL THEN
+        PERFORM pg_notify('bot_user_changed', changed_telegram_id::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,12 @@
+-- Миграция: витрины, которые запускал пользователь
+-- Один процесс бота может обслуживать несколько витрин (Bot/bot_folder/hosting_module) с общей
+-- таблицей users. Бот записывает сюда витрину при каждом /start: по ней рассылки витрины
+-- выбирают только ее пользователей, а уведомления о покупках уходят через бота,
+-- которого пользователь запускал последним. Пользователи без записей относятся к основной витрине.
+
+CREATE TABLE IF NOT EXISTS bot_user_storefronts (
+    telegram_id BIGINT NOT NULL,
+    storefront VARCHAR(64) NOT NULL,
+    started_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (telegram_id, storefront)
+);
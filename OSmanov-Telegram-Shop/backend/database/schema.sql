@@ -117,8 +117,6 @@ SET
     updated_at = CURRENT_TIMESTAMP;
 
 -- Индексы для users
-CREATE INDEX idx_users_telegram_id ON users (telegram_id);
-
 CREATE INDEX idx_users_email ON users (email);
 
 -- Индексы для admin_users
@@ -140,6 +138,261 @@ CREATE INDEX idx_purchases_user_id ON purchases (user_id);
 
 CREATE INDEX idx_purchases_custom_id ON purchases (custom_id);
 
+-- Индексы для сегментов рассылок бота
+CREATE INDEX idx_users_join_date ON users (join_date);
+
+CREATE INDEX idx_users_total_spent ON users (total_spent);
+
+CREATE INDEX idx_users_balance ON users (balance);
+
+CREATE INDEX idx_transactions_user_id_type_created_at ON transactions (user_id, type, created_at);
+
+-- Очередь рассылок бота: рассылка делится на части (диапазоны users.id),
+-- которые параллельно забирают воркеры рассылки
+CREATE TABLE
+    bot_mailing_jobs (
+        id SERIAL PRIMARY KEY,
+        admin_id BIGINT NOT NULL,
+        payload JSONB NOT NULL,
+        status VARCHAR(20) CHECK (status IN ('running', 'done', 'cancelled')) DEFAULT 'running',
+        total_chunks INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        finished_at TIMESTAMP
+    );
+
+CREATE TABLE
+    bot_mailing_chunks (
+        id SERIAL PRIMARY KEY,
+        job_id INTEGER REFERENCES bot_mailing_jobs (id) ON DELETE CASCADE,
+        start_user_id INTEGER NOT NULL,
+        end_user_id INTEGER NOT NULL,
+        last_user_id INTEGER NOT NULL,
+        status VARCHAR(20) CHECK (status IN ('pending', 'claimed', 'done')) DEFAULT 'pending',
+        claimed_by VARCHAR(100),
+        claimed_at TIMESTAMP,
+        successful INTEGER DEFAULT 0,
+        failed INTEGER DEFAULT 0,
+        blocked INTEGER DEFAULT 0,
+        finished_at TIMESTAMP
+    );
+
+CREATE INDEX idx_bot_mailing_chunks_status ON bot_mailing_chunks (status, id);
+
+CREATE INDEX idx_bot_mailing_chunks_job_id ON bot_mailing_chunks (job_id);
+
+-- Ежедневные агрегаты статистики бота (пополняются инкрементально по водяным знакам)
+CREATE TABLE
+    bot_daily_stats (
+        day DATE PRIMARY KEY,
+        registrations INTEGER DEFAULT 0,
+        purchases INTEGER DEFAULT 0,
+        purchases_amount DECIMAL(15, 2) DEFAULT 0,
+        deposits INTEGER DEFAULT 0,
+        deposits_amount DECIMAL(15, 2) DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+
+CREATE TABLE
+    bot_rollup_watermarks (
+        source VARCHAR(50) PRIMARY KEY,
+        last_id INTEGER NOT NULL DEFAULT 0,
+        pending_id INTEGER,
+        pending_xmax BIGINT,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+
+INSERT INTO
+    bot_rollup_watermarks (source)
+VALUES
+    ('users'),
+    ('purchases'),
+    ('transactions');
+
+-- Смена статуса уже учтенной покупки или пополнения исправляет агрегат ее дня
+CREATE FUNCTION bot_rollup_purchase_status() RETURNS TRIGGER AS $$
+DECLARE
+    watermark INTEGER;
+    delta INTEGER;
+BEGIN
+    -- FOR SHARE ждет идущего пересчета: после него строка либо учтена уже в новом статусе,
+    -- либо знак еще не дошел до нее
+    SELECT last_id INTO watermark FROM bot_rollup_watermarks WHERE source = 'purchases' FOR SHARE;
+    IF watermark IS NULL OR NEW.id > watermark OR NEW.purchase_date IS NULL THEN
+        RETURN NULL;
+    END IF;
+    delta := (CASE WHEN NEW.status = 'completed' THEN 1 ELSE 0 END)
+           - (CASE WHEN OLD.status = 'completed' THEN 1 ELSE 0 END);
+    IF delta <> 0 THEN
+        INSERT INTO bot_daily_stats (day, purchases, purchases_amount, updated_at)
+        VALUES (NEW.purchase_date::date, delta, delta * NEW.amount, NOW())
+        ON CONFLICT (day) DO UPDATE
+        SET purchases = bot_daily_stats.purchases + EXCLUDED.purchases,
+            purchases_amount = bot_daily_stats.purchases_amount + EXCLUDED.purchases_amount,
+            updated_at = NOW();
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION bot_rollup_deposit_status() RETURNS TRIGGER AS $$
+DECLARE
+    watermark INTEGER;
+    delta INTEGER;
+BEGIN
+    IF NEW.type IS DISTINCT FROM 'deposit' THEN
+        RETURN NULL;
+    END IF;
+    SELECT last_id INTO watermark FROM bot_rollup_watermarks WHERE source = 'transactions' FOR SHARE;
+    IF watermark IS NULL OR NEW.id > watermark OR NEW.created_at IS NULL THEN
+        RETURN NULL;
+    END IF;
+    delta := (CASE WHEN NEW.status = 'completed' THEN 1 ELSE 0 END)
+           - (CASE WHEN OLD.status = 'completed' THEN 1 ELSE 0 END);
+    IF delta <> 0 THEN
+        INSERT INTO bot_daily_stats (day, deposits, deposits_amount, updated_at)
+        VALUES (NEW.created_at::date, delta, delta * NEW.amount, NOW())
+        ON CONFLICT (day) DO UPDATE
+        SET deposits = bot_daily_stats.deposits + EXCLUDED.deposits,
+            deposits_amount = bot_daily_stats.deposits_amount + EXCLUDED.deposits_amount,
+            updated_at = NOW();
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER bot_rollup_purchase_status
+    AFTER UPDATE OF status ON purchases
+    FOR EACH ROW WHEN (OLD.status IS DISTINCT FROM NEW.status)
+    EXECUTE FUNCTION bot_rollup_purchase_status();
+
+CREATE TRIGGER bot_rollup_deposit_status
+    AFTER UPDATE OF status ON transactions
+    FOR EACH ROW WHEN (OLD.status IS DISTINCT FROM NEW.status)
+    EXECUTE FUNCTION bot_rollup_deposit_status();
+
+-- Уведомления бота о покупках и пополнениях: триггеры кладут их в outbox и вызывают NOTIFY bot_notifications
+CREATE TABLE
+    bot_notification_outbox (
+        id BIGSERIAL PRIMARY KEY,
+        telegram_id BIGINT NOT NULL,
+        kind VARCHAR(20) CHECK (kind IN ('purchase', 'deposit')) NOT NULL,
+        source_id INTEGER NOT NULL,
+        status VARCHAR(20) NOT NULL,
+        amount DECIMAL(15, 2),
+        currency VARCHAR(10),
+        title VARCHAR(255),
+        attempts INTEGER DEFAULT 0,
+        available_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        claimed_by VARCHAR(100),
+        claimed_at TIMESTAMP,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+
+CREATE FUNCTION bot_notify_purchase() RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.status IN ('completed', 'failed')
+       AND (TG_OP = 'INSERT' OR OLD.status IS DISTINCT FROM NEW.status) THEN
+        INSERT INTO bot_notification_outbox (telegram_id, kind, source_id, status, amount, currency, title)
+        SELECT u.telegram_id, 'purchase', NEW.id, NEW.status, NEW.amount, NEW.currency, NEW.service_name
+        FROM users u
+        WHERE u.id = NEW.user_id AND u.telegram_id IS NOT NULL;
+        IF FOUND THEN
+            PERFORM pg_notify('bot_notifications', '');
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION bot_notify_deposit() RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.type = 'deposit' AND NEW.status = 'completed'
+       AND (TG_OP = 'INSERT' OR OLD.status IS DISTINCT FROM NEW.status) THEN
+        INSERT INTO bot_notification_outbox (telegram_id, kind, source_id, status, amount, currency, title)
+        SELECT u.telegram_id, 'deposit', NEW.id, NEW.status, NEW.amount, 'USD', NEW.payment_method
+        FROM users u
+        WHERE u.id = NEW.user_id AND u.telegram_id IS NOT NULL;
+        IF FOUND THEN
+            PERFORM pg_notify('bot_notifications', '');
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER bot_notify_purchase
+    AFTER INSERT OR UPDATE OF status ON purchases
+    FOR EACH ROW EXECUTE FUNCTION bot_notify_purchase();
+
+CREATE TRIGGER bot_notify_deposit
+    AFTER INSERT OR UPDATE OF status ON transactions
+    FOR EACH ROW EXECUTE FUNCTION bot_notify_deposit();
+
+-- /balance и /orders в боте: покрывающие индексы и NOTIFY bot_user_changed для сброса кэша
+CREATE INDEX idx_users_telegram_id_account ON users (telegram_id) INCLUDE (id, balance, total_spent);
+
+CREATE INDEX idx_purchases_user_id_purchase_date_account
+    ON purchases (user_id, purchase_date) INCLUDE (service_name, amount, currency, status);
+
+CREATE INDEX idx_transactions_user_id_deposits_account
+    ON transactions (user_id, created_at) INCLUDE (amount)
+    WHERE type = 'deposit' AND status = 'completed';
+
+CREATE FUNCTION bot_notify_user_changed() RETURNS TRIGGER AS $$
+DECLARE
+    changed_telegram_id BIGINT;
+BEGIN
+    -- Массовый импорт (/import) сбрасывает кэш одним NOTIFY '*' в конце транзакции
+    IF current_setting('bot.bulk_import', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    IF TG_TABLE_NAME = 'users' THEN
+        changed_telegram_id := NEW.telegram_id;
+    ELSE
+        SELECT telegram_id INTO changed_telegram_id FROM users WHERE id = NEW.user_id;
+    END IF;
+    IF changed_telegram_id IS NOT NULL THEN
+        PERFORM pg_notify('bot_user_changed', changed_telegram_id::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER bot_user_changed
+    AFTER INSERT OR UPDATE OF telegram_id, balance, total_spent ON users
+    FOR EACH ROW EXECUTE FUNCTION bot_notify_user_changed();
+
+CREATE TRIGGER bot_user_changed
+    AFTER INSERT OR UPDATE OF status ON purchases
+    FOR EACH ROW EXECUTE FUNCTION bot_notify_user_changed();
+
+CREATE TRIGGER bot_user_changed
+    AFTER INSERT OR UPDATE OF status ON transactions
+    FOR EACH ROW EXECUTE FUNCTION bot_notify_user_changed();
+
+-- Активность пользователей бота: последнее обращение и счетчики, записываются ботом пачками
+CREATE TABLE
+    bot_user_activity (
+        telegram_id BIGINT PRIMARY KEY,
+        first_seen_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        last_seen_at TIMESTAMP NOT NULL,
+        messages BIGINT DEFAULT 0,
+        commands BIGINT DEFAULT 0,
+        callbacks BIGINT DEFAULT 0,
+        inline_queries BIGINT DEFAULT 0
+    );
+
+CREATE INDEX idx_bot_user_activity_last_seen_at ON bot_user_activity (last_seen_at) INCLUDE (telegram_id);
+
+-- Витрины, которые запускал пользователь (несколько ботов в одном процессе), записываются ботом по /start
+CREATE TABLE
+    bot_user_storefronts (
+        telegram_id BIGINT NOT NULL,
+        storefront VARCHAR(64) NOT NULL,
+        started_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (telegram_id, storefront)
+    );
+
 -- Таблица промокодов
 CREATE TABLE
     promocodes (